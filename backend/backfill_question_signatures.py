@@ -0,0 +1,83 @@
+"""
+Compute MinHash signatures and LSH band rows for questions that lack them.
+
+Questions saved before near-duplicate detection existed have no ``minhash``
+and are invisible to the LSH lookup. Signatures are computed a batch at a
+time in one vectorized pass; the script is idempotent and can be re-run.
+
+Usage:
+    python backfill_question_signatures.py [--batch-size 5000] [--dry-run]
+"""
+import argparse
+
+from sqlalchemy import insert, update
+
+import dedup
+from database import SessionLocal, Question, QuestionLSHBand
+
+
+def backfill(batch_size: int = 5000, dry_run: bool = False) -> dict:
+    stats = {"scanned": 0, "bands": 0}
+    db = SessionLocal()
+    try:
+        last_id = ""
+        while True:
+            # Keyset-paginate over unsigned rows so memory stays bounded
+            rows = (
+                db.query(Question.id, Question.text, Question.user_id, Question.topic_id)
+                .filter(Question.id > last_id)
+                .filter(Question.minhash.is_(None))
+                .order_by(Question.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            signatures = dedup.minhash_signatures([row.text or "" for row in rows])
+            band_rows = []
+            for row, signature in zip(rows, signatures):
+                if row.user_id is not None and row.topic_id is not None:
+                    band_rows.extend(
+                        {
+                            "question_id": row.id,
+                            "band": band,
+                            "bucket": bucket,
+                            "user_id": row.user_id,
+                            "topic_id": row.topic_id,
+                        }
+                        for band, bucket in enumerate(dedup.lsh_buckets(signature))
+                    )
+            stats["scanned"] += len(rows)
+            stats["bands"] += len(band_rows)
+            last_id = rows[-1].id
+
+            if not dry_run:
+                # ORM bulk UPDATE by primary key: one executemany per batch
+                db.execute(
+                    update(Question),
+                    [
+                        {"id": row.id, "minhash": dedup.signature_to_bytes(signature)}
+                        for row, signature in zip(rows, signatures)
+                    ],
+                )
+                if band_rows:
+                    db.execute(insert(QuestionLSHBand), band_rows)
+                db.commit()
+            print(f"Processed {stats['scanned']} questions, {stats['bands']} band rows")
+    finally:
+        db.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    result = backfill(batch_size=args.batch_size, dry_run=args.dry_run)
+    print(
+        f"Done: {result['scanned']} questions {'would be ' if args.dry_run else ''}signed, "
+        f"{result['bands']} LSH band rows"
+    )
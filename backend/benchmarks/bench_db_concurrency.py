@@ -0,0 +1,114 @@
+"""
+Concurrent-request throughput: sync Session vs AsyncSession inside async handlers.
+
+Simulates N concurrent API handlers that each run one listing query. The
+"sync" mode is how endpoints used to work (``async def`` calling the
+blocking ``SessionLocal``), the "async" mode is the current ``AsyncSession``
+path. A ticker task measures event-loop lag, which is what stalls every
+other in-flight request (including LLM awaits) in the sync mode.
+
+Usage (from backend/, against the database in DATABASE_URL):
+    python benchmarks/bench_db_concurrency.py --requests 2000 --concurrency 50
+    python benchmarks/bench_db_concurrency.py --sleep-ms 5   # PostgreSQL: emulate network RTT
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+
+from database import AsyncSessionLocal, SessionLocal, DATABASE_URL  # noqa: E402
+
+QUERY = (
+    "SELECT id, type, difficulty FROM questions "
+    "WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 50"
+)
+
+
+def _rtt_seconds(sleep_ms: float) -> float:
+    # pg_sleep is only meaningful (and only exists) on PostgreSQL
+    if sleep_ms and DATABASE_URL.startswith("postgres"):
+        return sleep_ms / 1000.0
+    return 0.0
+
+
+async def _sync_handler(rtt: float, user_id: str) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(text(QUERY), {"user_id": user_id}).fetchall()
+        if rtt:
+            db.execute(text("SELECT pg_sleep(:s)"), {"s": rtt})
+    finally:
+        db.close()
+
+
+async def _async_handler(rtt: float, user_id: str) -> None:
+    async with AsyncSessionLocal() as db:
+        (await db.execute(text(QUERY), {"user_id": user_id})).fetchall()
+        if rtt:
+            await db.execute(text("SELECT pg_sleep(:s)"), {"s": rtt})
+
+
+async def _loop_lag_monitor(samples: list, stop: asyncio.Event, interval: float = 0.005) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def run(mode: str, requests: int, concurrency: int, sleep_ms: float, user_id: str) -> dict:
+    handler = _sync_handler if mode == "sync" else _async_handler
+    rtt = _rtt_seconds(sleep_ms)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    lag_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_loop_lag_monitor(lag_samples, stop))
+
+    async def _one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await handler(rtt, user_id)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "max_loop_lag_ms": max(lag_samples, default=0.0) * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sleep-ms", type=float, default=0.0)
+    parser.add_argument("--user-id", default="dev-user")
+    args = parser.parse_args()
+
+    print(f"database: {DATABASE_URL.split('@')[-1]}")
+    for mode in ("sync", "async"):
+        result = await run(mode, args.requests, args.concurrency, args.sleep_ms, args.user_id)
+        print(
+            f"{result['mode']:>5}: {result['throughput_rps']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+            f"max loop lag {result['max_loop_lag_ms']:7.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+MinHash signature throughput and LSH lookup quality for near-duplicate detection.
+
+Builds a synthetic bank of --bank math questions (a random scenario sentence
+plus a templated problem), signs it in batches with
+``dedup.minhash_signatures``, indexes every band in memory (the same keys
+``question_lsh_bands`` stores), then probes with --probes reformatted copies
+of bank questions (LaTeX/spacing/case variants) and as many unrelated
+questions. Reports signatures/s, candidates per probe, how many variants were
+found and confirmed, and false positives.
+
+Usage (from backend/):
+    python benchmarks/bench_dedup.py --bank 200000 --probes 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dedup  # noqa: E402
+
+TEMPLATES = (
+    "Find the derivative of $f(x) = \\frac{{x^{a}}}{{{b}}} + {c}x$ at $x={d}$.",
+    "Evaluate $\\int_0^{a} {b}x^{c} \\, dx$ and simplify your answer.",
+    "A train travels {a}{b} km in {c} hours. What is its average speed after {d} stops?",
+    "Solve for $x$: ${a}x + {b} = {c}x - {d}$.",
+    "If $\\sin \\theta = \\frac{{{a}}}{{{b}}}$, find $\\cos \\theta$ when $\\theta$ is in quadrant {c}.",
+)
+
+
+# Synthetic vocabulary for the scenario sentence that makes bank questions diverse
+VOCABULARY = [
+    "".join(random.Random(i).choice("abcdefghijklmnopqrstuvwxyz") for _ in range(3 + i % 7))
+    for i in range(5000)
+]
+
+
+def _question(rng: random.Random) -> str:
+    scenario = " ".join(rng.choice(VOCABULARY) for _ in range(8)).capitalize()
+    template = rng.choice(TEMPLATES)
+    return f"{scenario}. " + template.format(**{k: rng.randint(2, 99) for k in "abcd"})
+
+
+def _reformat(text: str, rng: random.Random) -> str:
+    """Formatting-only variant of a question, as a model tends to produce."""
+    variant = text.replace("\\frac", rng.choice(("\\frac", "\\dfrac", "\\tfrac")))
+    variant = variant.replace(" = ", rng.choice(("=", " = ", "  =  "))).replace(" + ", "+")
+    if rng.random() < 0.5:
+        variant = variant.upper() if rng.random() < 0.2 else variant.rstrip(".?")
+    return variant
+
+
+def _buckets(signatures) -> list:
+    return [dedup.lsh_buckets(signature) for signature in signatures]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bank", type=int, default=100_000)
+    parser.add_argument("--probes", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    bank = [_question(rng) for _ in range(args.bank)]
+
+    started = time.perf_counter()
+    signatures = []
+    for offset in range(0, len(bank), args.batch):
+        signatures.extend(dedup.minhash_signatures(bank[offset:offset + args.batch]))
+    elapsed = time.perf_counter() - started
+    print(f"Signed {len(bank)} questions in {elapsed:.2f}s ({len(bank) / elapsed:,.0f}/s)")
+
+    started = time.perf_counter()
+    index = defaultdict(list)
+    for row, buckets in enumerate(_buckets(signatures)):
+        for band, bucket in enumerate(buckets):
+            index[(band, bucket)].append(row)
+    print(f"Indexed {len(bank) * dedup.LSH_BANDS} band rows in {time.perf_counter() - started:.2f}s")
+
+    originals = [rng.randrange(len(bank)) for _ in range(args.probes)]
+    variants = [_reformat(bank[row], rng) for row in originals]
+    unrelated = [_question(rng) for _ in range(args.probes)]
+    probe_signatures = dedup.minhash_signatures(variants + unrelated)
+
+    found = confirmed = false_positives = candidates_total = 0
+    started = time.perf_counter()
+    for i, (signature, buckets) in enumerate(zip(probe_signatures, _buckets(probe_signatures))):
+        candidates = sorted({row for key in enumerate(buckets) for row in index.get(key, ())})
+        candidates_total += len(candidates)
+        match = dedup.best_match(
+            signature, candidates, dedup.np.vstack([signatures[row] for row in candidates])
+        ) if candidates else None
+        if i < args.probes:
+            found += originals[i] in candidates
+            # Any confirmed match to an identical-text bank row counts as correct
+            confirmed += match is not None and bank[match[0]] == bank[originals[i]]
+        elif match is not None and bank[match[0]] != unrelated[i - args.probes]:
+            false_positives += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"Probed {2 * args.probes} questions in {elapsed:.2f}s, "
+          f"{candidates_total / (2 * args.probes):.1f} candidates per probe")
+    print(f"Reformatted duplicates: {found}/{args.probes} found by LSH, "
+          f"{confirmed}/{args.probes} confirmed at threshold {dedup.DEDUP_THRESHOLD}")
+    print(f"Unrelated questions matched: {false_positives}/{args.probes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Throughput and recovery rate of the LLM question parser against the legacy regex cascade.
+
+Every completion in the corpus (JSONL of {"id", "model", "raw", "expected"},
+``llm_response_corpus.jsonl`` next to this file by default; point --corpus at
+an ``LLM_RAW_CAPTURE_PATH`` file to replay real traffic, where "expected" is
+absent and only throughput and question counts are compared) is parsed with a
+frozen copy of the old strip/regex/json.loads path and with
+``llm_parser.parse_questions``, --repeat times each. A completion counts as
+recovered when the parser returns exactly the expected number of questions.
+The streaming parser is also timed on the same completions fed in --chunk
+character pieces.
+
+Usage (from backend/):
+    python benchmarks/bench_llm_parser.py --repeat 200
+    python benchmarks/bench_llm_parser.py --corpus /var/log/llm_raw.jsonl
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_parser  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_response_corpus.jsonl")
+
+
+def legacy_parse(content: str) -> list:
+    """The parsing block LLMService.generate_questions used before llm_parser."""
+    raw_content = content.strip()
+    raw_content = re.sub(r'^```(?:json)?\s*', '', raw_content, flags=re.IGNORECASE)
+    raw_content = re.sub(r'\s*```$', '', raw_content)
+    raw_content = re.sub(r'(</?s>|</?INST>|<INST>)', '', raw_content, flags=re.IGNORECASE)
+    raw_content = re.sub(r'(?<!\\)\\(?!["\\/bfnrtu])', r'\\\\', raw_content)
+    cleaned_content = raw_content
+    if cleaned_content.count('[') > 0 and cleaned_content.count(']') > 0:
+        start = cleaned_content.find('[')
+        end = cleaned_content.rfind(']')
+        cleaned_content = cleaned_content[start:end + 1]
+    elif not cleaned_content.startswith('[') and cleaned_content.startswith('{'):
+        cleaned_content = f"[{cleaned_content}]"
+    questions = json.loads(cleaned_content)
+    if isinstance(questions, dict):
+        questions = [questions]
+    # The old path handed any list on; count only items that are usable questions
+    return [q for q in questions if isinstance(q, dict) and any(k in q for k in llm_parser.TEXT_KEYS)]
+
+
+def new_parse(content: str) -> list:
+    return llm_parser.parse_questions(content).questions
+
+
+def stream_parse(content: str, chunk: int) -> list:
+    parser = llm_parser.IncrementalQuestionParser()
+    found = []
+    for i in range(0, len(content), chunk):
+        found.extend(parser.feed(content[i:i + chunk]))
+    return [q for q in map(llm_parser.validate_question, found) if q is not None]
+
+
+def _run(name: str, parse, corpus: list, repeat: int) -> dict:
+    counts = {}
+    for case in corpus:
+        try:
+            counts[case["id"]] = len(parse(case["raw"]))
+        except Exception:
+            counts[case["id"]] = None
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for case in corpus:
+            try:
+                parse(case["raw"])
+            except Exception:
+                pass
+    elapsed = time.perf_counter() - started
+    total_bytes = sum(len(case["raw"]) for case in corpus) * repeat
+
+    labelled = [case for case in corpus if "expected" in case]
+    recovered = sum(counts[case["id"]] == case["expected"] for case in labelled)
+    failed = sum(count is None for count in counts.values())
+    questions = sum(count or 0 for count in counts.values())
+    print(
+        f"{name:>10}: {len(corpus) * repeat / elapsed:10,.0f} completions/s "
+        f"{total_bytes / elapsed / 1e6:7.2f} MB/s  "
+        f"recovered {recovered}/{len(labelled)}  exceptions {failed}  questions {questions}"
+    )
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--chunk", type=int, default=16, help="Streaming delta size in characters")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    for i, case in enumerate(corpus):
+        case.setdefault("id", f"#{i}")
+    print(f"{len(corpus)} completions from {args.corpus}")
+
+    legacy = _run("legacy", legacy_parse, corpus, args.repeat)
+    new = _run("new", new_parse, corpus, args.repeat)
+    _run("streaming", lambda raw: stream_parse(raw, args.chunk), corpus, args.repeat)
+
+    print("\nCompletions where the two parsers disagree:")
+    for case in corpus:
+        if legacy[case["id"]] != new[case["id"]]:
+            expected = case.get("expected", "?")
+            print(f"  {case['id']:>28}: legacy {legacy[case['id']]}, new {new[case['id']]}, expected {expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Input size and build time of question prompts: precompiled templates vs the old f-strings.
+
+For every subject (and with images on and off) the chat messages for a
+question request are built with a frozen copy of the old system-prompt and
+``_build_generation_prompt`` code and with ``prompt_templates``, --repeat
+times each; "+key" also hashes the messages into the LLM cache key, which
+every request does next. Token counts use ``prompt_templates.estimate_tokens``, and also
+tiktoken's cl100k_base encoding when tiktoken is installed.
+
+Usage (from backend/):
+    python benchmarks/bench_prompt_templates.py --repeat 2000
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_templates  # noqa: E402
+from llm_cache import make_cache_key  # noqa: E402
+
+try:
+    import tiktoken
+except ImportError:  # optional, for exact counts
+    tiktoken = None
+
+SUBJECTS = {
+    "Mathematics": [
+        {"name": "Differentiation", "subtopics": "product rule, chain rule, implicit differentiation"},
+        {"name": "Integration", "subtopics": "substitution, integration by parts, definite integrals"},
+    ],
+    "Physics": [{"name": "Kinematics", "subtopics": "projectile motion, relative velocity"}],
+    "Chemistry": [{"name": "Chemical Equilibrium", "subtopics": "Kc, Kp, Le Chatelier's principle"}],
+    "Biology": [{"name": "Cell Respiration", "subtopics": "glycolysis, Krebs cycle, ATP yield"}],
+    "Economics": [{"name": "Elasticity", "subtopics": "price elasticity of demand, cross elasticity"}],
+}
+COUNTS = {"mcq": 5, "short": 3, "long": 2}
+
+
+def legacy_system_prompt(subject_name: str) -> str:
+    """The system prompt LLMService.build_question_payload built before prompt_templates."""
+    system_prompt = (
+        "You are an expert educational content creator specializing in generating "
+        "rigorous, expression-based questions with detailed mathematical, chemical, "
+        "or physical formulations."
+    )
+
+    subj_lower = subject_name.lower()
+    if "biology" in subj_lower:
+        system_prompt += (
+            " You specialize in creating biology questions that MUST include biological "
+            "processes, molecular structures, quantitative relationships, and detailed "
+            "diagrams. NEVER create word-only questions without biological expressions, "
+            "formulas, or structural representations."
+        )
+    elif "math" in subj_lower or "mathematics" in subj_lower:
+        system_prompt += (
+            " You specialize in creating mathematics questions that MUST include complex "
+            "mathematical expressions, multi-step equations, calculus operations, and "
+            "rigorous problem-solving. NEVER create word-only questions without actual "
+            "mathematical expressions and equations."
+        )
+    elif "chemistry" in subj_lower:
+        system_prompt += (
+            " You specialize in creating chemistry questions that MUST include complex "
+            "chemical equations, reaction mechanisms, stoichiometric calculations, and "
+            "thermodynamic analysis. NEVER create word-only questions without chemical "
+            "expressions and equations."
+        )
+    elif "physics" in subj_lower:
+        system_prompt += (
+            " You specialize in creating physics questions that MUST include physical "
+            "formulas, vector equations, multi-step problem-solving, and real-world "
+            "applications. NEVER create word-only questions without physical expressions "
+            "and formulas."
+        )
+
+    system_prompt += (
+        " Generate high-quality, expression-based questions that require analytical "
+        "thinking and problem-solving skills. Always respond with valid JSON only."
+    )
+    return system_prompt
+
+
+def legacy_user_prompt(
+    request, subject_name: str, topics_data: List[dict], counts: dict
+) -> str:
+    """The prompt main._build_generation_prompt built before prompt_templates."""
+    topic_names = ", ".join(d["name"] for d in topics_data)
+    subtopics = "; ".join(f"{d['name']} details: {d['subtopics']}" for d in topics_data)
+
+    normalized_subject = subject_name.lower().strip()
+
+    prompt_base = f"""
+    INSTRUCTION: USE LATEX FOR ALL MATHEMATICAL, CHEMICAL, AND SCIENTIFIC NOTATION.
+    Use '$' for inline and '$$' for display equations.
+
+    CRITICAL LATEX ESCAPING RULE: When including LaTeX inside JSON string values,
+    you MUST escape single backslashes as double backslashes (e.g., use '\\\\' for
+    '\\' in commands like '\\\\frac' or '\\\\text').
+
+    CRITICAL REQUIREMENT: ALL questions MUST include actual mathematical expressions,
+    chemical equations, physical formulas, or biological processes with quantitative
+    relationships in the question text. NEVER generate word-only questions without
+    proper expressions, equations, or formulas. Each question MUST require analytical
+    thinking and problem-solving.
+
+    Generate educational questions for an assessment with the following details:
+
+    Subject: {subject_name}
+    Topics Covered: {topic_names}
+    Detailed Concepts: {subtopics}
+
+    Generate the following types of questions:
+    - Multiple Choice Questions (MCQ): {counts['mcq']}
+    - Short Answer Questions: {counts['short']}
+    - Long Answer Questions: {counts['long']}
+
+    Difficulty level: {request.difficulty}
+
+    For each question, provide the following JSON structure (IMPORTANT):
+    {{
+        "type": "mcq" | "short" | "long" | "image",
+        "topic": "The name of the covered topic this question belongs to.",
+        "text": "The question text here (MUST include multiple LaTeX expressions/equations/formulas that require analytical thinking).",
+        "options": ["option1", "option2", "option3", "option4"],
+        "correct_answer": "The final answer with LaTeX expressions and complete derivations.",
+        "explanation": "A comprehensive, step-by-step derivation or explanation.",
+        "images": ["Image Description 1"],
+        "difficulty": "easy" | "medium" | "hard",
+        "marks": 1
+    }}
+
+    EXAMPLE MATH QUESTION:
+    {{
+        "type": "mcq",
+        "text": "Find the derivative of $f(x) = 3x^2\\sin(2x) + e^{{4x}}$ using the product rule and chain rule.",
+        "options": [
+            "$f'(x) = 6x\\sin(2x) + 6x^2\\cos(2x) + 4e^{{4x}}$",
+            "$f'(x) = 6x\\sin(2x) + 3x^2\\cos(2x) + e^{{4x}}$",
+            "$f'(x) = 3x^2\\sin(2x) + 2\\cos(2x) + 4e^{{4x}}$",
+            "$f'(x) = 6x\\sin(2x) - 6x^2\\cos(2x) + 4e^{{4x}}$"
+        ],
+        "correct_answer": 0,
+        "explanation": "Step 1: Apply product rule to $3x^2\\sin(2x)$: $\\\\frac{{d}}{{dx}}[uv] = u'v + uv'$ where $u = 3x^2$ and $v = \\\\sin(2x)$...",
+        "difficulty": "medium",
+        "marks": 2
+    }}
+
+    EXAMPLE CHEMISTRY QUESTION:
+    {{
+        "type": "short",
+        "text": "Calculate the equilibrium constant $K_c$ for the reaction $N_2(g) + 3H_2(g) \\\\rightleftharpoons 2NH_3(g)$ if at equilibrium $[N_2] = 0.2M$, $[H_2] = 0.5M$, and $[NH_3] = 0.8M$.",
+        "options": [],
+        "correct_answer": "$K_c = 25.6$",
+        "explanation": "Step 1: Write the equilibrium expression: $K_c = \\\\frac{{[NH_3]^2}}{{[N_2][H_2]^3}}$...",
+        "difficulty": "medium",
+        "marks": 3
+    }}
+    """
+
+    subject_instructions = ""
+    if "biology" in normalized_subject:
+        subject_instructions = r"""
+        For Biology questions:
+        - Generate questions with detailed biological processes and quantitative analysis.
+        - Include at least one biological formula/structure and one quantitative relationship.
+        """
+    elif "math" in normalized_subject or "mathematics" in normalized_subject:
+        subject_instructions = r"""
+        For Mathematics questions:
+        - Generate complex, multi-step problems with at least two distinct expressions.
+        """
+    elif "chemistry" in normalized_subject:
+        subject_instructions = r"""
+        For Chemistry questions:
+        - Include at least one balanced chemical equation and one quantitative formula.
+        """
+    elif "physics" in normalized_subject:
+        subject_instructions = r"""
+        For Physics questions:
+        - Include at least one governing law or vector equation plus quantitative formulas.
+        """
+
+    image_instructions = f"""
+    Include images: {request.include_images}
+
+    {{"CRITICAL INSTRUCTION": If include_images is true, you MUST generate image-based
+    questions with type "image" and provide a detailed text description for each image
+    in the "images" field. If include_images is false, only generate mcq/short/long.}}
+    """
+
+    format_instructions = """
+    {"MANDATORY FORMAT": You are STRICTLY forbidden from including any text, explanation,
+    markdown (like ```json), or wrapping characters before or after the JSON array.
+    Respond with ONLY a single, valid JSON array of question objects. Start with '['
+    and end with ']'.}
+    """
+
+    return prompt_base + subject_instructions + image_instructions + format_instructions
+
+
+def legacy_messages(request, subject_name: str, topics_data: List[dict]) -> List[dict]:
+    return [
+        {"role": "system", "content": legacy_system_prompt(subject_name)},
+        {"role": "user", "content": legacy_user_prompt(request, subject_name, topics_data, COUNTS)},
+    ]
+
+
+def new_messages(request, subject_name: str, topics_data: List[dict]) -> List[dict]:
+    subject = "default" if subject_name == "Economics" else subject_name
+    return [
+        {"role": "system", "content": prompt_templates.questions_system_prompt(subject)},
+        {
+            "role": "user",
+            "content": prompt_templates.questions_user_prompt(
+                subject_name, topics_data, COUNTS, request.difficulty, request.include_images
+            ),
+        },
+    ]
+
+
+def _tokens(messages: List[dict], encoding) -> tuple:
+    estimated = prompt_templates.estimate_message_tokens(messages)
+    if encoding is None:
+        return estimated, None
+    exact = sum(len(encoding.encode(m["content"])) + prompt_templates.MESSAGE_OVERHEAD_TOKENS for m in messages)
+    return estimated, exact
+
+
+def _build_us(build, request, subject_name: str, topics_data: List[dict], repeat: int) -> tuple:
+    """Microseconds per build, and per build plus cache key."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        build(request, subject_name, topics_data)
+    built = time.perf_counter()
+    for _ in range(repeat):
+        make_cache_key("model", build(request, subject_name, topics_data))
+    keyed = time.perf_counter()
+    return (built - started) / repeat * 1e6, (keyed - built) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    encoding = tiktoken.get_encoding("cl100k_base") if tiktoken else None
+
+    print(
+        f"{'subject':>12} {'images':>6} | {'old tokens':>10} {'new tokens':>10} {'saved':>6} | "
+        f"{'old us':>7} {'new us':>7} | {'old +key':>8} {'new +key':>8}"
+    )
+    totals = {"old": 0, "new": 0, "old_us": 0.0, "new_us": 0.0}
+    for subject_name, topics_data in SUBJECTS.items():
+        for include_images in (False, True):
+            request = SimpleNamespace(difficulty="medium", include_images=include_images)
+            old = legacy_messages(request, subject_name, topics_data)
+            new = new_messages(request, subject_name, topics_data)
+            old_est, old_exact = _tokens(old, encoding)
+            new_est, new_exact = _tokens(new, encoding)
+            old_tokens = old_exact if old_exact is not None else old_est
+            new_tokens = new_exact if new_exact is not None else new_est
+            totals["old"] += old_tokens
+            totals["new"] += new_tokens
+            old_us, old_key_us = _build_us(legacy_messages, request, subject_name, topics_data, args.repeat)
+            new_us, new_key_us = _build_us(new_messages, request, subject_name, topics_data, args.repeat)
+            totals["old_us"] += old_key_us
+            totals["new_us"] += new_key_us
+            print(
+                f"{subject_name:>12} {str(include_images):>6} | {old_tokens:>10} {new_tokens:>10} "
+                f"{1 - new_tokens / old_tokens:>6.0%} | {old_us:>7.1f} {new_us:>7.1f} | "
+                f"{old_key_us:>8.1f} {new_key_us:>8.1f}"
+            )
+            if old_exact is not None:
+                print(f"{'':>12} {'':>6} | estimate {old_est} / {new_est} (exact {old_exact} / {new_exact})")
+
+    source = "cl100k_base" if encoding else "estimated"
+    print(
+        f"\nTotal input tokens ({source}): old {totals['old']}, new {totals['new']} "
+        f"({1 - totals['new'] / totals['old']:.0%} fewer)"
+    )
+    print(
+        f"Build + cache key per request: old {totals['old_us'] / 10:.1f} us, "
+        f"new {totals['new_us'] / 10:.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Query plans and latency of the question listings with and without the
+composite listing indexes, on a synthetic questions table.
+
+The table is built in a scratch database (a temporary SQLite file unless
+--database-url is given), filled with --rows synthetic questions spread over
+--users users and --topics topics, then each listing query is timed before
+and after creating the indexes declared on ``database.Question``.
+
+Usage (from backend/):
+    python benchmarks/bench_question_indexes.py --rows 1000000
+    python benchmarks/bench_question_indexes.py --database-url postgresql://.../scratch
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, text  # noqa: E402
+
+from database import Question  # noqa: E402
+
+# Indexes that existed before the listing indexes were added
+BASELINE_INDEXES = {"ix_questions_id", "ix_questions_type", "ix_questions_difficulty"}
+
+QUERIES = {
+    "user page": (
+        "SELECT id, type, text, difficulty, marks, topic_id, created_at FROM questions "
+        "WHERE user_id = :user_id ORDER BY created_at DESC, id DESC LIMIT 101"
+    ),
+    "user page (keyset)": (
+        "SELECT id, type, text, difficulty, marks, topic_id, created_at FROM questions "
+        "WHERE user_id = :user_id AND (created_at, id) < (:created_at, :id) "
+        "ORDER BY created_at DESC, id DESC LIMIT 101"
+    ),
+    "user + topic page": (
+        "SELECT id, type, text, difficulty, marks, topic_id, created_at FROM questions "
+        "WHERE user_id = :user_id AND topic_id = :topic_id "
+        "ORDER BY created_at DESC, id DESC LIMIT 101"
+    ),
+}
+
+
+def _scratch_table(metadata: MetaData) -> Table:
+    """Copy of the questions table without foreign keys or indexes."""
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key) for c in Question.__table__.columns
+    ]
+    return Table("questions", metadata, *columns)
+
+
+def _populate(engine, table: Table, rows: int, users: int, topics: int, batch: int = 10000) -> None:
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, rows, batch):
+            conn.execute(
+                table.insert(),
+                [
+                    {
+                        "id": f"q{i:09d}",
+                        "type": rng.choice(("mcq", "short", "long")),
+                        "text": f"Synthetic question {i}",
+                        "options": [],
+                        "correct_answer": None,
+                        "explanation": "",
+                        "images": [],
+                        "difficulty": rng.choice(("easy", "medium", "hard")),
+                        "marks": 1,
+                        "topic_id": f"topic-{rng.randrange(topics)}",
+                        "user_id": f"user-{rng.randrange(users)}",
+                        "created_at": start + timedelta(seconds=i * 7),
+                    }
+                    for i in range(offset, min(offset + batch, rows))
+                ],
+            )
+    print(f"Inserted {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+def _explain(conn, sql: str, params: dict) -> str:
+    if conn.dialect.name == "postgresql":
+        rows = conn.execute(text(f"EXPLAIN ANALYZE {sql}"), params).fetchall()
+        return "\n".join(f"    {r[0]}" for r in rows)
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+    return "\n".join(f"    {r[-1]}" for r in rows)
+
+
+def _time_queries(engine, samples: list, repeat: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            latencies = []
+            for params in samples[:repeat]:
+                started = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            results[name] = {
+                "p50": statistics.median(latencies),
+                "p95": latencies[int(len(latencies) * 0.95) - 1],
+                "plan": _explain(conn, sql, samples[0]),
+            }
+    return results
+
+
+def _report(label: str, results: dict) -> None:
+    print(f"\n== {label} ==")
+    for name, r in results.items():
+        print(f"{name:>20}: p50 {r['p50']:8.2f} ms  p95 {r['p95']:8.2f} ms")
+        print(r["plan"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--database-url", default=None, help="Scratch database (tables are dropped)")
+    args = parser.parse_args()
+
+    scratch_file = None
+    url = args.database_url
+    if url is None:
+        scratch_file = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False).name
+        url = f"sqlite:///{scratch_file}"
+
+    engine = create_engine(url)
+    metadata = MetaData()
+    table = _scratch_table(metadata)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        _populate(engine, table, args.rows, args.users, args.topics)
+        for index in Question.__table__.indexes:
+            if index.name in BASELINE_INDEXES:
+                Index(index.name, *(table.c[c.name] for c in index.columns)).create(engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+        rng = random.Random(7)
+        middle = datetime(2024, 1, 1) + timedelta(seconds=args.rows * 7 // 2)
+        samples = [
+            {
+                "user_id": f"user-{rng.randrange(args.users)}",
+                "topic_id": f"topic-{rng.randrange(args.topics)}",
+                "created_at": middle,
+                "id": "q999999999",
+            }
+            for _ in range(args.repeat)
+        ]
+
+        before = _time_queries(engine, samples, args.repeat)
+        _report("baseline indexes", before)
+
+        started = time.perf_counter()
+        for index in Question.__table__.indexes:
+            if index.name not in BASELINE_INDEXES:
+                Index(index.name, *(table.c[c.name] for c in index.columns)).create(engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        print(f"\nCreated listing indexes in {time.perf_counter() - started:.1f}s")
+
+        after = _time_queries(engine, samples, args.repeat)
+        _report("with listing indexes", after)
+
+        print("\n== speedup (p50) ==")
+        for name in QUERIES:
+            print(f"{name:>20}: {before[name]['p50'] / max(after[name]['p50'], 1e-6):8.1f}x")
+    finally:
+        metadata.drop_all(engine)
+        engine.dispose()
+        if scratch_file:
+            os.remove(scratch_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import abc
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_PATH = os.getenv(
+    "BLOB_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "blobs"),
+)
+
+# Question.images entries that point into the blob store look like this
+IMAGE_REF_PREFIX = "/api/images/"
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URI_RE = re.compile(r"^data:(?P<type>[^;,]*)(?:;[^;,]*)*?;base64,", re.I)
+
+
+def is_valid_digest(digest: str) -> bool:
+    return bool(_DIGEST_RE.match(digest or ""))
+
+
+def parse_data_uri(value: str) -> Optional[Tuple[str, bytes]]:
+    """Decode a ``data:<type>;base64,...`` URI into (content_type, bytes)."""
+    if not isinstance(value, str):
+        return None
+    match = _DATA_URI_RE.match(value)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(value[match.end():], validate=False)
+    except (ValueError, TypeError):
+        return None
+    return (match.group("type") or "application/octet-stream").lower(), data
+
+
+class BlobStore(abc.ABC):
+    """Content-addressed storage for binary blobs (generated images)."""
+
+    @abc.abstractmethod
+    def put(self, data: bytes, content_type: str) -> str:
+        """Store ``data`` and return its sha256 hex digest."""
+
+    @abc.abstractmethod
+    def get(self, digest: str) -> Optional[bytes]:
+        """Return the blob's bytes, or None if it is not stored."""
+
+    @abc.abstractmethod
+    def content_type(self, digest: str) -> Optional[str]:
+        """Return the blob's content type, or None if it is not stored."""
+
+    def exists(self, digest: str) -> bool:
+        return self.content_type(digest) is not None
+
+
+class LocalBlobStore(BlobStore):
+    """Blob store on the local filesystem, sharded as ``<root>/<ab>/<digest>``."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data: bytes, content_type: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write data and metadata to temp files, then rename into place so
+        # readers never observe a partially written blob.
+        meta = json.dumps({"content_type": content_type, "size": len(data)}).encode()
+        for target, payload in ((path + ".meta", meta), (path, data)):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "wb") as tmp:
+                    tmp.write(payload)
+                os.replace(tmp_path, target)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        if not is_valid_digest(digest):
+            return None
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def content_type(self, digest: str) -> Optional[str]:
+        if not is_valid_digest(digest) or not os.path.exists(self._path(digest)):
+            return None
+        try:
+            with open(self._path(digest) + ".meta", "rb") as f:
+                return json.loads(f.read()).get("content_type") or "application/octet-stream"
+        except (FileNotFoundError, ValueError):
+            return "application/octet-stream"
+
+
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store selected by ``BLOB_STORE_BACKEND``."""
+    global _store
+    if _store is None:
+        if BLOB_STORE_BACKEND == "local":
+            _store = LocalBlobStore(BLOB_STORE_PATH)
+        else:
+            raise ValueError(f"Unsupported BLOB_STORE_BACKEND: {BLOB_STORE_BACKEND}")
+    return _store
+
+
+def image_ref(digest: str) -> str:
+    return f"{IMAGE_REF_PREFIX}{digest}"
+
+
+def externalize_image(value: str, store: Optional[BlobStore] = None) -> str:
+    """Move an inline data URI into the blob store and return its reference.
+
+    Anything that is not a base64 data URI (text descriptions, existing
+    references, external URLs) is returned unchanged.
+    """
+    parsed = parse_data_uri(value)
+    if parsed is None:
+        return value
+    content_type, data = parsed
+    digest = (store or get_blob_store()).put(data, content_type)
+    return image_ref(digest)
+
+
+def externalize_images(values: Optional[List[str]], store: Optional[BlobStore] = None) -> List[str]:
+    return [externalize_image(v, store) for v in (values or [])]
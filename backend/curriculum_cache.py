@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Grade, Subject, Chapter, Topic
+
+# Upper bound on staleness for writes made outside this process (seed scripts,
+# other workers); writes through models.create_* invalidate immediately.
+CURRICULUM_CACHE_TTL_SECONDS = float(os.getenv("CURRICULUM_CACHE_TTL_SECONDS", "300"))
+
+
+def _row(obj, *fields: str) -> dict:
+    return {field: getattr(obj, field) for field in fields}
+
+
+class CurriculumSnapshot:
+    """Immutable copy of the Grade/Subject/Chapter/Topic hierarchy."""
+
+    def __init__(self, grades, subjects, chapters, topics):
+        self.grades: List[dict] = [_row(g, "id", "name", "description") for g in grades]
+        self.subjects: List[dict] = [
+            _row(s, "id", "name", "description", "grade_id") for s in subjects
+        ]
+        self.chapters: List[dict] = [
+            _row(c, "id", "name", "description", "subject_id") for c in chapters
+        ]
+        self.topics: List[dict] = [
+            {**_row(t, "id", "name", "description", "chapter_id"), "subtopics": list(t.subtopics or [])}
+            for t in topics
+        ]
+
+        self.subjects_by_grade = self._group(self.subjects, "grade_id")
+        self.chapters_by_subject = self._group(self.chapters, "subject_id")
+        self.topics_by_chapter = self._group(self.topics, "chapter_id")
+        self._encoded: Dict[Optional[str], tuple] = {}
+
+    @staticmethod
+    def _group(rows: List[dict], key: str) -> Dict[str, List[dict]]:
+        grouped: Dict[str, List[dict]] = {}
+        for row in rows:
+            grouped.setdefault(row[key], []).append(row)
+        return grouped
+
+    def tree(self, grade_id: Optional[str] = None) -> List[dict]:
+        """Nested grades -> subjects -> chapters -> topics, optionally for one grade."""
+        grades = [g for g in self.grades if grade_id is None or g["id"] == grade_id]
+        return [
+            {
+                **grade,
+                "subjects": [
+                    {
+                        **subject,
+                        "chapters": [
+                            {**chapter, "topics": self.topics_by_chapter.get(chapter["id"], [])}
+                            for chapter in self.chapters_by_subject.get(subject["id"], [])
+                        ],
+                    }
+                    for subject in self.subjects_by_grade.get(grade["id"], [])
+                ],
+            }
+            for grade in grades
+        ]
+
+    def encoded_tree(self, grade_id: Optional[str] = None) -> tuple:
+        """Return ``(json_bytes, strong_etag)`` for the tree, memoized per scope."""
+        if grade_id not in self._encoded:
+            body = json.dumps(
+                self.tree(grade_id), sort_keys=True, separators=(",", ":"), ensure_ascii=False
+            ).encode("utf-8")
+            self._encoded[grade_id] = (body, f'"{hashlib.sha256(body).hexdigest()}"')
+        return self._encoded[grade_id]
+
+
+class CurriculumCache:
+    """
+    Process-level cache of the curriculum hierarchy.
+
+    The whole tree is loaded with one query per level on first use and then
+    served from memory until it is invalidated or the TTL expires.
+    """
+
+    def __init__(self, ttl_seconds: float = CURRICULUM_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[CurriculumSnapshot] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._counters = {"hits": 0, "loads": 0, "invalidations": 0}
+
+    def _fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and time.monotonic() - self._loaded_at < self.ttl_seconds
+        )
+
+    async def get(self, db: AsyncSession) -> CurriculumSnapshot:
+        if self._fresh():
+            self._counters["hits"] += 1
+            return self._snapshot
+
+        async with self._lock:
+            if self._fresh():
+                self._counters["hits"] += 1
+                return self._snapshot
+
+            generation = self._generation
+            snapshot = CurriculumSnapshot(
+                (await db.scalars(select(Grade).order_by(Grade.id))).all(),
+                (await db.scalars(select(Subject).order_by(Subject.id))).all(),
+                (await db.scalars(select(Chapter).order_by(Chapter.id))).all(),
+                (await db.scalars(select(Topic).order_by(Topic.id))).all(),
+            )
+            self._counters["loads"] += 1
+            # Don't publish a snapshot that a concurrent write already invalidated
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._snapshot = None
+        self._counters["invalidations"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self._counters,
+            "cached": self._snapshot is not None,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+curriculum_cache = CurriculumCache()
@@ -1,6 +1,9 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, String, Integer, Text, JSON, ForeignKey, DateTime, Boolean
+from sqlalchemy import create_engine, Column, String, Integer, BigInteger, LargeBinary, Text, JSON, ForeignKey, DateTime, Boolean, Index
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.orderinglist import ordering_list
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -11,9 +14,38 @@ load_dotenv()
 # Get database URL from environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+
+def _async_database_url(url: str) -> str:
+    """Map a sync SQLAlchemy URL onto the matching async driver (psycopg 3 async)."""
+    if url.startswith("postgresql+psycopg://"):
+        return url  # psycopg 3 serves both sync and async engines
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Sync engine: schema creation, seeding and maintenance scripts
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: used by the API so queries never block the event loop.
+# expire_on_commit=False keeps loaded attributes usable after commit without
+# an implicit (and in async, illegal) lazy refresh.
+_async_engine_options = {"pool_pre_ping": True}
+if not ASYNC_DATABASE_URL.startswith("sqlite"):
+    _async_engine_options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_async_engine_options)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 class User(Base):
@@ -45,7 +77,7 @@ class Subject(Base):
     id = Column(String, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
-    grade_id = Column(String, ForeignKey("grades.id"))
+    grade_id = Column(String, ForeignKey("grades.id"), index=True)
     
     # Relationships
     grade = relationship("Grade", back_populates="subjects")
@@ -57,7 +89,7 @@ class Chapter(Base):
     id = Column(String, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
-    subject_id = Column(String, ForeignKey("subjects.id"))
+    subject_id = Column(String, ForeignKey("subjects.id"), index=True)
     
     # Relationships
     subject = relationship("Subject", back_populates="chapters")
@@ -69,7 +101,7 @@ class Topic(Base):
     id = Column(String, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
-    chapter_id = Column(String, ForeignKey("chapters.id"))
+    chapter_id = Column(String, ForeignKey("chapters.id"), index=True)
     subtopics = Column(JSON, default=[])
     
     # Relationships
@@ -88,14 +120,29 @@ class Question(Base):
     images = Column(JSON, default=[])
     difficulty = Column(String, index=True)  # easy, medium, hard
     marks = Column(Integer, default=1)
-    topic_id = Column(String, ForeignKey("topics.id"))
+    topic_id = Column(String, ForeignKey("topics.id"), index=True)
     user_id = Column(String, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Question-bank reuse bookkeeping: how often / when it was last handed out
+    times_served = Column(Integer, default=0, server_default="0", nullable=False)
+    last_served_at = Column(DateTime, nullable=True)
+    # Near-duplicate detection: MinHash signature (see dedup.py) and the bank
+    # question this one was flagged as a near-duplicate of
+    minhash = Column(LargeBinary, nullable=True)
+    duplicate_of = Column(String, nullable=True)
     
     # Relationships
     topic = relationship("Topic", back_populates="questions")
     user = relationship("User", back_populates="questions")
 
+    __table_args__ = (
+        # Listing/keyset pagination: WHERE user_id [AND topic_id] ORDER BY created_at, id
+        Index("ix_questions_user_created", "user_id", "created_at", "id"),
+        Index("ix_questions_user_topic_created", "user_id", "topic_id", "created_at", "id"),
+        # Bank lookup for reuse: match slot, least recently served first
+        Index("ix_questions_bank", "user_id", "topic_id", "type", "difficulty", "last_served_at"),
+    )
+
 class Worksheet(Base):
     __tablename__ = "worksheets"
     
@@ -103,9 +150,86 @@ class Worksheet(Base):
     name = Column(String, index=True)
     topic_id = Column(String, ForeignKey("topics.id"))
     user_id = Column(String, ForeignKey("users.id"))
-    question_ids = Column(JSON, default=[])
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    user = relationship("User", back_populates="worksheets")
\ No newline at end of file
+    user = relationship("User", back_populates="worksheets")
+    question_links = relationship(
+        "WorksheetQuestion",
+        order_by="WorksheetQuestion.position",
+        collection_class=ordering_list("position"),
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+
+    # Ordered question ids, backed by worksheet_questions
+    question_ids = association_proxy(
+        "question_links", "question_id",
+        creator=lambda question_id: WorksheetQuestion(question_id=question_id),
+    )
+
+    @property
+    def questions(self):
+        """Linked questions in position order (load with contains_eager/selectin)."""
+        return [link.question for link in self.question_links]
+
+    __table_args__ = (
+        Index("ix_worksheets_user_created", "user_id", "created_at", "id"),
+    )
+
+class WorksheetQuestion(Base):
+    __tablename__ = "worksheet_questions"
+
+    worksheet_id = Column(String, ForeignKey("worksheets.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    question_id = Column(String, ForeignKey("questions.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    # Relationships
+    question = relationship("Question")
+
+class QuestionLSHBand(Base):
+    """LSH index over question MinHash signatures: one bucket per band per question."""
+    __tablename__ = "question_lsh_bands"
+
+    question_id = Column(String, ForeignKey("questions.id", ondelete="CASCADE"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, nullable=False)
+    # Denormalized from questions so candidate lookups stay on this index
+    user_id = Column(String, nullable=False)
+    topic_id = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index("ix_question_lsh_bands_lookup", "user_id", "topic_id", "band", "bucket"),
+    )
+
+class PooledQuestion(Base):
+    """Pre-generated question not yet handed to any user (see warm_pool.py)."""
+    __tablename__ = "question_pool"
+
+    id = Column(String, primary_key=True)
+    topic_id = Column(String, ForeignKey("topics.id", ondelete="CASCADE"), nullable=False)
+    type = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)  # question dict as parsed from the LLM
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Claim lookup: oldest first within a slot
+        Index("ix_question_pool_slot", "topic_id", "type", "difficulty", "created_at"),
+    )
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    
+    id = Column(String, primary_key=True, index=True)
+    kind = Column(String)  # worksheet, quiz, exam
+    status = Column(String, index=True)  # queued, running, succeeded, failed, cancelled
+    request = Column(JSON, default={})
+    topic_ids = Column(JSON, default=[])
+    question_ids = Column(JSON, default=[])
+    error = Column(Text, nullable=True)
+    user_id = Column(String, ForeignKey("users.id"), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
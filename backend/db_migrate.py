@@ -0,0 +1,46 @@
+"""
+Apply the Alembic migrations in ``migrations/`` to DATABASE_URL.
+
+Databases created before migrations existed (by ``Base.metadata.create_all``)
+already have the tables but no ``alembic_version``; they are stamped at the
+initial revision first so that only the later migrations run.
+
+Usage:
+    python db_migrate.py [revision]      # defaults to "head"
+"""
+import os
+import sys
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from database import engine
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_REVISION = "0001"
+
+
+def _alembic_config(connection=None) -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_database(revision: str = "head", bind=None) -> None:
+    """Upgrade ``bind`` (an Engine, default: DATABASE_URL's) to ``revision``."""
+    with (bind or engine).begin() as connection:
+        tables = set(inspect(connection).get_table_names())
+        config = _alembic_config(connection)
+        if "alembic_version" not in tables and "questions" in tables:
+            print(f"DEBUG: Stamping pre-migration database at revision {BASELINE_REVISION}")
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+
+
+if __name__ == "__main__":
+    upgrade_database(sys.argv[1] if len(sys.argv) > 1 else "head")
+    print("Database is up to date")
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# MinHash / LSH parameters. 128 permutations split into 16 bands of 8 rows
+# puts the LSH candidate threshold at roughly (1/16) ** (1/8) ~= 0.71 Jaccard,
+# comfortably below DEDUP_THRESHOLD so true near-duplicates are almost never
+# missed; candidates are then confirmed against the full signature.
+NUM_PERM = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 5
+
+DEDUP_MODES = ("off", "flag", "replace")
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag").lower()
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+
+if DEDUP_MODE not in DEDUP_MODES:
+    print(f"DEBUG: Unknown DEDUP_MODE {DEDUP_MODE!r}, falling back to 'flag'")
+    DEDUP_MODE = "flag"
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SHIFT = np.uint64(32)
+
+# Multiply-shift hash family: h(x) = (a * x + b) mod 2**64 >> 32 with odd a.
+# Fixed seed: signatures are persisted, so the permutations must never change
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+_BYTE_WEIGHTS = np.array([1 << (8 * i) for i in range(SHINGLE_SIZE)], dtype=np.uint64)
+
+# Shingles processed per vectorized step (bounds the NUM_PERM x N work matrix)
+_CHUNK_SHINGLES = 16384
+
+_LATEX_WRAPPERS_RE = re.compile(
+    r"\\(?:left|right|displaystyle|textstyle|text|mathrm|mathbf|mathit|operatorname)(?![a-z])"
+)
+_LATEX_ALIASES = {
+    "dfrac": "frac", "tfrac": "frac", "cdot": "*", "times": "*", "div": "/",
+    "le": "<=", "leq": "<=", "ge": ">=", "geq": ">=", "neq": "!=", "ne": "!=",
+}
+_LATEX_COMMAND_RE = re.compile(r"\\([a-z]+)")
+_SPACING_RE = re.compile(r"\\[,;:! ]|~")
+_NON_CONTENT_RE = re.compile(r"[^a-z0-9+\-*/=<>!^_ ]+")
+
+
+def normalize_question_text(text: str) -> str:
+    """
+    Canonical form for similarity.
+
+    Case, unicode forms, math delimiters, braces, spacing commands and common
+    LaTeX synonyms (``\\dfrac`` vs ``\\frac``) are folded so that formatting
+    variants of the same question normalize identically.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _LATEX_WRAPPERS_RE.sub(" ", text)
+    text = _SPACING_RE.sub(" ", text)
+    text = _LATEX_COMMAND_RE.sub(lambda m: f" {_LATEX_ALIASES.get(m.group(1), m.group(1))} ", text)
+    text = _NON_CONTENT_RE.sub("", text)
+    return " ".join(text.split())
+
+
+def _shingle_hashes(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    32-bit hashes of the byte k-grams of every normalized text, concatenated,
+    plus the number of k-grams per text.
+
+    All texts are shingled in one pass over a single buffer; windows that
+    would straddle two texts are skipped. Repeated k-grams are kept since
+    they can't change a minimum.
+    """
+    # Spaces carry no signal once markup is gone and differ between variants
+    encoded = [
+        normalize_question_text(text).replace(" ", "").encode("utf-8").ljust(SHINGLE_SIZE, b"\0")
+        for text in texts
+    ]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE)
+    # A k-gram of <= 8 bytes packs exactly into a uint64; multiply-shift to 32 bits
+    packed = windows.astype(np.uint64) @ _BYTE_WEIGHTS
+
+    counts = lengths - SHINGLE_SIZE + 1
+    text_starts = np.cumsum(lengths) - lengths
+    shingle_starts = np.cumsum(counts) - counts
+    positions = np.repeat(text_starts - shingle_starts, counts) + np.arange(counts.sum())
+    return (packed[positions] * _MIX) >> _SHIFT, counts
+
+
+def minhash_signatures(texts: Iterable[str]) -> np.ndarray:
+    """
+    MinHash signatures for many texts at once, shape ``(len(texts), NUM_PERM)``.
+
+    All shingles of a chunk of texts are hashed under every permutation in a
+    single vectorized step and reduced per text with ``np.minimum.reduceat``.
+    """
+    texts = list(texts)
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    if not texts:
+        return signatures
+
+    values, counts = _shingle_hashes(texts)
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    start = 0
+    while start < len(texts):
+        # As many texts as fit in _CHUNK_SHINGLES, but always at least one
+        end = int(np.searchsorted(bounds, bounds[start] + _CHUNK_SHINGLES, side="right")) - 1
+        end = max(end, start + 1)
+        # In-place ops avoid allocating a fresh NUM_PERM x N matrix per step
+        hashed = np.multiply(values[None, bounds[start]:bounds[end]], _PERM_A[:, None])
+        hashed += _PERM_B[:, None]
+        hashed >>= _SHIFT
+        offsets = bounds[start:end] - bounds[start]
+        signatures[start:end] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        start = end
+    return signatures
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+
+def lsh_buckets(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit bucket key per band (fits a BIGINT column)."""
+    raw = signature.astype("<u4").tobytes()
+    band_bytes = LSH_ROWS * 4
+    return [
+        int.from_bytes(
+            hashlib.blake2b(raw[i * band_bytes:(i + 1) * band_bytes], digest_size=8).digest(),
+            "little",
+            signed=True,
+        )
+        for i in range(LSH_BANDS)
+    ]
+
+
+def estimate_similarity(signature: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity of ``signature`` against each row of ``others``."""
+    if others.size == 0:
+        return np.zeros(0)
+    return (others == signature[None, :]).mean(axis=1)
+
+
+def best_match(
+    signature: np.ndarray, candidate_ids: List[str], candidate_signatures: np.ndarray
+) -> Optional[tuple]:
+    """``(id, similarity)`` of the most similar candidate at or above DEDUP_THRESHOLD."""
+    if not candidate_ids:
+        return None
+    similarities = estimate_similarity(signature, candidate_signatures)
+    best = int(np.argmax(similarities))
+    if similarities[best] < DEDUP_THRESHOLD:
+        return None
+    return candidate_ids[best], float(similarities[best])
+
+
+class SignatureIndex:
+    """Per-topic signatures searched with one vectorized comparison per probe."""
+
+    def __init__(self):
+        self._ids: Dict[str, List[Optional[str]]] = {}
+        self._signatures: Dict[str, List[np.ndarray]] = {}
+
+    def add(self, topic_id: str, question_id: Optional[str], signature: np.ndarray) -> None:
+        self._ids.setdefault(topic_id, []).append(question_id)
+        self._signatures.setdefault(topic_id, []).append(signature)
+
+    def match(self, topic_id: str, signature: np.ndarray) -> Optional[tuple]:
+        ids = self._ids.get(topic_id)
+        if not ids:
+            return None
+        return best_match(signature, ids, np.vstack(self._signatures[topic_id]))
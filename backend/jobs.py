@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, GenerationJob
+
+# Job lifecycle states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+JOB_FINAL_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when the in-process job queue cannot take more work."""
+
+
+# Coroutine that performs a job and returns the ids of the questions it created
+JobExecutor = Callable[[AsyncSession, GenerationJob], Awaitable[List[str]]]
+
+
+class InProcessJobRunner:
+    """
+    Bounded pool of asyncio workers executing generation jobs in-process.
+
+    Job state lives in the ``generation_jobs`` table, so queued and
+    interrupted jobs are picked up again by ``start()`` after a restart.
+    """
+
+    def __init__(self, execute: JobExecutor, workers: int = 2, max_queue: int = 100):
+        self._execute = execute
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancel_requested: Set[str] = set()
+
+    async def start(self) -> None:
+        """Start the workers and re-enqueue jobs left over from a previous run."""
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+
+        async with AsyncSessionLocal() as db:
+            pending = (
+                await db.scalars(
+                    select(GenerationJob)
+                    .where(GenerationJob.status.in_([JOB_QUEUED, JOB_RUNNING]))
+                    .order_by(GenerationJob.created_at)
+                )
+            ).all()
+            for job in pending:
+                job.status = JOB_QUEUED
+                job.started_at = None
+            await db.commit()
+            for job in pending:
+                self._queue.put_nowait(job.id)
+            if pending:
+                print(f"DEBUG: Re-enqueued {len(pending)} unfinished generation job(s)")
+        print(f"DEBUG: Job runner started with {self.workers} worker(s)")
+
+    async def stop(self) -> None:
+        """Stop the workers. Interrupted jobs stay 'running' and resume on restart."""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+
+    def submit(self, job_id: str) -> None:
+        """Enqueue an already-persisted job."""
+        if self._queue is None:
+            raise RuntimeError("Job runner is not started")
+        if self._queue.qsize() >= self.max_queue:
+            raise QueueFullError("Generation job queue is full")
+        self._queue.put_nowait(job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished."""
+        # Flag first: a worker that claims the job from here on sees the request
+        self._cancel_requested.add(job_id)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == JOB_QUEUED)
+                .values(status=JOB_CANCELLED, finished_at=datetime.utcnow())
+            )
+            await db.commit()
+            if result.rowcount:
+                self._cancel_requested.discard(job_id)
+                return True
+
+            task = self._running.get(job_id)
+            if task is not None:
+                task.cancel()
+                return True
+
+            # Not queued and no task yet: either a worker is between claiming
+            # the job and starting it (it will honour the flag), or it's done
+            job = await db.get(GenerationJob, job_id)
+            if job is None or job.status in JOB_FINAL_STATES:
+                self._cancel_requested.discard(job_id)
+                return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": len(self._running),
+        }
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ERROR: Job worker {index} crashed on job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        async with AsyncSessionLocal() as db:
+            # Claim the job only if it is still queued, so a concurrent cancel()
+            # of a queued job can't be overwritten
+            claimed = await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == JOB_QUEUED)
+                .values(status=JOB_RUNNING, started_at=datetime.utcnow())
+            )
+            await db.commit()
+            if not claimed.rowcount:
+                return
+            job = await db.get(GenerationJob, job_id)
+
+            task = asyncio.create_task(self._execute(db, job))
+            self._running[job_id] = task
+            if job_id in self._cancel_requested:
+                task.cancel()  # cancel() landed before the task was registered
+            try:
+                question_ids = await task
+            except asyncio.CancelledError:
+                if job_id not in self._cancel_requested:
+                    raise  # worker shutdown: leave the job for the next start()
+                await db.rollback()
+                job.status = JOB_CANCELLED
+                job.error = "Cancelled by user"
+            except Exception as e:
+                await db.rollback()
+                job.status = JOB_FAILED
+                job.error = str(getattr(e, "detail", None) or e)
+                print(f"ERROR: Generation job {job_id} failed: {job.error}")
+            else:
+                job.status = JOB_SUCCEEDED
+                job.question_ids = question_ids
+            finally:
+                self._running.pop(job_id, None)
+                self._cancel_requested.discard(job_id)
+
+            job.finished_at = datetime.utcnow()
+            await db.commit()
+            print(f"DEBUG: Generation job {job_id} finished with status '{job.status}'")
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bump when the cached value format or prompt semantics change so that old
+# entries are never served for new-style requests.
+CACHE_FORMAT_VERSION = 1
+
+
+def make_cache_key(model: str, messages: List[dict], **extra: Any) -> str:
+    """Content-address a completion request: sha256 of its canonical JSON form."""
+    canonical = json.dumps(
+        {
+            "v": CACHE_FORMAT_VERSION,
+            "model": model,
+            "messages": [
+                {"role": m["role"], "content": " ".join(m["content"].split())}
+                for m in messages
+            ],
+            **extra,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent SQLite cache of parsed LLM completions with LRU + TTL eviction.
+
+    Values are stored as JSON and decoded on every hit, so callers always get
+    a fresh copy they are free to mutate. Hits only update an in-memory
+    access log; it is written back with the next store, before eviction, or
+    once ``flush_every`` hits have piled up, so a hit costs no write or commit.
+
+    All methods block on SQLite; async callers should run them in an
+    executor.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        max_bytes: int = 200 * 1024 * 1024,
+        enabled: bool = True,
+        flush_every: int = 100,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.flush_every = flush_every
+        # key -> (last access time, hits not yet written)
+        self._pending_access: Dict[str, Tuple[float, int]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key`` or None on a miss/expired entry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+            _, pending_hits = self._pending_access.get(key, (now, 0))
+            self._pending_access[key] = (now, pending_hits + 1)
+            self._counters["hits"] += 1
+            if len(self._pending_access) >= self.flush_every:
+                self._flush_access(conn)
+                conn.commit()
+        return json.loads(value)
+
+    def _flush_access(self, conn: sqlite3.Connection) -> None:
+        """Write the batched hit counts and access times (caller commits)."""
+        if not self._pending_access:
+            return
+        conn.executemany(
+            "UPDATE llm_cache SET last_access = ?, hits = hits + ? WHERE key = ?",
+            [(at, hits, key) for key, (at, hits) in self._pending_access.items()],
+        )
+        self._pending_access.clear()
+
+    def set(self, key: str, model: str, value: Any) -> None:
+        """Store ``value`` under ``key`` and evict least-recently-used entries over the limits."""
+        if not self.enabled:
+            return
+        encoded = json.dumps(value, ensure_ascii=False)
+        size = len(encoded.encode("utf-8"))
+        if self.max_bytes and size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, model, value, size, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, model, encoded, size, now, now),
+            )
+            self._pending_access.pop(key, None)
+            self._counters["stores"] += 1
+            self._flush_access(conn)
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.ttl_seconds:
+            cursor = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self._counters["expired"] += max(cursor.rowcount, 0)
+
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY last_access ASC"
+        ).fetchall()
+        victims = []
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        self._counters["evictions"] += len(victims)
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            self._pending_access.clear()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters plus current entry count and size."""
+        stats = {
+            "enabled": self.enabled,
+            "path": self.path,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            **self._counters,
+            "entries": 0,
+            "bytes": 0,
+        }
+        lookups = self._counters["hits"] + self._counters["misses"]
+        stats["hit_rate"] = self._counters["hits"] / lookups if lookups else 0.0
+        if self.enabled:
+            with self._lock:
+                count, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+                ).fetchone()
+            stats["entries"] = count
+            stats["bytes"] = total
+        return stats
+
+    def flush(self) -> None:
+        """Write any batched hit counts now."""
+        with self._lock:
+            if self._pending_access:
+                conn = self._connect()
+                self._flush_access(conn)
+                conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._flush_access(self._conn)
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,375 @@
+import json
+import re
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from pydantic import AliasChoices, BaseModel, Field, TypeAdapter, ValidationError, field_validator
+
+# Single backslashes that do not start a valid JSON escape are LaTeX commands
+# (\frac, \epsilon, \,) the model forgot to double; escape them.
+_INVALID_ESCAPE_RE = re.compile(r'(?<!\\)\\(?!["\\/bfnrtu])')
+
+
+def repair_latex_escapes(text: str) -> str:
+    """Double lone backslashes so LaTeX inside JSON strings parses."""
+    return _INVALID_ESCAPE_RE.sub(r"\\\\", text)
+
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+class LLMQuestion(BaseModel):
+    """One question as emitted by the model, with the field spellings models use."""
+    type: str = "mcq"
+    text: str = Field(validation_alias=AliasChoices("text", "question", "question_text"))
+    options: List[Any] = Field(default_factory=list, validation_alias=AliasChoices("options", "choices"))
+    correct_answer: Any = Field(default=None, validation_alias=AliasChoices("correct_answer", "answer"))
+    explanation: str = ""
+    images: List[Any] = Field(default_factory=list)
+    difficulty: str = "medium"
+    marks: int = 1
+
+    class Config:
+        extra = "allow"  # keep "topic" and anything else the prompt asks for
+
+    @field_validator("type", "explanation", "difficulty", "marks", "options", "images", mode="before")
+    @classmethod
+    def _null_as_default(cls, value, info):
+        if value is not None:
+            return value
+        return cls.model_fields[info.field_name].get_default(call_default_factory=True)
+
+
+_QUESTION_ADAPTER = TypeAdapter(LLMQuestion)
+_QUESTION_LIST_ADAPTER = TypeAdapter(List[LLMQuestion])
+
+
+def validate_question(obj: Any) -> Optional[dict]:
+    """Validated question dict, or None if ``obj`` isn't a usable question."""
+    try:
+        return _QUESTION_ADAPTER.validate_python(obj).model_dump()
+    except ValidationError:
+        return None
+
+
+def validate_questions(items: List[Any]) -> Tuple[List[dict], int]:
+    """Validate a batch in one pass; on failure fall back to per-item. Returns (valid, rejected)."""
+    try:
+        return [q.model_dump() for q in _QUESTION_LIST_ADAPTER.validate_python(items)], 0
+    except ValidationError:
+        valid = [q for q in map(validate_question, items) if q is not None]
+        return valid, len(items) - len(valid)
+
+
+# JSON schema for OpenRouter structured outputs (strict mode needs an object root)
+QUESTIONS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "questions",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "questions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "type": {"type": "string", "enum": ["mcq", "short", "long", "image"]},
+                            "topic": {"type": "string"},
+                            "text": {"type": "string"},
+                            "options": {"type": "array", "items": {"type": "string"}},
+                            "correct_answer": {"anyOf": [{"type": "string"}, {"type": "integer"}]},
+                            "explanation": {"type": "string"},
+                            "images": {"type": "array", "items": {"type": "string"}},
+                            "difficulty": {"type": "string", "enum": ["easy", "medium", "hard"]},
+                            "marks": {"type": "integer"},
+                        },
+                        "required": [
+                            "type", "topic", "text", "options", "correct_answer",
+                            "explanation", "images", "difficulty", "marks",
+                        ],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["questions"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+# ---------------------------------------------------------------------------
+# Tolerant tokenizer
+# ---------------------------------------------------------------------------
+
+# Keys under which models nest the question list ({"questions": [...]})
+CONTAINER_KEYS = frozenset({"questions", "items", "data", "results", "quiz", "exam", "worksheet"})
+TEXT_KEYS = ("text", "question", "question_text")
+
+# LaTeX commands that begin with a JSON escape letter (\f, \n, \t, \b, \r):
+# "\frac" must become "\\frac", while "\nThe" is a real newline escape.
+_LATEX_ESCAPE_COMMANDS = frozenset({
+    "bar", "beta", "bf", "big", "bigg", "binom", "bigl", "bigr", "bmod", "boldsymbol", "bot", "bullet",
+    "forall", "frac", "flat", "frown",
+    "nabla", "ne", "neg", "neq", "newline", "ni", "not", "notin", "nu", "nmid", "nleq", "ngeq",
+    "rangle", "rceil", "rfloor", "rho", "right", "rightarrow", "rightleftharpoons", "rm", "root",
+    "tan", "tanh", "tau", "text", "textbf", "textit", "textrm", "tfrac", "theta", "therefore",
+    "tilde", "times", "to", "top", "triangle", "triangleq",
+})
+
+_OUTSIDE_RE = re.compile(r'[{}\[\]",]')
+_STRING_RE = re.compile(r'["\\]')
+_LETTERS_RE = re.compile(r"[A-Za-z]*")
+_HEX4_RE = re.compile(r"[0-9a-fA-F]{4}")
+_DECODER = json.JSONDecoder(strict=False)  # models emit raw newlines inside strings
+
+
+class IncrementalQuestionParser:
+    """
+    Single-pass tolerant tokenizer that recovers question objects from LLM output.
+
+    Feed completion text as it arrives (or all at once); every complete
+    question object is returned as soon as its closing brace is seen, whether
+    it sits in a bare ``[...]`` array, a ``{"questions": [...]}`` wrapper, or
+    stands alone. The scanner jumps between structural characters with one
+    regex search at a time and copies the text of open objects in verbatim
+    spans, breaking a span only to double a lone LaTeX backslash or drop a
+    trailing comma, so each object is decoded exactly once. Noise around the
+    JSON (code fences, chat tokens, prose) and a truncated tail are skipped.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._in_string = False
+        self._frames: List[list] = []  # [kind, start, key in parent, child emitted]
+        self._objects_open = 0
+        # Text of the outermost open object: flushed pieces plus text[_copy_from:i]
+        self._out: List[str] = []
+        self._out_len = 0
+        self._copy_from = 0
+        self._string_start = 0  # buffer position just after the opening quote
+        self._last_string: Optional[str] = None
+        self._comma_at: Optional[int] = None  # buffer position of a possibly trailing comma
+        self.errors = 0
+
+    # ---------------------- Output buffer ---------------------- #
+
+    def _flush(self, text: str, i: int) -> None:
+        """Move text[_copy_from:i] into the buffer."""
+        if self._objects_open and i > self._copy_from:
+            self._out.append(text[self._copy_from:i])
+            self._out_len += i - self._copy_from
+        self._copy_from = i
+
+    def _buffer(self, text: str, i: int) -> str:
+        self._flush(text, i)
+        joined = "".join(self._out)
+        self._out = [joined]
+        return joined
+
+    def _reset_buffer(self, i: int) -> None:
+        self._out = []
+        self._out_len = 0
+        self._copy_from = i
+        self._comma_at = None
+
+    # ---------------------- Scanning ---------------------- #
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Consume ``chunk`` and return the question objects completed by it."""
+        text = self._pending + chunk
+        self._pending = ""
+        self._copy_from = 0
+        completed: List[dict] = []
+        pos, end = 0, len(text)
+        while pos < end:
+            if self._in_string:
+                match = _STRING_RE.search(text, pos)
+                if match is None:
+                    break
+                i = match.start()
+                if text[i] == '"':
+                    self._in_string = False
+                    self._end_string(text, i)
+                    pos = i + 1
+                    continue
+                pos = self._escape(text, i)
+                if pos is None:  # escape split across chunks: wait for more
+                    self._flush(text, i)
+                    self._pending = text[i:]
+                    return completed
+                continue
+
+            match = _OUTSIDE_RE.search(text, pos)
+            if match is None:
+                if not text[pos:].isspace():
+                    self._comma_at = None
+                break
+            i = match.start()
+            if self._comma_at is not None and i > pos and not text[pos:i].isspace():
+                self._comma_at = None
+            pos = i + 1
+            ch = text[i]
+            if ch == '"':
+                # Strings only matter inside an object; outside they are noise
+                if self._objects_open:
+                    self._in_string = True
+                    self._string_start = self._out_len + i + 1 - self._copy_from
+                    self._comma_at = None
+            elif ch in "[{":
+                parent_is_object = bool(self._frames) and self._frames[-1][0] == "{"
+                key = self._last_string if parent_is_object else None
+                if ch == "{":
+                    if not self._objects_open:
+                        self._reset_buffer(i)
+                    self._objects_open += 1
+                self._frames.append([ch, self._out_len + i - self._copy_from, key, False])
+                self._last_string = None
+                self._comma_at = None
+            elif ch in "]}":
+                if not self._frames:
+                    continue
+                if self._comma_at is not None:
+                    # Trailing comma before the closing bracket
+                    buffered = self._buffer(text, i)
+                    self._out = [buffered[:self._comma_at] + buffered[self._comma_at + 1:]]
+                    self._out_len -= 1
+                    self._comma_at = None
+                frame = self._frames.pop()
+                self._last_string = None
+                if frame[0] == "{":
+                    obj = self._close_object(text, i + 1, frame)
+                    self._objects_open -= 1
+                    if obj is not None:
+                        completed.append(obj)
+                    if not self._objects_open:
+                        self._reset_buffer(i + 1)
+            elif self._objects_open:  # ","
+                self._comma_at = self._out_len + i - self._copy_from
+        self._flush(text, end)
+        return completed
+
+    def _escape(self, text: str, i: int) -> Optional[int]:
+        """Skip the backslash sequence at ``i``, doubling LaTeX backslashes; next position or None."""
+        end = len(text)
+        if i + 1 >= end:
+            return None
+        nxt = text[i + 1]
+        if nxt in '"\\/':
+            return i + 2
+        if nxt == "u":
+            if i + 6 > end:
+                return None
+            if _HEX4_RE.match(text, i + 2):
+                return i + 6
+        elif nxt in "bfnrt":
+            word_end = _LETTERS_RE.match(text, i + 1).end()
+            if word_end == end:
+                return None
+            if text[i + 1:word_end] not in _LATEX_ESCAPE_COMMANDS:
+                return i + 2
+        # LaTeX command or symbol (\alpha, \frac, \,, \{): keep it literally
+        self._flush(text, i)
+        if self._objects_open:
+            self._out.append("\\")
+            self._out_len += 1
+        return i + 1
+
+    def _end_string(self, text: str, i: int) -> None:
+        if not self._frames or self._frames[-1][0] != "{":
+            self._last_string = None
+        elif self._out_len + i - self._copy_from - self._string_start > 64:
+            self._last_string = None
+        elif self._string_start >= self._out_len:
+            # Possible key, entirely in the unflushed span of this chunk
+            self._last_string = text[self._copy_from + self._string_start - self._out_len:i]
+        else:
+            self._last_string = self._buffer(text, i)[self._string_start:]
+
+    def _at_question_position(self, key: Optional[str]) -> bool:
+        """True unless some enclosing object holds this one under a non-container key."""
+        for idx, frame in enumerate(self._frames):
+            if frame[0] == "{":
+                child_key = self._frames[idx + 1][2] if idx + 1 < len(self._frames) else key
+                if child_key not in CONTAINER_KEYS:
+                    return False
+        return True
+
+    def _close_object(self, text: str, i: int, frame: list) -> Optional[dict]:
+        _, start, key, child_emitted = frame
+        if child_emitted or not self._at_question_position(key):
+            return None
+        try:
+            value = _DECODER.decode(self._buffer(text, i)[start:])
+        except ValueError:
+            self.errors += 1
+            return None
+        if not isinstance(value, dict) or not any(k in value for k in TEXT_KEYS):
+            return None
+        # Enclosing wrappers are never decoded themselves, so drop the copied text
+        for open_frame in self._frames:
+            open_frame[3] = True
+        self._reset_buffer(i)
+        return value
+
+
+# ---------------------------------------------------------------------------
+# One-shot parsing
+# ---------------------------------------------------------------------------
+
+# \f, \n, \t, \b, \r directly followed by letters: valid JSON, but probably a
+# LaTeX command (\frac, \theta) that json.loads would silently mangle
+_AMBIGUOUS_ESCAPE_RE = re.compile(r"(?<!\\)(?:\\\\)*\\[bfnrt][A-Za-z]")
+_JSON_START_RE = re.compile(r"[\[{]")
+
+class ParseResult(NamedTuple):
+    questions: List[dict]
+    rejected: int  # objects recovered but failing validation, or undecodable
+    path: str  # "fast" (the whole reply decoded) or "tolerant"
+
+
+def _question_items(value: Any) -> Optional[List[Any]]:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        for key in CONTAINER_KEYS:
+            if isinstance(value.get(key), list):
+                return value[key]
+        if any(k in value for k in TEXT_KEYS):
+            return [value]
+    return None
+
+
+def parse_questions(content: str) -> ParseResult:
+    """
+    Parse a complete question completion.
+
+    When the reply holds one JSON value (possibly fenced or wrapped in prose)
+    and no ambiguous escapes, it is decoded with a single ``raw_decode``
+    after the lone-backslash repair; anything else goes through the tolerant
+    tokenizer. Either way the questions are validated with a pydantic
+    ``TypeAdapter``.
+    """
+    items = None
+    match = _JSON_START_RE.search(content)
+    if match is not None and not _AMBIGUOUS_ESCAPE_RE.search(content):
+        text = repair_latex_escapes(content) if "\\" in content else content
+        start = match.start() if text is content else _JSON_START_RE.search(text).start()
+        try:
+            value, end = _DECODER.raw_decode(text, start)
+        except ValueError:
+            value, end = None, start
+        # A second JSON value after the first needs the tokenizer
+        if _JSON_START_RE.search(text, end) is None:
+            items = _question_items(value)
+
+    if items is not None:
+        questions, rejected = validate_questions(items)
+        return ParseResult(questions, rejected, "fast")
+
+    parser = IncrementalQuestionParser()
+    recovered = parser.feed(content)
+    questions, rejected = validate_questions(recovered)
+    return ParseResult(questions, rejected + parser.errors, "tolerant")
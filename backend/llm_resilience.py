@@ -0,0 +1,351 @@
+import asyncio
+import bisect
+import math
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Optional
+
+# Upstream answers worth retrying (rate limited, overloaded or broken gateway)
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+# Of those, the ones that mean "send less"
+OVERLOAD_STATUS = frozenset({429, 503})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(
+    attempt: int, base: float, cap: float, retry_after: Optional[float] = None
+) -> Optional[float]:
+    """
+    Backoff before retry number ``attempt`` (0-based): full jitter over an
+    exponentially growing window, or the server's ``Retry-After`` plus a
+    little jitter. None when the server asks us to wait longer than ``cap``.
+    """
+    if retry_after is not None:
+        if retry_after > cap:
+            return None
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with exponential forgetting.
+
+    Buckets grow by ``ratio`` from ``min_seconds`` up to ``max_seconds`` (25%
+    wide by default, so a percentile is accurate to within a quarter of its
+    value). Once ``window`` samples have accumulated every count is halved,
+    so the distribution tracks the model's recent behaviour.
+    """
+
+    def __init__(
+        self, min_seconds: float = 0.1, max_seconds: float = 600.0, ratio: float = 1.25, window: int = 500
+    ):
+        steps = int(math.ceil(math.log(max_seconds / min_seconds, ratio)))
+        self.bounds = [min_seconds * ratio ** i for i in range(steps + 1)]
+        self.counts = [0.0] * (len(self.bounds) + 1)  # last bucket: above max_seconds
+        self.window = window
+        self.total = 0.0
+        self.samples = 0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += 1
+        self.samples += 1
+        if self.total >= self.window:
+            self.counts = [count / 2 for count in self.counts]
+            self.total /= 2
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding quantile ``q`` (0-1); None when empty."""
+        if not self.total:
+            return None
+        target = q * self.total
+        seen = 0.0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return self.bounds[min(i, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def stats(self) -> dict:
+        stats = {"samples": self.samples}
+        for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            value = self.percentile(q)
+            stats[f"{name}_seconds"] = round(value, 2) if value is not None else None
+        return stats
+
+
+class HedgeBudget:
+    """
+    Token bucket capping hedged requests at ``max_rate`` of all requests.
+
+    Every request deposits ``max_rate`` tokens (up to ``burst``); a hedge
+    spends one, so over time at most that fraction of requests is hedged.
+    """
+
+    def __init__(self, max_rate: float, burst: float = 5.0):
+        self.max_rate = max(0.0, min(1.0, max_rate))
+        self.burst = max(1.0, burst)
+        self.tokens = 1.0
+        self.requests = 0
+        self.hedged = 0
+        self.denied = 0
+
+    def record_request(self) -> None:
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.max_rate)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            self.denied += 1
+            return False
+        self.tokens -= 1.0
+        self.hedged += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "max_rate": self.max_rate,
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "denied": self.denied,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "tokens": round(self.tokens, 2),
+        }
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one upstream model.
+
+    Every completed call inside ``latency_target`` raises the limit by
+    ``1 / limit`` (about +1 per limit's worth of calls); a 429/503, timeout or
+    slow call halves it. Only calls started after the previous decrease can
+    trigger another one, so a burst of 429s from the same wave counts once.
+    Callers beyond the limit wait in FIFO order.
+    """
+
+    def __init__(self, initial: float, minimum: float, maximum: float, latency_target: float):
+        self.minimum = max(1.0, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self.decreases = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting up to ``timeout`` seconds; False if none freed up."""
+        if self._has_capacity() and not self.queued:
+            self.in_flight += 1
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancel
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+    def on_success(self, started_at: float) -> None:
+        if time.monotonic() - started_at > self.latency_target:
+            self.on_overload(started_at)
+            return
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def on_overload(self, started_at: float) -> None:
+        if started_at < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        self.limit = max(self.minimum, self.limit / 2)
+        self.decreases += 1
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: opens after ``failure_threshold`` failures in
+    a row, rejects calls for ``reset_seconds``, then lets one probe through
+    (half-open) whose outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_started: Optional[float] = None
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "open":
+            if now - self.opened_at < self.reset_seconds:
+                return False
+            self.state = "half_open"
+            self._probe_started = None
+        if self.state == "half_open":
+            # A probe that never reported back (cancelled) expires after reset_seconds
+            if self._probe_started is not None and now - self._probe_started < self.reset_seconds:
+                return False
+            self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            print("DEBUG: Circuit breaker closed")
+        self.state = "closed"
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a probe through."""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+
+class ModelHealth:
+    """Limiter, breaker and counters for one upstream model."""
+
+    def __init__(self, model: str, limiter: AdaptiveLimiter, breaker: CircuitBreaker):
+        self.model = model
+        self.limiter = limiter
+        self.breaker = breaker
+        self.latency = LatencyHistogram()
+        self.counters = {
+            "calls": 0,
+            "failures": 0,
+            "overloaded": 0,
+            "retries": 0,
+            "queue_timeouts": 0,
+            "short_circuited": 0,
+            "failovers_from": 0,
+        }
+
+    def record_success(self, started_at: float, complete: bool = True) -> None:
+        """``complete``: the call's whole answer arrived (not just stream headers)."""
+        self.counters["calls"] += 1
+        if complete:
+            self.latency.record(time.monotonic() - started_at)
+        self.breaker.record_success()
+        self.limiter.on_success(started_at)
+
+    def record_failure(self, started_at: float, overloaded: bool) -> None:
+        self.counters["calls"] += 1
+        self.counters["failures"] += 1
+        self.breaker.record_failure()
+        if overloaded:
+            self.counters["overloaded"] += 1
+            self.limiter.on_overload(started_at)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "times_opened": self.breaker.times_opened,
+            "retry_in_seconds": round(self.breaker.retry_in(), 1),
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "queued": self.limiter.queued,
+            "limit_decreases": self.limiter.decreases,
+            "latency": self.latency.stats(),
+        }
+
+
+class UpstreamHealth:
+    """Per-model ``ModelHealth`` registry, created lazily with shared settings."""
+
+    def __init__(
+        self,
+        initial_concurrency: float = 4,
+        min_concurrency: float = 1,
+        max_concurrency: float = 32,
+        latency_target_seconds: float = 45.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+    ):
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target_seconds = latency_target_seconds
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._models: Dict[str, ModelHealth] = {}
+
+    def get(self, model: str) -> ModelHealth:
+        health = self._models.get(model)
+        if health is None:
+            health = ModelHealth(
+                model,
+                AdaptiveLimiter(
+                    self.initial_concurrency,
+                    self.min_concurrency,
+                    self.max_concurrency,
+                    self.latency_target_seconds,
+                ),
+                CircuitBreaker(self.failure_threshold, self.reset_seconds),
+            )
+            self._models[model] = health
+        return health
+
+    def is_healthy(self, model: str) -> bool:
+        health = self._models.get(model)
+        return health is None or health.breaker.state == "closed"
+
+    def stats(self) -> dict:
+        return {model: health.stats() for model, health in self._models.items()}
@@ -1,10 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from typing import List, Optional, Union
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 import os
+import base64
+import copy
 import json
+import math
+import time
+import asyncio
 import httpx
 import uuid
 from datetime import datetime, timedelta
@@ -19,12 +28,43 @@ import re  # For robust parsing logic
 
 load_dotenv()
 
-from database import SessionLocal, engine, Base  # noqa: E402
+from database import AsyncSessionLocal, SessionLocal  # noqa: E402
+from db_migrate import upgrade_database  # noqa: E402
 import models  # noqa: E402
 import schemas  # noqa: E402
+from llm_cache import LLMCache, make_cache_key  # noqa: E402
+from llm_resilience import (  # noqa: E402
+    OVERLOAD_STATUS,
+    RETRYABLE_STATUS,
+    HedgeBudget,
+    ModelHealth,
+    UpstreamHealth,
+    parse_retry_after,
+    retry_delay,
+)
+from blob_store import externalize_image, get_blob_store, is_valid_digest  # noqa: E402
+from llm_parser import (  # noqa: E402
+    QUESTIONS_RESPONSE_FORMAT,
+    IncrementalQuestionParser,
+    parse_questions,
+    validate_question,
+)
+from jobs import InProcessJobRunner, QueueFullError  # noqa: E402
+from curriculum_cache import curriculum_cache  # noqa: E402
+import dedup  # noqa: E402
+from warm_pool import PoolKey, WarmPool  # noqa: E402
+from model_router import ModelRouter  # noqa: E402
+from prompt_templates import (  # noqa: E402
+    PromptStats,
+    image_user_prompt,
+    questions_system_prompt,
+    questions_user_prompt,
+)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Bring the schema up to date (set DB_AUTO_MIGRATE=False to run
+# `python db_migrate.py` / `alembic upgrade head` as a separate deploy step)
+if os.getenv("DB_AUTO_MIGRATE", "True").lower() == "true":
+    upgrade_database()
 
 
 def init_grades() -> None:
@@ -47,7 +87,23 @@ def init_grades() -> None:
 # Initialize grades on startup
 init_grades()
 
-app = FastAPI(title="Classroom Canvas API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own application-scoped resources (OpenRouter HTTP client, job workers)."""
+    await LLMService.startup()
+    await job_runner.start()
+    await warm_pool.start()
+    try:
+        yield
+    finally:
+        await warm_pool.stop()
+        await job_runner.stop()
+        await LLMService.shutdown()
+        llm_cache.close()
+
+
+app = FastAPI(title="Classroom Canvas API", version="1.0.0", lifespan=lifespan)
 
 # ---------------------------------------------------------------------------
 # CORS
@@ -60,6 +116,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ---------------------------------------------------------------------------
@@ -69,15 +126,18 @@ app.add_middleware(
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Development only: requests without a bearer token act as a default user
+AUTH_DEV_BYPASS = os.getenv("AUTH_DEV_BYPASS", "False").lower() == "true"
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "300"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "1024"))
+# Usernames allowed to use the /api/admin endpoints
+ADMIN_USERNAMES = {u.strip() for u in os.getenv("ADMIN_USERNAMES", "").split(",") if u.strip()}
 
 
-def get_db():
-    """FastAPI dependency for DB session."""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """FastAPI dependency for an async DB session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -88,35 +148,121 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-security = HTTPBearer()
+security = HTTPBearer(auto_error=False)
 
+DEV_USER_ID = "dev-user"
 
-def verify_token():
-    """
-    Development helper: bypass authentication and return a default user id.
 
-    Lets the frontend interact with the API without providing tokens during
-    development. If no users exist in the DB, creates a single default user
-    and returns its id.
-    """
-    db = SessionLocal()
-    try:
-        user = db.query(models.User).first()
+class UserIdCache:
+    """Small in-process TTL + LRU map from token subject (username) to user id."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        user_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return user_id
+
+    def set(self, key: str, user_id: str) -> None:
+        self._entries[key] = (user_id, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+user_id_cache = UserIdCache(AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_MAX_ENTRIES)
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def _dev_user_id() -> str:
+    """Id of the first user, creating a default one on an empty database."""
+    async with AsyncSessionLocal() as db:
+        user = await db.scalar(select(models.User).limit(1))
         if user:
             return user.id
 
-        default_id = "dev-user"
         dev_user = models.User(
-            id=default_id,
+            id=DEV_USER_ID,
             username="dev",
             email="dev@example.com",
             hashed_password="dev",  # NOTE: not hashed; dev only
         )
         db.add(dev_user)
-        db.commit()
-        return default_id
-    finally:
-        db.close()
+        await db.commit()
+        return DEV_USER_ID
+
+
+async def verify_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+) -> str:
+    """
+    Resolve the bearer token to a user id.
+
+    The JWT is verified and decoded locally; its ``sub`` (username) is mapped
+    to a user id through ``user_id_cache``, so the database is only queried on
+    a cache miss. With AUTH_DEV_BYPASS enabled, requests without a token are
+    attributed to a default development user.
+    """
+    if credentials is None:
+        if not AUTH_DEV_BYPASS:
+            raise _unauthorized("Not authenticated")
+        user_id = user_id_cache.get("")  # empty subject never comes from a real token
+        if user_id is None:
+            user_id = await _dev_user_id()
+            user_id_cache.set("", user_id)
+        return user_id
+
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise _unauthorized("Token has expired")
+    except jwt.InvalidTokenError:
+        raise _unauthorized("Invalid authentication credentials")
+
+    username = payload.get("sub")
+    if not username:
+        raise _unauthorized("Invalid authentication credentials")
+
+    user_id = user_id_cache.get(username)
+    if user_id is None:
+        async with AsyncSessionLocal() as db:
+            user_id = await db.scalar(
+                select(models.User.id).where(models.User.username == username)
+            )
+        if user_id is None:
+            raise _unauthorized("User no longer exists")
+        user_id_cache.set(username, user_id)
+    return user_id
+
+
+async def require_admin(current_user: str = Depends(verify_token)) -> str:
+    """Allow only users listed in ADMIN_USERNAMES."""
+    async with AsyncSessionLocal() as db:
+        username = await db.scalar(
+            select(models.User.username).where(models.User.id == current_user)
+        )
+    if username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
 
 
 # ---------------------------------------------------------------------------
@@ -126,6 +272,179 @@ def verify_token():
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "your-openrouter-api-key")
 OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
 
+# Connection pool / timeout tuning for the shared OpenRouter client
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "100"))
+OPENROUTER_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+OPENROUTER_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "60"))
+OPENROUTER_HTTP2 = os.getenv("OPENROUTER_HTTP2", "True").lower() == "true"
+OPENROUTER_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "10"))
+OPENROUTER_POOL_TIMEOUT = float(os.getenv("OPENROUTER_POOL_TIMEOUT", "10"))
+OPENROUTER_QUESTIONS_READ_TIMEOUT = float(
+    os.getenv("OPENROUTER_QUESTIONS_READ_TIMEOUT", "120")
+)
+OPENROUTER_IMAGE_READ_TIMEOUT = float(os.getenv("OPENROUTER_IMAGE_READ_TIMEOUT", "60"))
+
+# Image fan-out limits: process-wide and per generation request
+IMAGE_GENERATION_MAX_CONCURRENCY = int(os.getenv("IMAGE_GENERATION_MAX_CONCURRENCY", "8"))
+IMAGE_GENERATION_PER_REQUEST_CONCURRENCY = int(
+    os.getenv("IMAGE_GENERATION_PER_REQUEST_CONCURRENCY", "4")
+)
+
+# Maximum concurrent sub-requests when an exam is fanned out per topic/type
+EXAM_SHARD_CONCURRENCY = int(os.getenv("EXAM_SHARD_CONCURRENCY", "6"))
+
+# Background generation job workers
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+
+# Share one upstream call between concurrent identical question requests
+LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "True").lower() == "true"
+
+# Upstream resilience: per-model AIMD concurrency, retries, circuit breaker
+LLM_RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3")))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "10"))
+LLM_CONCURRENCY_INITIAL = float(os.getenv("LLM_CONCURRENCY_INITIAL", "4"))
+LLM_CONCURRENCY_MIN = float(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+LLM_CONCURRENCY_MAX = float(os.getenv("LLM_CONCURRENCY_MAX", "32"))
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "45"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Latency-aware model routing per subject
+LLM_ROUTER_ENABLED = os.getenv("LLM_ROUTER_ENABLED", "True").lower() == "true"
+# JSON object of subject -> candidate models, e.g. {"Mathematics": ["model-a", "model-b"]}
+LLM_ROUTER_CANDIDATES = os.getenv("LLM_ROUTER_CANDIDATES", "")
+LLM_ROUTER_EXPLORE_RATE = float(os.getenv("LLM_ROUTER_EXPLORE_RATE", "0.05"))
+LLM_ROUTER_EWMA_ALPHA = float(os.getenv("LLM_ROUTER_EWMA_ALPHA", "0.2"))
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "3"))
+
+# Hedged question requests: back up a slow primary model with a second model
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "False").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "15"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2"))
+LLM_HEDGE_MAX_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MAX_DELAY_SECONDS", "60"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))
+
+# Models asked for schema-constrained JSON (OpenRouter structured outputs)
+LLM_STRUCTURED_OUTPUT_MODELS = {
+    m.strip()
+    for m in os.getenv(
+        "LLM_STRUCTURED_OUTPUT_MODELS",
+        "openai/gpt-oss-20b:free,google/gemini-2.0-flash-exp:free",
+    ).split(",")
+    if m.strip()
+}
+# Optional JSONL file that raw question completions are appended to (parser corpus)
+LLM_RAW_CAPTURE_PATH = os.getenv("LLM_RAW_CAPTURE_PATH", "")
+
+# Warm pool of pre-generated questions for popular (topic, type, difficulty) slots
+WARM_POOL_ENABLED = os.getenv("WARM_POOL_ENABLED", "False").lower() == "true"
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "20"))
+WARM_POOL_LOW_WATERMARK = int(os.getenv("WARM_POOL_LOW_WATERMARK", "10"))
+WARM_POOL_BATCH_SIZE = int(os.getenv("WARM_POOL_BATCH_SIZE", "10"))
+WARM_POOL_REFILL_CONCURRENCY = int(os.getenv("WARM_POOL_REFILL_CONCURRENCY", "2"))
+WARM_POOL_MAX_SLOTS = int(os.getenv("WARM_POOL_MAX_SLOTS", "50"))
+WARM_POOL_MIN_DEMAND = float(os.getenv("WARM_POOL_MIN_DEMAND", "5"))
+WARM_POOL_DEMAND_HALF_LIFE_SECONDS = float(os.getenv("WARM_POOL_DEMAND_HALF_LIFE_SECONDS", "3600"))
+WARM_POOL_LLM_CALLS_PER_HOUR = int(os.getenv("WARM_POOL_LLM_CALLS_PER_HOUR", "60"))
+WARM_POOL_REFILL_INTERVAL_SECONDS = float(os.getenv("WARM_POOL_REFILL_INTERVAL_SECONDS", "30"))
+
+# Persistent cache of parsed question completions
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite3"),
+)
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+llm_cache = LLMCache(
+    LLM_CACHE_PATH,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_bytes=LLM_CACHE_MAX_BYTES,
+    enabled=LLM_CACHE_ENABLED,
+)
+
+
+upstream_health = UpstreamHealth(
+    initial_concurrency=LLM_CONCURRENCY_INITIAL,
+    min_concurrency=LLM_CONCURRENCY_MIN,
+    max_concurrency=LLM_CONCURRENCY_MAX,
+    latency_target_seconds=LLM_LATENCY_TARGET_SECONDS,
+    failure_threshold=LLM_BREAKER_FAILURE_THRESHOLD,
+    reset_seconds=LLM_BREAKER_RESET_SECONDS,
+)
+
+hedge_budget = HedgeBudget(LLM_HEDGE_MAX_RATE)
+
+# Prompt build times and prompt/completion sizes per request kind
+prompt_stats = PromptStats()
+
+
+async def _run_blocking(func: Callable, *args):
+    """Run a blocking call (SQLite cache access) in the default executor."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def _capture_raw_completion(model: str, raw: str) -> None:
+    """Append a raw question completion to LLM_RAW_CAPTURE_PATH, if set."""
+    if not LLM_RAW_CAPTURE_PATH or not raw:
+        return
+    try:
+        with open(LLM_RAW_CAPTURE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"model": model, "raw": raw}) + "\n")
+    except OSError as e:
+        print(f"ERROR: Could not capture raw LLM completion: {e}")
+
+
+class _SharedStream:
+    """One upstream question stream, replayed to every subscriber as items arrive."""
+
+    def __init__(self, source: AsyncIterator[dict]):
+        self.items: List[dict] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[dict]) -> None:
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[dict]:
+        self.subscribers += 1
+        idx = 0
+        while True:
+            while idx < len(self.items):
+                # Each subscriber tags/mutates its own copy
+                yield copy.deepcopy(self.items[idx])
+                idx += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
 
 class LLMService:
     """Utility class for calling subject-specific LLMs and image models."""
@@ -139,24 +458,345 @@ class LLMService:
     DEFAULT_MODEL = "google/gemini-2.0-flash-exp:free"
 
     @staticmethod
-    def get_model_for_subject(subject_name: str) -> str:
-        """Return an appropriate LLM model name for a given subject."""
+    def subject_key(subject_name: str) -> str:
+        """Map a free-form subject name onto a SUBJECT_LLM_MODELS key, or "default"."""
         normalized_subject = subject_name.lower().strip()
 
         if "biology" in normalized_subject:
-            return LLMService.SUBJECT_LLM_MODELS.get("Biology", LLMService.DEFAULT_MODEL)
+            return "Biology"
         if "math" in normalized_subject or "mathematics" in normalized_subject:
-            return LLMService.SUBJECT_LLM_MODELS.get("Mathematics", LLMService.DEFAULT_MODEL)
+            return "Mathematics"
         if "chemistry" in normalized_subject:
-            return LLMService.SUBJECT_LLM_MODELS.get("Chemistry", LLMService.DEFAULT_MODEL)
+            return "Chemistry"
         if "physics" in normalized_subject:
-            return LLMService.SUBJECT_LLM_MODELS.get("Physics", LLMService.DEFAULT_MODEL)
+            return "Physics"
+
+        return "default"
+
+    @staticmethod
+    def get_model_for_subject(subject_name: str) -> str:
+        """Return the statically configured LLM model name for a given subject."""
+        return LLMService.SUBJECT_LLM_MODELS.get(
+            LLMService.subject_key(subject_name), LLMService.DEFAULT_MODEL
+        )
+
+    # ------------------------------------------------------------------ #
+    # Shared HTTP client
+    # ------------------------------------------------------------------ #
+    _client: Optional[httpx.AsyncClient] = None
+    _request_stats = {"requests": 0, "in_flight": 0, "errors": 0}
+
+    @classmethod
+    def _build_client(cls) -> httpx.AsyncClient:
+        """Create the pooled keep-alive client used for every OpenRouter call."""
+        http2 = OPENROUTER_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("WARNING: 'h2' is not installed; falling back to HTTP/1.1")
+                http2 = False
+
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+            ),
+            timeout=cls._timeout(OPENROUTER_QUESTIONS_READ_TIMEOUT),
+            headers={
+                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                "Content-Type": "application/json",
+            },
+        )
+
+    @staticmethod
+    def _timeout(read_timeout: float) -> httpx.Timeout:
+        """Per-operation timeout: shared connect/pool limits, operation-specific read."""
+        return httpx.Timeout(
+            connect=OPENROUTER_CONNECT_TIMEOUT,
+            read=read_timeout,
+            write=OPENROUTER_CONNECT_TIMEOUT,
+            pool=OPENROUTER_POOL_TIMEOUT,
+        )
+
+    @classmethod
+    async def startup(cls) -> None:
+        """Open the shared client (called from the FastAPI lifespan)."""
+        if cls._client is None:
+            cls._client = cls._build_client()
+            print("DEBUG: OpenRouter HTTP client started")
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        """Close the shared client and release pooled connections."""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+            print("DEBUG: OpenRouter HTTP client closed")
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        """Return the shared client, creating it lazily outside the lifespan."""
+        if cls._client is None:
+            cls._client = cls._build_client()
+        return cls._client
+
+    @classmethod
+    async def _post(cls, payload: dict, read_timeout: float, fallback: bool = True) -> httpx.Response:
+        """POST a chat-completion payload to OpenRouter over the shared pool."""
+        response, _, _ = await cls._send(payload, read_timeout, fallback=fallback)
+        return response
+
+    # ------------------------------------------------------------------ #
+    # Upstream resilience
+    # ------------------------------------------------------------------ #
+    @classmethod
+    def _payload_for_model(cls, payload: dict, model: str) -> dict:
+        """Copy of ``payload`` retargeted at ``model`` (structured output only if supported)."""
+        retargeted = {**payload, "model": model}
+        retargeted.pop("response_format", None)
+        if "response_format" in payload and model in LLM_STRUCTURED_OUTPUT_MODELS:
+            retargeted["response_format"] = QUESTIONS_RESPONSE_FORMAT
+        return retargeted
+
+    @classmethod
+    async def _send(
+        cls, payload: dict, read_timeout: float, stream: bool = False, fallback: bool = True
+    ) -> Tuple[httpx.Response, Optional[ModelHealth], str]:
+        """
+        Send a completion request with admission control, retries and failover.
+
+        Each attempt takes a slot from the model's adaptive concurrency limit
+        (waiting up to LLM_QUEUE_TIMEOUT_SECONDS) and is skipped while its
+        circuit breaker is open. Retryable answers (429, 5xx, timeouts) are
+        retried with jittered backoff that honours ``Retry-After``; once the
+        model is exhausted or unhealthy the request fails over to
+        DEFAULT_MODEL when ``fallback`` is set. Returns the final response, for
+        a successful stream the ModelHealth whose slot the caller must release
+        when the stream is done, and the model that produced the response.
+        Raises 503 when no attempt was made.
+        """
+        client = cls.get_client()
+        candidates = [payload["model"]]
+        if fallback and payload["model"] != cls.DEFAULT_MODEL:
+            candidates.append(cls.DEFAULT_MODEL)
+
+        last_response: Optional[httpx.Response] = None
+        last_error: Optional[Exception] = None
+        last_model = payload["model"]
+        wait_hint = 0.0
+        for model in candidates:
+            if model != payload["model"]:
+                upstream_health.get(payload["model"]).counters["failovers_from"] += 1
+                print(f"DEBUG: Failing over from '{payload['model']}' to '{model}'")
+                payload = cls._payload_for_model(payload, model)
+            health = upstream_health.get(model)
+
+            for attempt in range(LLM_RETRY_MAX_ATTEMPTS):
+                if not health.breaker.allow():
+                    health.counters["short_circuited"] += 1
+                    wait_hint = max(wait_hint, health.breaker.retry_in())
+                    break
+                if not await health.limiter.acquire(LLM_QUEUE_TIMEOUT_SECONDS):
+                    health.counters["queue_timeouts"] += 1
+                    wait_hint = max(wait_hint, LLM_RETRY_MAX_DELAY)
+                    break
+
+                started = time.monotonic()
+                retry_after = None
+                cls._request_stats["requests"] += 1
+                # Streams are counted in flight by the caller for their whole duration
+                cls._request_stats["in_flight"] += not stream
+                try:
+                    request = client.build_request(
+                        "POST", OPENROUTER_API_URL, json=payload, timeout=cls._timeout(read_timeout)
+                    )
+                    response = await client.send(request, stream=stream)
+                except httpx.TransportError as e:
+                    health.limiter.release()
+                    cls._request_stats["errors"] += not stream
+                    health.record_failure(started, overloaded=isinstance(e, httpx.TimeoutException))
+                    print(f"DEBUG: '{model}' request failed (attempt {attempt + 1}): {e!r}")
+                    last_response, last_error = None, e
+                except BaseException:
+                    health.limiter.release()
+                    raise
+                else:
+                    if response.status_code not in RETRYABLE_STATUS:
+                        health.record_success(started, complete=not stream)
+                        if stream:
+                            return response, health, model
+                        health.limiter.release()
+                        return response, None, model
+                    if stream:
+                        await response.aread()
+                        await response.aclose()
+                    health.limiter.release()
+                    health.record_failure(started, response.status_code in OVERLOAD_STATUS)
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    print(
+                        f"DEBUG: '{model}' answered {response.status_code} "
+                        f"(attempt {attempt + 1}/{LLM_RETRY_MAX_ATTEMPTS})"
+                    )
+                    last_response, last_error, last_model = response, None, model
+                finally:
+                    cls._request_stats["in_flight"] -= not stream
+
+                if attempt + 1 >= LLM_RETRY_MAX_ATTEMPTS:
+                    break
+                delay = retry_delay(attempt, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY, retry_after)
+                if delay is None:
+                    # Asked to back off longer than we are willing to wait
+                    wait_hint = max(wait_hint, retry_after or 0.0)
+                    break
+                health.counters["retries"] += 1
+                await asyncio.sleep(delay)
+
+        if last_response is not None:
+            return last_response, None, last_model
+        if last_error is not None:
+            raise last_error
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The question model is overloaded or unavailable. Please try again shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(wait_hint)))},
+        )
 
-        return LLMService.DEFAULT_MODEL
+    @staticmethod
+    def _upstream_failure(response: httpx.Response, detail: str) -> HTTPException:
+        """503 (with the upstream Retry-After) for overload answers, 500 for anything else."""
+        if response.status_code in OVERLOAD_STATUS:
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+            return HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=detail,
+                headers={"Retry-After": str(max(1, math.ceil(retry_after or LLM_RETRY_MAX_DELAY)))},
+            )
+        return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail)
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """Connection-pool usage of the shared client plus request counters."""
+        stats = {
+            "started": cls._client is not None,
+            "http2_enabled": OPENROUTER_HTTP2,
+            "max_connections": OPENROUTER_MAX_CONNECTIONS,
+            "max_keepalive_connections": OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_expiry": OPENROUTER_KEEPALIVE_EXPIRY,
+            "open_connections": 0,
+            "idle_connections": 0,
+            "active_connections": 0,
+            "http2_connections": 0,
+            **cls._request_stats,
+        }
+        if cls._client is None:
+            return stats
+
+        # httpx does not expose pool metrics publicly; read them off httpcore.
+        pool = getattr(getattr(cls._client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        stats["open_connections"] = len(connections)
+        for connection in connections:
+            try:
+                if connection.is_idle():
+                    stats["idle_connections"] += 1
+                else:
+                    stats["active_connections"] += 1
+                if "HTTP/2" in repr(connection):
+                    stats["http2_connections"] += 1
+            except Exception:
+                continue
+        return stats
+
+    # ------------------------------------------------------------------ #
+    # Single-flight coalescing
+    # ------------------------------------------------------------------ #
+    _inflight: Dict[str, asyncio.Task] = {}
+    _inflight_streams: Dict[str, _SharedStream] = {}
+    _waiters: Dict[str, int] = {}
+    _coalesce_stats = {"callers": 0, "upstream_calls": 0, "max_waiters": 0}
+
+    @classmethod
+    def _join(cls, key: str) -> None:
+        cls._coalesce_stats["callers"] += 1
+        cls._waiters[key] = cls._waiters.get(key, 0) + 1
+        cls._coalesce_stats["max_waiters"] = max(
+            cls._coalesce_stats["max_waiters"], cls._waiters[key]
+        )
+
+    @classmethod
+    def _leave(cls, key: str) -> None:
+        cls._waiters[key] -= 1
+        if not cls._waiters[key]:
+            del cls._waiters[key]
+
+    @classmethod
+    async def _single_flight(cls, key: str, fetch: Callable[[], Awaitable[List[dict]]]) -> List[dict]:
+        """
+        Run ``fetch`` once per key at a time; concurrent callers share its result.
+
+        The upstream call runs in its own task, so a caller that disconnects
+        doesn't cancel it for the others. Every caller gets a private copy.
+        """
+        task = cls._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fetch())
+            cls._inflight[key] = task
+            cls._coalesce_stats["upstream_calls"] += 1
+            task.add_done_callback(lambda t: cls._inflight.pop(key, None))
+            # Retrieve the exception even if every caller went away
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            print(f"DEBUG: Coalescing with in-flight LLM call {key[:12]}")
+
+        cls._join(key)
+        try:
+            return copy.deepcopy(await asyncio.shield(task))
+        finally:
+            cls._leave(key)
+
+    @classmethod
+    def coalesce_stats(cls) -> dict:
+        return {
+            **cls._coalesce_stats,
+            # Callers served by someone else's upstream call
+            "coalesced": cls._coalesce_stats["callers"] - cls._coalesce_stats["upstream_calls"],
+            "enabled": LLM_COALESCE_ENABLED,
+            "in_flight_calls": len(cls._inflight) + len(cls._inflight_streams),
+            "waiting": sum(cls._waiters.values()),
+        }
 
     # ------------------------------------------------------------------ #
     # Image generation
     # ------------------------------------------------------------------ #
+    _image_semaphore: Optional[asyncio.Semaphore] = None
+    _image_stats = {"generated": 0, "failed": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
+    @classmethod
+    def get_image_semaphore(cls) -> asyncio.Semaphore:
+        """Process-wide cap on concurrent image generations."""
+        if cls._image_semaphore is None:
+            cls._image_semaphore = asyncio.Semaphore(IMAGE_GENERATION_MAX_CONCURRENCY)
+        return cls._image_semaphore
+
+    @classmethod
+    def record_image_timing(cls, elapsed: float, ok: bool) -> None:
+        cls._image_stats["generated" if ok else "failed"] += 1
+        cls._image_stats["total_seconds"] += elapsed
+        cls._image_stats["max_seconds"] = max(cls._image_stats["max_seconds"], elapsed)
+
+    @classmethod
+    def image_stats(cls) -> dict:
+        count = cls._image_stats["generated"] + cls._image_stats["failed"]
+        return {
+            **cls._image_stats,
+            "avg_seconds": cls._image_stats["total_seconds"] / count if count else 0.0,
+            "max_concurrency": IMAGE_GENERATION_MAX_CONCURRENCY,
+            "per_request_concurrency": IMAGE_GENERATION_PER_REQUEST_CONCURRENCY,
+        }
+
     @staticmethod
     async def generate_image(prompt: str, subject_name: str = "") -> str:
         """
@@ -166,33 +806,19 @@ class LLMService:
         """
         IMAGE_MODEL = "google/gemini-2.5-flash-image-preview"
 
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
+        build_started = time.perf_counter()
         payload = {
             "model": IMAGE_MODEL,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": (
-                        f"Generate a clear, educational image or diagram for {subject_name} "
-                        f"based on this description for a quiz question: {prompt}"
-                    ),
-                }
-            ],
+            "messages": [{"role": "user", "content": image_user_prompt(subject_name, prompt)}],
             "modalities": ["image", "text"],
             "image_config": {"aspect_ratio": "1:1"},
         }
+        prompt_stats.record_build("image", build_started)
 
         print(f"DEBUG: Calling OpenRouter for image generation with model: {IMAGE_MODEL}")
 
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    OPENROUTER_API_URL, json=payload, headers=headers
-                )
+            response = await LLMService._post(payload, OPENROUTER_IMAGE_READ_TIMEOUT, fallback=False)
 
             if response.status_code != 200:
                 print(
@@ -208,6 +834,7 @@ class LLMService:
                 )
 
             result = response.json()
+            prompt_stats.record("image", IMAGE_MODEL, payload["messages"], usage=result.get("usage"))
             images = result["choices"][0]["message"].get("images")
 
             if not images or not images[0].get("image_url"):
@@ -234,161 +861,1054 @@ class LLMService:
     # Question generation
     # ------------------------------------------------------------------ #
     @staticmethod
-    async def generate_questions(prompt: str, subject_name: str = "") -> List[dict]:
-        """Call OpenRouter to generate a JSON list of question dicts."""
-        headers = {
-            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-            "Content-Type": "application/json",
-        }
-
-        model = LLMService.get_model_for_subject(subject_name)
+    def build_question_payload(prompt: str, subject_name: str = "") -> Tuple[str, dict]:
+        """Route the subject to a model and build the chat-completion payload for a prompt."""
+        subject = LLMService.subject_key(subject_name)
+        model = model_router.choose(subject)
         print(f"DEBUG: Using model '{model}' for subject '{subject_name}'")
 
-        system_prompt = (
-            "You are an expert educational content creator specializing in generating "
-            "rigorous, expression-based questions with detailed mathematical, chemical, "
-            "or physical formulations."
-        )
-
-        subj_lower = subject_name.lower()
-        if "biology" in subj_lower:
-            system_prompt += (
-                " You specialize in creating biology questions that MUST include biological "
-                "processes, molecular structures, quantitative relationships, and detailed "
-                "diagrams. NEVER create word-only questions without biological expressions, "
-                "formulas, or structural representations."
-            )
-        elif "math" in subj_lower or "mathematics" in subj_lower:
-            system_prompt += (
-                " You specialize in creating mathematics questions that MUST include complex "
-                "mathematical expressions, multi-step equations, calculus operations, and "
-                "rigorous problem-solving. NEVER create word-only questions without actual "
-                "mathematical expressions and equations."
-            )
-        elif "chemistry" in subj_lower:
-            system_prompt += (
-                " You specialize in creating chemistry questions that MUST include complex "
-                "chemical equations, reaction mechanisms, stoichiometric calculations, and "
-                "thermodynamic analysis. NEVER create word-only questions without chemical "
-                "expressions and equations."
-            )
-        elif "physics" in subj_lower:
-            system_prompt += (
-                " You specialize in creating physics questions that MUST include physical "
-                "formulas, vector equations, multi-step problem-solving, and real-world "
-                "applications. NEVER create word-only questions without physical expressions "
-                "and formulas."
-            )
-
-        system_prompt += (
-            " Generate high-quality, expression-based questions that require analytical "
-            "thinking and problem-solving skills. Always respond with valid JSON only."
-        )
-
         payload = {
             "model": model,
             "messages": [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": questions_system_prompt(subject)},
                 {"role": "user", "content": prompt},
             ],
         }
+        if model in LLM_STRUCTURED_OUTPUT_MODELS:
+            payload["response_format"] = QUESTIONS_RESPONSE_FORMAT
+        return model, payload
+
+    @staticmethod
+    async def generate_questions(
+        prompt: str, subject_name: str = "", use_cache: bool = True, expected: int = 0
+    ) -> List[dict]:
+        """
+        Call OpenRouter to generate a JSON list of question dicts.
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(OPENROUTER_API_URL, json=payload, headers=headers)
+        Parsed results are cached by (model, prompt). ``use_cache=False`` skips
+        the lookup but still stores the fresh result. Concurrent identical
+        calls share one upstream request (see ``_single_flight``). ``expected``
+        (questions asked for in the prompt) feeds the model router's yield.
+        """
+        model, payload = LLMService.build_question_payload(prompt, subject_name)
+
+        cache_key = make_cache_key(model, payload["messages"])
+        if use_cache:
+            cached = await _run_blocking(llm_cache.get, cache_key)
+            if cached is not None:
+                print(f"DEBUG: LLM cache hit for model '{model}' ({len(cached)} questions)")
+                return cached
+
+        subject = LLMService.subject_key(subject_name)
+        if LLM_COALESCE_ENABLED:
+            return await LLMService._single_flight(
+                cache_key,
+                lambda: LLMService._fetch_questions(model, payload, cache_key, subject, expected),
+            )
+        return await LLMService._fetch_questions(model, payload, cache_key, subject, expected)
+
+    @staticmethod
+    async def _fetch_questions(
+        model: str, payload: dict, cache_key: str, subject: str = "default", expected: int = 0
+    ) -> List[dict]:
+        """
+        Get one question completion (hedged if enabled), report it to the router and cache it.
+
+        The router's statistics go to the model that actually answered; when
+        that is not ``model`` (failover or a winning hedge), ``model`` is
+        recorded as a failed call and the result is not cached, since the
+        cache key belongs to ``model``.
+        """
+        started = time.monotonic()
+        try:
+            if LLM_HEDGE_ENABLED:
+                questions, answered = await LLMService._hedged_questions(model, payload)
+            else:
+                questions, answered = await LLMService._complete_questions(payload)
+        except Exception:
+            model_router.record(subject, model, time.monotonic() - started, False, 0, expected)
+            raise
+        elapsed = time.monotonic() - started
+        if answered != model:
+            model_router.record(subject, model, elapsed, False, 0, expected)
+        model_router.record(subject, answered, elapsed, True, len(questions), expected)
+        if questions and answered == model:
+            await _run_blocking(llm_cache.set, cache_key, model, questions)
+        return questions
+
+    @staticmethod
+    async def _complete_questions(payload: dict, fallback: bool = True) -> Tuple[List[dict], str]:
+        """POST one question completion and parse it; returns the questions and the model that answered."""
+        response, _, model = await LLMService._send(
+            payload, OPENROUTER_QUESTIONS_READ_TIMEOUT, fallback=fallback
+        )
 
         if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error generating questions: {response.text}",
+            raise LLMService._upstream_failure(
+                response, f"Error generating questions: {response.text}"
             )
 
         result = response.json()
         content = result["choices"][0]["message"]["content"]
         print(f"DEBUG: Raw LLM Response: {content}")
+        _capture_raw_completion(model, content)
+        sizes = prompt_stats.record(
+            "questions",
+            result.get("model") or model,
+            payload["messages"],
+            content or "",
+            result.get("usage"),
+        )
+        print(
+            f"DEBUG: Prompt ~{sizes['estimated_prompt_tokens']} tokens estimated, "
+            f"{sizes['prompt_tokens']} reported; completion {sizes['completion_tokens']} tokens"
+        )
+
+        # Fast path for well-formed JSON, tolerant tokenizer for everything else
+        parsed = parse_questions(content or "")
+        print(
+            f"DEBUG: Parsed {len(parsed.questions)} questions via {parsed.path} path "
+            f"({parsed.rejected} rejected)"
+        )
+        if not parsed.questions and parsed.path != "fast":
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=(
+                    "Failed to parse LLM response. Final attempt failed. "
+                    f"Raw response (truncated): {(content or '')[:200]}"
+                ),
+            )
+        return parsed.questions, model
+
+    # ------------------------------------------------------------------ #
+    # Hedged requests
+    # ------------------------------------------------------------------ #
+    _hedge_stats = {"backup_wins": 0, "primary_wins": 0, "both_failed": 0}
+
+    @staticmethod
+    def _hedge_delay(model: str) -> float:
+        """LLM_HEDGE_PERCENTILE of the model's recent latency, clamped; a fixed delay until warmed up."""
+        latency = upstream_health.get(model).latency
+        if latency.total < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DELAY_SECONDS
+        delay = latency.percentile(LLM_HEDGE_PERCENTILE)
+        return min(max(delay, LLM_HEDGE_MIN_DELAY_SECONDS), LLM_HEDGE_MAX_DELAY_SECONDS)
+
+    @classmethod
+    def _hedge_model(cls, model: str) -> Optional[str]:
+        """Backup for ``model``: the default model, else another healthy subject model."""
+        for candidate in (cls.DEFAULT_MODEL, *cls.SUBJECT_LLM_MODELS.values()):
+            if candidate != model and upstream_health.is_healthy(candidate):
+                return candidate
+        return None
+
+    @classmethod
+    async def _hedged_questions(cls, model: str, payload: dict) -> Tuple[List[dict], str]:
+        """
+        Ask ``model``; if it hasn't answered within its hedge delay, also ask a
+        backup model. The first result with at least one parsed question wins
+        and the other request is cancelled. Hedges are capped at
+        LLM_HEDGE_MAX_RATE of requests. Returns the questions and the model
+        that produced them.
+        """
+        hedge_budget.record_request()
+        primary = asyncio.create_task(cls._complete_questions(payload))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=cls._hedge_delay(model))
+            backup_model = None if done else cls._hedge_model(model)
+            if backup_model is None or not hedge_budget.try_spend():
+                return await primary
+
+            print(f"DEBUG: '{model}' slower than its hedge delay, hedging with '{backup_model}'")
+            backup = asyncio.create_task(
+                cls._complete_questions(cls._payload_for_model(payload, backup_model), fallback=False)
+            )
+            tasks.append(backup)
+            for task in tasks:
+                # The loser's error is never awaited
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            # Latency is recorded per model by _send for whichever call completes;
+            # the cancelled loser records nothing
+            empty: Optional[Tuple[List[dict], str]] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if not task.result()[0]:
+                        # An empty answer is not a win; keep waiting for the other call
+                        empty = empty or task.result()
+                        continue
+                    cls._hedge_stats["backup_wins" if task is backup else "primary_wins"] += 1
+                    return task.result()
+            cls._hedge_stats["both_failed"] += 1
+            if empty is not None:
+                return empty
+            # Both failed: report the primary model's error
+            raise primary.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @classmethod
+    def hedge_stats(cls) -> dict:
+        return {
+            **cls._hedge_stats,
+            **hedge_budget.stats(),
+            "enabled": LLM_HEDGE_ENABLED,
+            "percentile": LLM_HEDGE_PERCENTILE,
+        }
+
+    @staticmethod
+    async def stream_questions(
+        prompt: str, subject_name: str = "", use_cache: bool = True, expected: int = 0
+    ) -> AsyncIterator[dict]:
+        """
+        Stream a question completion and yield each question as its object closes.
+
+        Uses OpenRouter's ``stream: true`` SSE mode with an incremental JSON
+        parser. A cache hit replays the cached questions immediately; a full
+        stream is cached once it has finished. Concurrent identical streams
+        share one upstream stream that is replayed to each of them.
+        """
+        model, payload = LLMService.build_question_payload(prompt, subject_name)
+        subject = LLMService.subject_key(subject_name)
+        cache_key = make_cache_key(model, payload["messages"])
+        if use_cache:
+            cached = await _run_blocking(llm_cache.get, cache_key)
+            if cached is not None:
+                print(f"DEBUG: LLM cache hit for model '{model}' ({len(cached)} questions)")
+                for q_data in cached:
+                    yield q_data
+                return
+
+        if not LLM_COALESCE_ENABLED:
+            async for q_data in LLMService._stream_upstream(model, payload, cache_key, subject, expected):
+                yield q_data
+            return
+
+        shared = LLMService._inflight_streams.get(cache_key)
+        if shared is None:
+            shared = _SharedStream(LLMService._stream_upstream(model, payload, cache_key, subject, expected))
+            LLMService._inflight_streams[cache_key] = shared
+            LLMService._coalesce_stats["upstream_calls"] += 1
+            shared.task.add_done_callback(
+                lambda t: LLMService._inflight_streams.pop(cache_key, None)
+            )
+        else:
+            print(f"DEBUG: Coalescing with in-flight LLM stream {cache_key[:12]}")
+
+        LLMService._join(cache_key)
+        try:
+            async for q_data in shared.subscribe():
+                yield q_data
+        finally:
+            LLMService._leave(cache_key)
+
+    @staticmethod
+    async def _stream_upstream(
+        model: str, payload: dict, cache_key: str, subject: str = "default", expected: int = 0
+    ) -> AsyncIterator[dict]:
+        """
+        Stream one completion from OpenRouter, parse questions as they close, cache the result.
+
+        Like ``_fetch_questions``, a stream answered by a failover model is not cached.
+        """
+        started = time.monotonic()
+        parser = IncrementalQuestionParser()
+        parsed: List[dict] = []
+        raw_parts: List[str] = []
+        usage: Optional[dict] = None
+        rejected = 0
+        LLMService._request_stats["in_flight"] += 1
+        try:
+            response, health, answered = await LLMService._send(
+                {**payload, "stream": True}, OPENROUTER_QUESTIONS_READ_TIMEOUT, stream=True
+            )
+            try:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    raise LLMService._upstream_failure(
+                        response, f"Error generating questions: {body}"
+                    )
+
+                async for line in response.aiter_lines():
+                    # SSE comments (": OPENROUTER PROCESSING") and blank lines
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    if chunk.get("error"):
+                        raise HTTPException(
+                            status_code=status.HTTP_502_BAD_GATEWAY,
+                            detail=f"Error generating questions: {chunk['error']}",
+                        )
+                    # The last chunk carries token usage when the provider reports it
+                    usage = chunk.get("usage") or usage
+                    choices = chunk.get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content") or ""
+                    raw_parts.append(delta)
+                    for obj in parser.feed(delta):
+                        q_data = validate_question(obj)
+                        if q_data is None:
+                            rejected += 1
+                            continue
+                        parsed.append(copy.deepcopy(q_data))
+                        yield q_data
+            finally:
+                await response.aclose()
+                if health is not None:
+                    health.limiter.release()
+        except Exception:
+            LLMService._request_stats["errors"] += 1
+            model_router.record(subject, model, time.monotonic() - started, False, len(parsed), expected)
+            raise
+        finally:
+            LLMService._request_stats["in_flight"] -= 1
+
+        elapsed = time.monotonic() - started
+        if answered != model:
+            model_router.record(subject, model, elapsed, False, 0, expected)
+        model_router.record(subject, answered, elapsed, True, len(parsed), expected)
+        raw = "".join(raw_parts)
+        _capture_raw_completion(answered, raw)
+        prompt_stats.record("questions", answered, payload["messages"], raw, usage)
+        print(
+            f"DEBUG: Streamed {len(parsed)} questions "
+            f"({parser.errors} malformed, {rejected} invalid objects skipped)"
+        )
+        if parsed and answered == model:
+            await _run_blocking(llm_cache.set, cache_key, model, parsed)
+
+
+def _router_candidates() -> Dict[str, List[str]]:
+    """
+    Candidate models per subject: the static subject model, then the default
+    model; subjects listed in LLM_ROUTER_CANDIDATES replace their list.
+    """
+    candidates = {
+        subject: list(dict.fromkeys([model, LLMService.DEFAULT_MODEL]))
+        for subject, model in LLMService.SUBJECT_LLM_MODELS.items()
+    }
+    candidates["default"] = [LLMService.DEFAULT_MODEL]
+    if LLM_ROUTER_CANDIDATES:
+        try:
+            for subject, models_ in json.loads(LLM_ROUTER_CANDIDATES).items():
+                if isinstance(models_, list) and models_:
+                    candidates[subject] = [str(m) for m in models_]
+        except (ValueError, AttributeError) as e:
+            print(f"ERROR: Ignoring invalid LLM_ROUTER_CANDIDATES: {e}")
+    return candidates
+
+
+model_router = ModelRouter(
+    _router_candidates(),
+    is_healthy=upstream_health.is_healthy,
+    enabled=LLM_ROUTER_ENABLED,
+    explore_rate=LLM_ROUTER_EXPLORE_RATE,
+    alpha=LLM_ROUTER_EWMA_ALPHA,
+    min_samples=LLM_ROUTER_MIN_SAMPLES,
+)
+
+# ---------------------------------------------------------------------------
+# Core logic: generate questions for topic list
+# ---------------------------------------------------------------------------
+
+async def _generate_images_for_questions(
+    generated_questions: List[dict], subject_name: str
+) -> List[dict]:
+    """
+    Replace image descriptions with generated images, concurrently.
+
+    Every description of every "image" question is generated in parallel,
+    bounded by the global image semaphore and a per-request semaphore. If any
+    image of a question fails, that question's images are dropped (the same
+    behaviour as the old sequential loop). Returns per-image timing records.
+    """
+    request_semaphore = asyncio.Semaphore(IMAGE_GENERATION_PER_REQUEST_CONCURRENCY)
+    global_semaphore = LLMService.get_image_semaphore()
+    timings: List[dict] = []
+
+    async def _one(q_idx: int, img_idx: int, description: str) -> str:
+        async with request_semaphore, global_semaphore:
+            started = time.perf_counter()
+            ok = False
+            try:
+                data_uri = await LLMService.generate_image(description, subject_name)
+                # Store the bytes once by content hash; the question keeps a reference
+                image = await asyncio.get_running_loop().run_in_executor(
+                    None, externalize_image, data_uri
+                )
+                ok = True
+                return image
+            finally:
+                elapsed = time.perf_counter() - started
+                LLMService.record_image_timing(elapsed, ok)
+                timings.append(
+                    {"question": q_idx, "image": img_idx, "seconds": round(elapsed, 3), "ok": ok}
+                )
+                print(
+                    f"DEBUG: Image {q_idx}.{img_idx} "
+                    f"{'generated' if ok else 'failed'} in {elapsed:.2f}s"
+                )
+
+    jobs = []
+    for q_idx, q_data in enumerate(generated_questions):
+        if q_data.get("type") == "image" and q_data.get("images"):
+            tasks = [
+                _one(q_idx, img_idx, description)
+                for img_idx, description in enumerate(q_data["images"])
+            ]
+            jobs.append((q_idx, q_data, tasks))
+
+    if not jobs:
+        return timings
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(asyncio.gather(*tasks, return_exceptions=True) for _, _, tasks in jobs)
+    )
+
+    for (q_idx, q_data, _), images in zip(jobs, results):
+        failures = [r for r in images if isinstance(r, BaseException)]
+        if failures:
+            print(
+                "ERROR: Image generation failed for question "
+                f"{q_idx}: {failures[0]}; dropping its images"
+            )
+            q_data["images"] = []
+        else:
+            q_data["images"] = list(images)
+
+    print(
+        f"DEBUG: Finished {len(timings)} image request(s) for {len(jobs)} question(s) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return timings
+
+
+QUESTION_TYPES = ("mcq", "short", "long")
+EXAM_FAN_OUT_MODES = ("none", "topic", "type", "topic_type")
+
+
+def _requested_counts(request) -> dict:
+    """Requested number of questions per type for a generation request."""
+    return {
+        "mcq": request.mcq_count,
+        "short": request.short_answer_count,
+        "long": request.long_answer_count,
+    }
+
+
+async def _resolve_topics(
+    db: AsyncSession, request, topic_ids: List[str]
+) -> Tuple[List[dict], str]:
+    """Load topic/chapter/subject data for the topic ids and pick the subject name."""
+    hierarchy = await _require_topic_hierarchy(db, topic_ids)
+
+    topics_data = []
+    for topic_id in topic_ids:
+        topic, chapter, subject, _ = hierarchy[topic_id]
+        topics_data.append(
+            {
+                "id": topic.id,
+                "name": topic.name,
+                "chapter_name": chapter.name,
+                "subject_name": subject.name,
+                "subtopics": ", ".join(topic.subtopics or []),
+            }
+        )
+
+    subject_name = request.subject_name or hierarchy[topic_ids[0]].subject.name
+    return topics_data, subject_name
+
+
+async def _require_topic_hierarchy(
+    db: AsyncSession, topic_ids: List[str]
+) -> dict:
+    """Resolve topics in one query; 404 listing every missing id if any are unknown."""
+    hierarchy, missing = await models.resolve_topic_hierarchy(db, topic_ids)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Not found: {', '.join(missing)}",
+        )
+    return hierarchy
+
+
+def _build_generation_prompt(
+    request, subject_name: str, topics_data: List[dict], counts: dict
+) -> str:
+    """Build the per-request (user) part of the question prompt; the rest is in the system prompt."""
+    started = time.perf_counter()
+    prompt = questions_user_prompt(
+        subject_name, topics_data, counts, request.difficulty, request.include_images
+    )
+    prompt_stats.record_build("questions", started)
+    return prompt
+
+
+def _match_topic_id(q_data: dict, topics_data: List[dict]) -> str:
+    """Map the "topic" name echoed by the model back to one of the shard's topic ids."""
+    if len(topics_data) > 1:
+        named = str(q_data.get("topic") or "").lower().strip()
+        if named:
+            for topic in topics_data:
+                if topic["name"].lower().strip() == named:
+                    return topic["id"]
+            for topic in topics_data:
+                if topic["name"].lower().strip() in named or named in topic["name"].lower():
+                    return topic["id"]
+    return topics_data[0]["id"]
+
+
+async def _generate_shard(
+    request, subject_name: str, topics_data: List[dict], counts: dict
+) -> List[dict]:
+    """Run one LLM call for the given topics/counts and tag results with topic ids."""
+    prompt = _build_generation_prompt(request, subject_name, topics_data, counts)
+    generated = await LLMService.generate_questions(
+        prompt, subject_name, use_cache=not request.bypass_cache, expected=sum(counts.values())
+    )
+    for q_data in generated:
+        if isinstance(q_data, dict):
+            q_data["topic_id"] = _match_topic_id(q_data, topics_data)
+    return [q for q in generated if isinstance(q, dict)]
+
+
+def _split_count(total: int, parts: int) -> List[int]:
+    """Split ``total`` into ``parts`` near-equal non-negative integers."""
+    base, remainder = divmod(total, parts)
+    return [base + (1 if i < remainder else 0) for i in range(parts)]
+
+
+def _plan_shards(topics_data: List[dict], counts: dict, fan_out: str) -> List[Tuple[List[dict], dict]]:
+    """Split a request into (topics, counts) sub-requests for the given fan-out mode."""
+    if fan_out in ("topic", "topic_type"):
+        per_topic = {t: _split_count(counts[t], len(topics_data)) for t in QUESTION_TYPES}
+        topic_groups = [
+            ([topic], {t: per_topic[t][i] for t in QUESTION_TYPES})
+            for i, topic in enumerate(topics_data)
+        ]
+    else:
+        topic_groups = [(topics_data, dict(counts))]
+
+    shards = []
+    for group_topics, group_counts in topic_groups:
+        if fan_out in ("type", "topic_type"):
+            for qtype in QUESTION_TYPES:
+                if group_counts[qtype]:
+                    shard_counts = {t: 0 for t in QUESTION_TYPES}
+                    shard_counts[qtype] = group_counts[qtype]
+                    shards.append((group_topics, shard_counts))
+        elif any(group_counts.values()):
+            shards.append((group_topics, group_counts))
+    return shards
+
+
+def _take_counts(questions: List[dict], wanted: dict) -> Tuple[List[dict], dict]:
+    """
+    Keep at most ``wanted`` questions per type and report the remaining deficit.
+
+    Questions whose type is not mcq/short/long (e.g. "image") fill whichever
+    short/long/mcq slot still has room.
+    """
+    remaining = dict(wanted)
+    taken = []
+    for q_data in questions:
+        bucket = q_data.get("type")
+        if bucket not in remaining:
+            bucket = next((t for t in ("short", "long", "mcq") if remaining[t] > 0), None)
+        if bucket is None or remaining[bucket] <= 0:
+            continue
+        remaining[bucket] -= 1
+        taken.append(q_data)
+    return taken, remaining
+
+
+async def _generate_fanned_out(
+    request, subject_name: str, topics_data: List[dict], fan_out: str, counts: dict
+) -> List[dict]:
+    """
+    Generate questions as concurrent per-topic and/or per-type sub-requests.
+
+    Results are merged back to exactly the requested counts; a failed or short
+    shard is topped up once with a single call for the missing questions.
+    """
+    shards = _plan_shards(topics_data, counts, fan_out)
+    semaphore = asyncio.Semaphore(EXAM_SHARD_CONCURRENCY)
+
+    async def _run(shard_topics: List[dict], shard_counts: dict) -> List[dict]:
+        async with semaphore:
+            generated = await _generate_shard(request, subject_name, shard_topics, shard_counts)
+            taken, _ = _take_counts(generated, shard_counts)
+            return taken
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_run(shard_topics, shard_counts) for shard_topics, shard_counts in shards),
+        return_exceptions=True,
+    )
+    print(
+        f"DEBUG: Fan-out '{fan_out}' ran {len(shards)} shard(s) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+    merged: List[dict] = []
+    errors = []
+    for result in results:
+        if isinstance(result, BaseException):
+            print(f"ERROR: Generation shard failed: {result}")
+            errors.append(result)
+        else:
+            merged.extend(result)
+
+    merged, deficit = _take_counts(merged, counts)
+    if any(deficit.values()):
+        print(f"DEBUG: Topping up missing questions after fan-out: {deficit}")
+        try:
+            extra = await _generate_shard(request, subject_name, topics_data, deficit)
+            extra, _ = _take_counts(extra, deficit)
+            merged.extend(extra)
+        except Exception as e:
+            print(f"ERROR: Top-up generation failed: {e}")
+
+    if not merged and errors:
+        if isinstance(errors[0], HTTPException):
+            raise errors[0]
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"All generation shards failed: {errors[0]}",
+        )
+    return merged
+
+
+def _question_text(q_data: dict):
+    return (
+        q_data.get("text")
+        or q_data.get("question")
+        or q_data.get("question_text")
+    )
+
+
+def _question_row(
+    q_data: dict, idx: int, current_user: str, default_topic_id: str
+) -> Optional[dict]:
+    """Normalize one generated question into an insertable row; None if unusable."""
+    text = _question_text(q_data)
+    if not text or not isinstance(text, str):
+        print(f"DEBUG: Question {idx} missing text field. Data: {q_data}")
+        return None
+
+    options = q_data.get("options", q_data.get("choices", [])) or []
+    images = q_data.get("images", []) or []
+    if not isinstance(options, list) or not isinstance(images, list):
+        print(f"DEBUG: Question {idx} has malformed options/images. Data: {q_data}")
+        return None
+
+    try:
+        marks = int(q_data.get("marks", 1) or 1)
+    except (TypeError, ValueError):
+        print(f"DEBUG: Question {idx} has non-numeric marks. Data: {q_data}")
+        return None
+
+    return {
+        "id": str(uuid.uuid4()),
+        "type": str(q_data.get("type", "mcq")),
+        "text": text,
+        "options": options,
+        "correct_answer": q_data.get("correct_answer", q_data.get("answer")),
+        "explanation": q_data.get("explanation", ""),
+        "images": images,
+        "difficulty": str(q_data.get("difficulty", "medium")),
+        "marks": marks,
+        "topic_id": q_data.get("topic_id") or default_topic_id,
+        "user_id": current_user,
+        "times_served": 1,
+        "last_served_at": datetime.utcnow(),
+        # Set by _dedup_questions; missing signatures are computed on insert
+        "minhash": q_data.get("_minhash"),
+        "duplicate_of": q_data.get("_duplicate_of"),
+    }
+
+
+async def _persist_questions(
+    db: AsyncSession,
+    generated_questions: List[dict],
+    current_user: str,
+    default_topic_id: str,
+    start_idx: int = 0,
+) -> List[models.Question]:
+    """Validate all generated questions, then insert them in one transaction."""
+    rows = []
+    for idx, q_data in enumerate(generated_questions, start=start_idx):
+        row = _question_row(q_data, idx, current_user, default_topic_id)
+        if row is not None:
+            rows.append(row)
+
+    saved = await models.insert_questions(db, rows)
+    print(f"DEBUG: Saved {len(saved)} of {len(generated_questions)} generated question(s)")
+    return saved
+
+
+async def _dedup_questions(
+    db: AsyncSession,
+    generated_questions: List[dict],
+    current_user: str,
+    default_topic_id: str,
+    seen: Optional[dedup.SignatureIndex] = None,
+    served_ids: Optional[Set[str]] = None,
+) -> Tuple[List[dict], List[models.Question]]:
+    """
+    Catch near-duplicate generated questions before they are persisted.
+
+    Signatures for the whole batch are computed in one vectorized pass and the
+    user's bank is probed for every band of every question with one LSH
+    lookup. Repeats within the batch (or of ``seen``, earlier questions of the
+    same stream) are dropped. Bank matches are flagged with ``duplicate_of``
+    or, in "replace" mode, swapped for the existing question; matches already
+    in ``served_ids`` are simply dropped.
+
+    Returns the questions to persist and the bank questions replacing the rest.
+    """
+    if dedup.DEDUP_MODE == "off" or not generated_questions:
+        return generated_questions, []
+
+    probes = [
+        q_data for q_data in generated_questions
+        if isinstance(_question_text(q_data), str) and _question_text(q_data)
+    ]
+    if not probes:
+        return generated_questions, []
+    signatures = dedup.minhash_signatures([_question_text(q_data) for q_data in probes])
+    signature_of = {id(q_data): signature for q_data, signature in zip(probes, signatures)}
+
+    topic_ids = sorted({q_data.get("topic_id") or default_topic_id for q_data in probes})
+    band_keys = sorted({
+        (band, bucket)
+        for signature in signatures
+        for band, bucket in enumerate(dedup.lsh_buckets(signature))
+    })
+    bank = dedup.SignatureIndex()
+    for question_id, topic_id, minhash in await models.find_lsh_candidates(
+        db, current_user, topic_ids, band_keys
+    ):
+        bank.add(topic_id, question_id, dedup.signature_from_bytes(minhash))
+
+    seen = seen if seen is not None else dedup.SignatureIndex()
+    served_ids = served_ids if served_ids is not None else set()
+    kept: List[dict] = []
+    replacement_ids: List[str] = []
+    dropped = flagged = 0
+    for q_data in generated_questions:
+        signature = signature_of.get(id(q_data))
+        if signature is None:
+            kept.append(q_data)  # rejected later by _question_row
+            continue
+
+        topic_id = q_data.get("topic_id") or default_topic_id
+        if seen.match(topic_id, signature):
+            dropped += 1
+            continue
+        seen.add(topic_id, None, signature)
+
+        match = bank.match(topic_id, signature)
+        if match and match[0] in served_ids:
+            dropped += 1
+            continue
+        if match and dedup.DEDUP_MODE == "replace":
+            replacement_ids.append(match[0])
+            served_ids.add(match[0])
+            continue
+
+        q_data["_minhash"] = dedup.signature_to_bytes(signature)
+        if match:
+            q_data["_duplicate_of"] = match[0]
+            flagged += 1
+        kept.append(q_data)
+
+    replacements = await models.get_questions_by_ids(db, replacement_ids)
+    await models.mark_questions_served(db, replacement_ids)
+    print(
+        f"DEBUG: Dedup ({dedup.DEDUP_MODE}): kept {len(kept)}, flagged {flagged}, "
+        f"replaced {len(replacements)}, dropped {dropped} repeat(s)"
+    )
+    return kept, replacements
+
+
+async def _draw_from_bank(
+    db: AsyncSession, request, current_user: str, topic_ids: List[str], counts: dict
+) -> Tuple[List[models.Question], dict]:
+    """Fill as many slots as possible from the user's question bank; returns the shortfall."""
+    reused: List[models.Question] = []
+    remaining = dict(counts)
+    for q_type, wanted in counts.items():
+        if wanted <= 0:
+            continue
+        found = await models.draw_bank_questions(
+            db, current_user, topic_ids, q_type, request.difficulty, wanted
+        )
+        reused.extend(found)
+        remaining[q_type] = wanted - len(found)
+
+    await models.mark_questions_served(db, [q.id for q in reused])
+    print(f"DEBUG: Reused {len(reused)} bank question(s); still to generate: {remaining}")
+    return reused, remaining
+
+
+async def _generate_questions_from_topics(
+    db: AsyncSession,
+    request: Union[
+        schemas.WorksheetRequest,
+        schemas.QuizRequest,
+        schemas.ExamRequest,
+    ],
+    current_user: str,
+    topic_ids: List[str],
+) -> List[models.Question]:
+
+    if not topic_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Topic list cannot be empty.",
+        )
+
+    # 1. Aggregate topic + chapter + subject data
+    topics_data, subject_name = await _resolve_topics(db, request, topic_ids)
+
+    # 2. Optionally serve matching questions from the user's bank first
+    counts = _requested_counts(request)
+    reused: List[models.Question] = []
+    if request.reuse:
+        reused, counts = await _draw_from_bank(db, request, current_user, topic_ids, counts)
+
+    # 3. Then take pre-generated questions from the warm pool (refilled in the background)
+    pooled: List[dict] = []
+    if _pool_eligible(request, topics_data):
+        pooled, counts = await warm_pool.claim(db, topic_ids, request.difficulty, counts)
+
+    # 4. Build prompt(s) and call the LLM for the rest, optionally fanned out into shards
+    generated_questions: List[dict] = pooled
+    fan_out = getattr(request, "fan_out", "none") or "none"
+    if any(counts.values()):
+        if fan_out != "none":
+            generated_questions = pooled + await _generate_fanned_out(
+                request, subject_name, topics_data, fan_out, counts
+            )
+        else:
+            generated_questions = pooled + await _generate_shard(
+                request, subject_name, topics_data, counts
+            )
+
+    # 5. Flag or replace near-duplicates of the bank (and of each other)
+    generated_questions, replacements = await _dedup_questions(
+        db, generated_questions, current_user, topic_ids[0],
+        served_ids={q.id for q in reused},
+    )
+
+    # 6. If requested, generate images (concurrently across all questions)
+    if request.include_images:
+        await _generate_images_for_questions(generated_questions, subject_name)
+
+    # 7. Persist questions
+    saved_questions = reused + replacements + await _persist_questions(
+        db, generated_questions, current_user, topic_ids[0]
+    )
+
+    if not saved_questions:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to generate any valid questions. Please check the LLM response format.",
+        )
+
+    return saved_questions
+
+
+async def _stream_questions_from_topics(
+    db: AsyncSession,
+    request: Union[
+        schemas.WorksheetRequest,
+        schemas.QuizRequest,
+        schemas.ExamRequest,
+    ],
+    current_user: str,
+    topic_ids: List[str],
+) -> AsyncIterator[models.Question]:
+    """
+    Streaming variant of ``_generate_questions_from_topics``.
+
+    Topic validation happens eagerly (so bad ids still produce a 4xx), then
+    the returned async iterator yields each question as soon as the model
+    has emitted it, after generating its images and committing it.
+    """
+    if not topic_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Topic list cannot be empty.",
+        )
 
-        # ----------------- Robust JSON Parsing Block ----------------- #
-        try:
-            # 1. Strip whitespace and code fences like ```json ... ```
-            raw_content = content.strip()
-            raw_content = re.sub(
-                r'^```(?:json)?\s*', '', raw_content, flags=re.IGNORECASE
+    topics_data, subject_name = await _resolve_topics(db, request, topic_ids)
+    counts = _requested_counts(request)
+    reused: List[models.Question] = []
+    if request.reuse:
+        reused, counts = await _draw_from_bank(db, request, current_user, topic_ids, counts)
+    pooled: List[dict] = []
+    if _pool_eligible(request, topics_data):
+        pooled, counts = await warm_pool.claim(db, topic_ids, request.difficulty, counts)
+    prompt = _build_generation_prompt(request, subject_name, topics_data, counts)
+
+    async def _questions() -> AsyncIterator[models.Question]:
+        for question in reused:
+            yield question
+
+        seen = dedup.SignatureIndex()
+        served_ids = {q.id for q in reused}
+        if pooled:
+            kept, replacements = await _dedup_questions(
+                db, pooled, current_user, topic_ids[0], seen=seen, served_ids=served_ids
             )
-            raw_content = re.sub(r'\s*```$', '', raw_content)
-
-            # Remove common special tokens like <s>, </s>, <INST>, </INST>
-            raw_content = re.sub(
-                r'(</?s>|</?INST>|<INST>)', '', raw_content, flags=re.IGNORECASE
+            for question in replacements + await _persist_questions(
+                db, kept, current_user, topic_ids[0]
+            ):
+                yield question
+        if not any(counts.values()):
+            return
+
+        idx = len(pooled)
+        async for q_data in LLMService.stream_questions(
+            prompt, subject_name, use_cache=not request.bypass_cache, expected=sum(counts.values())
+        ):
+            q_data["topic_id"] = _match_topic_id(q_data, topics_data)
+            kept, replacements = await _dedup_questions(
+                db, [q_data], current_user, topic_ids[0], seen=seen, served_ids=served_ids
             )
-
-            # 2. CRITICAL: Fix invalid backslash escapes for LaTeX.
-            # We ONLY touch *single* backslashes that:
-            #   - are NOT preceded by another backslash, and
-            #   - do NOT start a valid JSON escape sequence (", \, /, b, f, n, r, t, u).
-            #
-            # This turns sequences like \,  \epsilon  \frac  etc. into \\,, \\epsilon, \\frac
-            # while leaving already valid escapes such as \\sin, \n, \t untouched.
-            raw_content = re.sub(
-                r'(?<!\\)\\(?!["\\/bfnrtu])', r'\\\\', raw_content
+            for question in replacements:
+                yield question
+            if not kept:
+                continue
+            if request.include_images:
+                await _generate_images_for_questions([q_data], subject_name)
+            saved = await _persist_questions(
+                db, [q_data], current_user, topic_ids[0], start_idx=idx
             )
+            idx += 1
+            for question in saved:
+                yield question
 
-            cleaned_content = raw_content
+    return _questions()
 
-            # 3. Isolate JSON array/object if there is extra noise around it
-            if cleaned_content.count('[') > 0 and cleaned_content.count(']') > 0:
-                start = cleaned_content.find('[')
-                end = cleaned_content.rfind(']')
-                cleaned_content = cleaned_content[start : end + 1]
-            elif (
-                not cleaned_content.startswith('[')
-                and cleaned_content.startswith('{')
-            ):
-                cleaned_content = f"[{cleaned_content}]"
 
-            if not cleaned_content.strip():
-                raise json.JSONDecodeError(
-                    "Content is empty after cleaning.", cleaned_content, 0
-                )
+STREAM_FORMATS = ("ndjson", "sse")
 
-            # 4. Parse JSON
-            questions = json.loads(cleaned_content)
 
-            print(
-                "DEBUG: Successfully parsed JSON. "
-                f"Questions count: {len(questions) if isinstance(questions, list) else 1}"
-            )
+def _encode_stream_event(event: str, data: dict, stream_format: str) -> str:
+    payload = json.dumps(data, ensure_ascii=False)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
 
-            if isinstance(questions, dict):
-                questions = [questions]
 
-            return questions
+def _streaming_questions_response(
+    questions: AsyncIterator[models.Question], stream_format: str
+) -> StreamingResponse:
+    """Wrap a question iterator as an NDJSON or Server-Sent Events response."""
 
-        except json.JSONDecodeError as e:
-            print(f"DEBUG: JSON parse error even after cleaning: {str(e)}")
-            print(
-                "DEBUG: Final cleaned content (first 500 chars): "
-                f"{cleaned_content[:500]}"
-            )
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=(
-                    "Failed to parse LLM response. Final attempt failed. "
-                    f"Raw response (truncated): {content[:200]}"
-                ),
+    async def _body():
+        count = 0
+        try:
+            async for question in questions:
+                count += 1
+                data = schemas.Question.model_validate(question).model_dump(mode="json")
+                yield _encode_stream_event("question", data, stream_format)
+            if count:
+                yield _encode_stream_event("done", {"count": count}, stream_format)
+            else:
+                yield _encode_stream_event(
+                    "error",
+                    {
+                        "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        "detail": "Failed to generate any valid questions. "
+                        "Please check the LLM response format.",
+                    },
+                    stream_format,
+                )
+        except HTTPException as e:
+            yield _encode_stream_event(
+                "error", {"status_code": e.status_code, "detail": e.detail}, stream_format
             )
         except Exception as e:
-            print(f"DEBUG: Unexpected error during JSON parsing: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Unexpected error during JSON parsing: {str(e)}",
+            yield _encode_stream_event(
+                "error",
+                {
+                    "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    "detail": f"Error streaming questions: {str(e)}",
+                },
+                stream_format,
             )
 
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        _body(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _check_fan_out(exam_request: schemas.ExamRequest) -> None:
+    if exam_request.fan_out not in EXAM_FAN_OUT_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Invalid fan_out '{exam_request.fan_out}'. "
+                f"Expected one of: {', '.join(EXAM_FAN_OUT_MODES)}"
+            ),
+        )
+
+
+def _check_stream_format(stream_format: str) -> None:
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Invalid format '{stream_format}'. "
+                f"Expected one of: {', '.join(STREAM_FORMATS)}"
+            ),
+        )
+
 
 # ---------------------------------------------------------------------------
-# Core logic: generate questions for topic list
+# Background generation jobs
 # ---------------------------------------------------------------------------
 
-async def _generate_questions_from_topics(
-    db: Session,
+JOB_REQUEST_SCHEMAS = {
+    "worksheet": schemas.WorksheetRequest,
+    "quiz": schemas.QuizRequest,
+    "exam": schemas.ExamRequest,
+}
+
+
+async def _execute_generation_job(db: AsyncSession, job: models.GenerationJob) -> List[str]:
+    """Run a persisted generation job and return the ids of the saved questions."""
+    request = JOB_REQUEST_SCHEMAS[job.kind](**(job.request or {}))
+    questions = await _generate_questions_from_topics(db, request, job.user_id, job.topic_ids)
+    return [question.id for question in questions]
+
+
+job_runner = InProcessJobRunner(
+    _execute_generation_job, workers=JOB_WORKERS, max_queue=JOB_QUEUE_MAX
+)
+
+
+async def _submit_generation_job(
+    db: AsyncSession,
+    kind: str,
     request: Union[
         schemas.WorksheetRequest,
         schemas.QuizRequest,
@@ -396,257 +1916,206 @@ async def _generate_questions_from_topics(
     ],
     current_user: str,
     topic_ids: List[str],
-) -> List[models.Question]:
-
+) -> models.GenerationJob:
+    """Validate topics, persist a queued job and hand it to the worker pool."""
     if not topic_ids:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Topic list cannot be empty.",
         )
+    await _resolve_topics(db, request, topic_ids)
 
-    topics_data = []
-    subject_name: Optional[str] = None
-
-    # 1. Aggregate topic + chapter + subject data
-    for topic_id in topic_ids:
-        topic = db.query(models.Topic).filter(models.Topic.id == topic_id).first()
-        if not topic:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Topic {topic_id} not found",
-            )
-
-        chapter = (
-            db.query(models.Chapter)
-            .filter(models.Chapter.id == topic.chapter_id)
-            .first()
+    job = await models.create_job(
+        db, str(uuid.uuid4()), kind, request.model_dump(), topic_ids, current_user
+    )
+    try:
+        job_runner.submit(job.id)
+    except QueueFullError:
+        job.status = "failed"
+        job.error = "Generation job queue is full"
+        job.finished_at = datetime.utcnow()
+        await db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Generation job queue is full. Please retry later.",
         )
-        if not chapter:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Chapter {topic.chapter_id} not found",
-            )
+    return job
 
-        subject = (
-            db.query(models.Subject)
-            .filter(models.Subject.id == chapter.subject_id)
-            .first()
-        )
-        if not subject:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Subject {chapter.subject_id} not found",
-            )
 
-        if subject_name is None:
-            subject_name = request.subject_name or subject.name
+# ---------------------------------------------------------------------------
+# Warm pool
+# ---------------------------------------------------------------------------
 
-        topics_data.append(
-            {
-                "name": topic.name,
-                "chapter_name": chapter.name,
-                "subtopics": ", ".join(topic.subtopics),
-            }
-        )
+def _pool_eligible(request, topics_data: List[dict]) -> bool:
+    """
+    Pooled questions use the default prompt: no images, subject override or cache bypass.
 
-    # 2. Build prompt
-    topic_names = ", ".join(d["name"] for d in topics_data)
-    subtopics = "; ".join(f"{d['name']} details: {d['subtopics']}" for d in topics_data)
-
-    normalized_subject = subject_name.lower().strip()
-
-    prompt_base = f"""
-    INSTRUCTION: USE LATEX FOR ALL MATHEMATICAL, CHEMICAL, AND SCIENTIFIC NOTATION.
-    Use '$' for inline and '$$' for display equations.
-
-    CRITICAL LATEX ESCAPING RULE: When including LaTeX inside JSON string values,
-    you MUST escape single backslashes as double backslashes (e.g., use '\\\\' for
-    '\\' in commands like '\\\\frac' or '\\\\text').
-
-    CRITICAL REQUIREMENT: ALL questions MUST include actual mathematical expressions,
-    chemical equations, physical formulas, or biological processes with quantitative
-    relationships in the question text. NEVER generate word-only questions without
-    proper expressions, equations, or formulas. Each question MUST require analytical
-    thinking and problem-solving.
-
-    Generate educational questions for an assessment with the following details:
-
-    Subject: {subject_name}
-    Topics Covered: {topic_names}
-    Detailed Concepts: {subtopics}
-
-    Generate the following types of questions:
-    - Multiple Choice Questions (MCQ): {request.mcq_count}
-    - Short Answer Questions: {request.short_answer_count}
-    - Long Answer Questions: {request.long_answer_count}
-
-    Difficulty level: {request.difficulty}
-
-    For each question, provide the following JSON structure (IMPORTANT):
-    {{
-        "type": "mcq" | "short" | "long" | "image",
-        "text": "The question text here (MUST include multiple LaTeX expressions/equations/formulas that require analytical thinking).",
-        "options": ["option1", "option2", "option3", "option4"],
-        "correct_answer": "The final answer with LaTeX expressions and complete derivations.",
-        "explanation": "A comprehensive, step-by-step derivation or explanation.",
-        "images": ["Image Description 1"],
-        "difficulty": "easy" | "medium" | "hard",
-        "marks": 1
-    }}
-
-    EXAMPLE MATH QUESTION:
-    {{
-        "type": "mcq",
-        "text": "Find the derivative of $f(x) = 3x^2\\sin(2x) + e^{{4x}}$ using the product rule and chain rule.",
-        "options": [
-            "$f'(x) = 6x\\sin(2x) + 6x^2\\cos(2x) + 4e^{{4x}}$",
-            "$f'(x) = 6x\\sin(2x) + 3x^2\\cos(2x) + e^{{4x}}$",
-            "$f'(x) = 3x^2\\sin(2x) + 2\\cos(2x) + 4e^{{4x}}$",
-            "$f'(x) = 6x\\sin(2x) - 6x^2\\cos(2x) + 4e^{{4x}}$"
-        ],
-        "correct_answer": 0,
-        "explanation": "Step 1: Apply product rule to $3x^2\\sin(2x)$: $\\\\frac{{d}}{{dx}}[uv] = u'v + uv'$ where $u = 3x^2$ and $v = \\\\sin(2x)$...",
-        "difficulty": "medium",
-        "marks": 2
-    }}
-
-    EXAMPLE CHEMISTRY QUESTION:
-    {{
-        "type": "short",
-        "text": "Calculate the equilibrium constant $K_c$ for the reaction $N_2(g) + 3H_2(g) \\\\rightleftharpoons 2NH_3(g)$ if at equilibrium $[N_2] = 0.2M$, $[H_2] = 0.5M$, and $[NH_3] = 0.8M$.",
-        "options": [],
-        "correct_answer": "$K_c = 25.6$",
-        "explanation": "Step 1: Write the equilibrium expression: $K_c = \\\\frac{{[NH_3]^2}}{{[N_2][H_2]^3}}$...",
-        "difficulty": "medium",
-        "marks": 3
-    }}
+    The frontend always sends ``subject_name``; it only counts as an override
+    when it differs from the subject the topics belong to.
     """
+    if request.include_images or request.bypass_cache:
+        return False
+    requested = (request.subject_name or "").strip().lower()
+    return not requested or all(
+        requested == (topic.get("subject_name") or "").strip().lower() for topic in topics_data
+    )
 
-    subject_instructions = ""
-    if "biology" in normalized_subject:
-        subject_instructions = r"""
-        For Biology questions:
-        - Generate questions with detailed biological processes and quantitative analysis.
-        - Include at least one biological formula/structure and one quantitative relationship.
-        """
-    elif "math" in normalized_subject or "mathematics" in normalized_subject:
-        subject_instructions = r"""
-        For Mathematics questions:
-        - Generate complex, multi-step problems with at least two distinct expressions.
-        """
-    elif "chemistry" in normalized_subject:
-        subject_instructions = r"""
-        For Chemistry questions:
-        - Include at least one balanced chemical equation and one quantitative formula.
-        """
-    elif "physics" in normalized_subject:
-        subject_instructions = r"""
-        For Physics questions:
-        - Include at least one governing law or vector equation plus quantitative formulas.
-        """
 
-    image_instructions = f"""
-    Include images: {request.include_images}
+async def _generate_pool_questions(db: AsyncSession, key: PoolKey, count: int) -> List[dict]:
+    """Generate fresh questions for one warm-pool slot."""
+    topic_id, q_type, difficulty = key
+    request = schemas.WorksheetRequest(
+        topic_id=topic_id,
+        difficulty=difficulty,
+        mcq_count=0,
+        short_answer_count=0,
+        long_answer_count=0,
+        bypass_cache=True,  # cached completions would just refill the pool with repeats
+    )
+    topics_data, subject_name = await _resolve_topics(db, request, [topic_id])
+    counts = {**_requested_counts(request), q_type: count}
+    generated = await _generate_shard(request, subject_name, topics_data, counts)
+    return [q_data for q_data in generated if q_data.get("type") == q_type]
+
+
+warm_pool = WarmPool(
+    _generate_pool_questions,
+    enabled=WARM_POOL_ENABLED,
+    size=WARM_POOL_SIZE,
+    low_watermark=WARM_POOL_LOW_WATERMARK,
+    batch_size=WARM_POOL_BATCH_SIZE,
+    concurrency=WARM_POOL_REFILL_CONCURRENCY,
+    max_keys=WARM_POOL_MAX_SLOTS,
+    min_demand=WARM_POOL_MIN_DEMAND,
+    half_life_seconds=WARM_POOL_DEMAND_HALF_LIFE_SECONDS,
+    llm_calls_per_hour=WARM_POOL_LLM_CALLS_PER_HOUR,
+    interval_seconds=WARM_POOL_REFILL_INTERVAL_SECONDS,
+)
 
-    {{"CRITICAL INSTRUCTION": If include_images is true, you MUST generate image-based
-    questions with type "image" and provide a detailed text description for each image
-    in the "images" field. If include_images is false, only generate mcq/short/long.}}
-    """
 
-    format_instructions = """
-    {"MANDATORY FORMAT": You are STRICTLY forbidden from including any text, explanation,
-    markdown (like ```json), or wrapping characters before or after the JSON array.
-    Respond with ONLY a single, valid JSON array of question objects. Start with '['
-    and end with ']'.}
-    """
+# ---------------------------------------------------------------------------
+# API Endpoints
+# ---------------------------------------------------------------------------
 
-    prompt = prompt_base + subject_instructions + image_instructions + format_instructions
+@app.get("/")
+async def root():
+    return {"message": "Classroom Canvas API"}
 
-    # 3. Call LLM
-    generated_questions = await LLMService.generate_questions(prompt, subject_name)
 
-    # 4. If requested, generate images
-    if request.include_images:
-        for q_data in generated_questions:
-            if q_data.get("type") == "image" and q_data.get("images"):
-                new_image_data = []
-                for image_description in q_data["images"]:
-                    try:
-                        base64_data_uri = await LLMService.generate_image(
-                            image_description, subject_name
-                        )
-                        new_image_data.append(base64_data_uri)
-                    except Exception as e:
-                        print(
-                            "ERROR: Image generation failed for prompt "
-                            f"'{image_description[:50]}...': {e}"
-                        )
-                        new_image_data = []
-                        break
-                q_data["images"] = new_image_data
+# ---------------------- LLM diagnostics ---------------------- #
+
+@app.get("/api/llm/stats")
+async def get_llm_stats(_: str = Depends(require_admin)):
+    """Expose OpenRouter client pool usage for monitoring (admin only)."""
+    return {
+        "http_pool": LLMService.pool_stats(),
+        "images": LLMService.image_stats(),
+        "cache": await _run_blocking(llm_cache.stats),
+        "coalescing": LLMService.coalesce_stats(),
+        "upstream": upstream_health.stats(),
+        "hedging": LLMService.hedge_stats(),
+        "warm_pool": warm_pool.stats(),
+        "prompts": prompt_stats.stats(),
+    }
 
-    # 5. Persist questions
-    saved_questions: List[models.Question] = []
-    for idx, q_data in enumerate(generated_questions):
-        try:
-            text = (
-                q_data.get("text")
-                or q_data.get("question")
-                or q_data.get("question_text")
-            )
-            if not text:
-                print(f"DEBUG: Question {idx} missing text field. Data: {q_data}")
-                continue
 
-            assigned_topic_id = topic_ids[0]
-
-            question = models.Question(
-                id=str(uuid.uuid4()),
-                type=q_data.get("type", "mcq"),
-                text=text,
-                options=q_data.get("options", q_data.get("choices", [])),
-                correct_answer=q_data.get("correct_answer", q_data.get("answer")),
-                explanation=q_data.get("explanation", ""),
-                images=q_data.get("images", []),
-                difficulty=q_data.get("difficulty", "medium"),
-                marks=q_data.get("marks", 1),
-                topic_id=assigned_topic_id,
-                user_id=current_user,
-            )
-            db.add(question)
-            db.commit()
-            db.refresh(question)
-            saved_questions.append(question)
-            print(f"DEBUG: Successfully created question {idx}")
-        except Exception as e:
-            print(f"DEBUG: Error processing question {idx}: {q_data}, Error: {str(e)}")
-            continue
+# ---------------------- Admin: model routing ---------------------- #
 
-    if not saved_questions:
+@app.get("/api/admin/llm/routing")
+async def get_llm_routing(_: str = Depends(require_admin)):
+    """Per-subject candidates, current choice, decision counts and rolling model statistics."""
+    return model_router.snapshot()
+
+
+@app.put("/api/admin/llm/routing/{subject}")
+async def update_llm_routing(
+    subject: str,
+    update: schemas.RoutingUpdate,
+    _: str = Depends(require_admin),
+):
+    """Replace a subject's candidates, pin or unpin a model, or reset its statistics (not persisted)."""
+    if subject not in model_router.candidates:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown subject")
+    if update.candidates is not None and not update.candidates:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to generate any valid questions. Please check the LLM response format.",
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Candidate list cannot be empty."
         )
 
-    return saved_questions
+    model_router.configure(
+        subject,
+        candidates=update.candidates,
+        pinned=update.pinned,
+        unpin="pinned" in update.model_fields_set and update.pinned is None,
+        reset_stats=update.reset_stats,
+    )
+    print(f"DEBUG: Routing for '{subject}' updated: {update.model_dump(exclude_unset=True)}")
+    return model_router.snapshot()["subjects"][subject]
 
 
-# ---------------------------------------------------------------------------
-# API Endpoints
-# ---------------------------------------------------------------------------
+# ---------------------- Images ---------------------- #
 
-@app.get("/")
-async def root():
-    return {"message": "Classroom Canvas API"}
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@app.get("/api/images/{digest}")
+async def get_image(digest: str, request: Request):
+    """Serve a content-addressed image with strong ETag, immutable caching and ranges."""
+    store = get_blob_store()
+    if not is_valid_digest(digest):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    content_type = store.content_type(digest)
+    if content_type is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    data = store.get(digest)
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    match = _RANGE_RE.match(range_header.strip()) if range_header else None
+    # Malformed ranges and stale If-Range validators fall back to the full body
+    if match and (match.group(1) or match.group(2)) and (not if_range or if_range == etag):
+        size = len(data)
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+        else:  # suffix range: last N bytes
+            start = max(size - int(match.group(2)), 0)
+            end = size - 1
+        if start > end:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+        return Response(
+            content=data[start : end + 1],
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=content_type,
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+        )
+
+    return Response(content=data, media_type=content_type, headers=headers)
 
 
 # ---------------------- Auth ---------------------- #
 
 @app.post("/api/auth/register", response_model=schemas.Token)
-async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        db_user = (
-            db.query(models.User).filter(models.User.username == user.username).first()
+        db_user = await db.scalar(
+            select(models.User).where(models.User.username == user.username)
         )
         if db_user:
             raise HTTPException(
@@ -662,8 +2131,8 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
             hashed_password=hashed_password,
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
 
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
@@ -681,10 +2150,10 @@ async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/api/auth/login", response_model=schemas.Token)
-async def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, db: AsyncSession = Depends(get_db)):
     try:
-        db_user = (
-            db.query(models.User).filter(models.User.username == user.username).first()
+        db_user = await db.scalar(
+            select(models.User).where(models.User.username == user.username)
         )
         if not db_user or db_user.hashed_password != user.password:
             raise HTTPException(
@@ -710,10 +2179,10 @@ async def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 @app.get("/api/auth/me", response_model=schemas.User)
 async def get_current_user(
-    current_user: str = Depends(verify_token), db: Session = Depends(get_db)
+    current_user: str = Depends(verify_token), db: AsyncSession = Depends(get_db)
 ):
     try:
-        user = db.query(models.User).filter(models.User.id == current_user).first()
+        user = await db.scalar(select(models.User).where(models.User.id == current_user))
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -730,38 +2199,48 @@ async def get_current_user(
 
 # ---------------------- Curriculum meta ---------------------- #
 
+@app.get("/api/curriculum/tree", response_model=List[schemas.GradeTree])
+async def get_curriculum_tree(
+    request: Request,
+    grade_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Whole Grade/Subject/Chapter/Topic hierarchy (optionally one grade) with ETag."""
+    snapshot = await curriculum_cache.get(db)
+    if grade_id is not None and not any(g["id"] == grade_id for g in snapshot.grades):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Grade not found")
+
+    body, etag = snapshot.encoded_tree(grade_id)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/grades", response_model=List[schemas.Grade])
-async def get_grades(db: Session = Depends(get_db)):
-    print("DEBUG: GET /api/grades called")
-    return db.query(models.Grade).all()
+async def get_grades(db: AsyncSession = Depends(get_db)):
+    return (await curriculum_cache.get(db)).grades
 
 
 @app.get("/api/grades/{grade_id}/subjects", response_model=List[schemas.Subject])
-async def get_subjects_by_grade(grade_id: str, db: Session = Depends(get_db)):
-    print(f"DEBUG: GET /api/grades/{grade_id}/subjects called")
-    return db.query(models.Subject).filter(models.Subject.grade_id == grade_id).all()
+async def get_subjects_by_grade(grade_id: str, db: AsyncSession = Depends(get_db)):
+    return (await curriculum_cache.get(db)).subjects_by_grade.get(grade_id, [])
 
 
 @app.get("/api/subjects", response_model=List[schemas.Subject])
-async def get_subjects(db: Session = Depends(get_db)):
-    print("DEBUG: GET /api/subjects called")
-    return db.query(models.Subject).all()
+async def get_subjects(db: AsyncSession = Depends(get_db)):
+    return (await curriculum_cache.get(db)).subjects
 
 
 @app.get("/api/subjects/{subject_id}/chapters", response_model=List[schemas.Chapter])
-async def get_chapters(subject_id: str, db: Session = Depends(get_db)):
-    print(f"DEBUG: GET /api/subjects/{subject_id}/chapters called")
-    return (
-        db.query(models.Chapter)
-        .filter(models.Chapter.subject_id == subject_id)
-        .all()
-    )
+async def get_chapters(subject_id: str, db: AsyncSession = Depends(get_db)):
+    return (await curriculum_cache.get(db)).chapters_by_subject.get(subject_id, [])
 
 
 @app.get("/api/chapters/{chapter_id}/topics", response_model=List[schemas.Topic])
-async def get_topics(chapter_id: str, db: Session = Depends(get_db)):
-    print(f"DEBUG: GET /api/chapters/{chapter_id}/topics called")
-    return db.query(models.Topic).filter(models.Topic.chapter_id == chapter_id).all()
+async def get_topics(chapter_id: str, db: AsyncSession = Depends(get_db)):
+    return (await curriculum_cache.get(db)).topics_by_chapter.get(chapter_id, [])
 
 
 # ---------------------- Generation endpoints ---------------------- #
@@ -770,7 +2249,7 @@ async def get_topics(chapter_id: str, db: Session = Depends(get_db)):
 async def generate_worksheet(
     worksheet_request: schemas.WorksheetRequest,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         topic_id = worksheet_request.topic_id
@@ -790,7 +2269,7 @@ async def generate_worksheet(
 async def generate_quiz(
     quiz_request: schemas.QuizRequest,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         topic_id = quiz_request.topic_id
@@ -810,7 +2289,7 @@ async def generate_quiz(
 async def generate_exam(
     exam_request: schemas.ExamRequest,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         topic_ids = exam_request.topic_ids
@@ -819,6 +2298,7 @@ async def generate_exam(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Exam must specify at least one topic ID.",
             )
+        _check_fan_out(exam_request)
 
         return await _generate_questions_from_topics(
             db, exam_request, current_user, topic_ids
@@ -832,21 +2312,224 @@ async def generate_exam(
         )
 
 
+@app.post("/api/generate-worksheet/stream")
+async def generate_worksheet_stream(
+    worksheet_request: schemas.WorksheetRequest,
+    stream_format: str = Query("ndjson", alias="format"),
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    _check_stream_format(stream_format)
+    questions = await _stream_questions_from_topics(
+        db, worksheet_request, current_user, [worksheet_request.topic_id]
+    )
+    return _streaming_questions_response(questions, stream_format)
+
+
+@app.post("/api/generate-quiz/stream")
+async def generate_quiz_stream(
+    quiz_request: schemas.QuizRequest,
+    stream_format: str = Query("ndjson", alias="format"),
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    _check_stream_format(stream_format)
+    questions = await _stream_questions_from_topics(
+        db, quiz_request, current_user, [quiz_request.topic_id]
+    )
+    return _streaming_questions_response(questions, stream_format)
+
+
+@app.post("/api/generate-exam/stream")
+async def generate_exam_stream(
+    exam_request: schemas.ExamRequest,
+    stream_format: str = Query("ndjson", alias="format"),
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    _check_stream_format(stream_format)
+    if not exam_request.topic_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Exam must specify at least one topic ID.",
+        )
+    questions = await _stream_questions_from_topics(
+        db, exam_request, current_user, exam_request.topic_ids
+    )
+    return _streaming_questions_response(questions, stream_format)
+
+
+# ---------------------- Background jobs ---------------------- #
+
+@app.post(
+    "/api/generate-worksheet/jobs",
+    response_model=schemas.Job,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_worksheet_job(
+    worksheet_request: schemas.WorksheetRequest,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    return await _submit_generation_job(
+        db, "worksheet", worksheet_request, current_user, [worksheet_request.topic_id]
+    )
+
+
+@app.post(
+    "/api/generate-quiz/jobs",
+    response_model=schemas.Job,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_quiz_job(
+    quiz_request: schemas.QuizRequest,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    return await _submit_generation_job(
+        db, "quiz", quiz_request, current_user, [quiz_request.topic_id]
+    )
+
+
+@app.post(
+    "/api/generate-exam/jobs",
+    response_model=schemas.Job,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_exam_job(
+    exam_request: schemas.ExamRequest,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    _check_fan_out(exam_request)
+    return await _submit_generation_job(
+        db, "exam", exam_request, current_user, exam_request.topic_ids
+    )
+
+
+@app.get("/api/jobs", response_model=List[schemas.Job])
+async def get_jobs(
+    current_user: str = Depends(verify_token), db: AsyncSession = Depends(get_db)
+):
+    return await models.get_jobs(db, current_user)
+
+
+@app.get("/api/jobs/{job_id}", response_model=schemas.JobDetail)
+async def get_job(
+    job_id: str,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    job = await models.get_job(db, job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    detail = schemas.JobDetail.model_validate(job)
+    if job.status == "succeeded" and job.question_ids:
+        questions = (
+            await db.scalars(
+                select(models.Question).where(models.Question.id.in_(job.question_ids))
+            )
+        ).all()
+        by_id = {question.id: question for question in questions}
+        detail.questions = [
+            schemas.Question.model_validate(by_id[qid])
+            for qid in job.question_ids
+            if qid in by_id
+        ]
+    return detail
+
+
+@app.post("/api/jobs/{job_id}/cancel", response_model=schemas.Job)
+async def cancel_job(
+    job_id: str,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    job = await models.get_job(db, job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if not await job_runner.cancel(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job already {job.status}",
+        )
+    await db.refresh(job)
+    return job
+
+
 # ---------------------- Questions CRUD ---------------------- #
 
-@app.get("/api/questions", response_model=List[schemas.Question])
+LIST_PAGE_MAX = 500
+
+
+def _encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(row_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def _keyset_response(rows: list, limit: int, response: Response) -> list:
+    """Trim the look-ahead row and expose the next-page cursor in X-Next-Cursor."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
+
+
+# Summary schemas come first in the unions: pydantic picks the member with the
+# most fields set, so full rows still serialize with every column.
+@app.get(
+    "/api/questions",
+    response_model=List[Union[schemas.QuestionSummary, schemas.Question]],
+)
 async def get_questions(
+    response: Response,
     topic_id: Optional[str] = None,
+    question_type: Optional[str] = Query(None, alias="type"),
+    difficulty: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=LIST_PAGE_MAX),
+    summary: bool = False,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
+    """
+    Newest-first page of the user's questions.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch
+    the next page; ``summary=true`` omits images, explanation and options.
+    """
     try:
-        query = db.query(models.Question).filter(
-            models.Question.user_id == current_user
+        rows = await models.get_questions(
+            db,
+            current_user,
+            topic_id=topic_id,
+            type=question_type,
+            difficulty=difficulty,
+            created_from=created_from,
+            created_to=created_to,
+            after=_decode_cursor(cursor),
+            limit=limit + 1,
+            summary=summary,
         )
-        if topic_id:
-            query = query.filter(models.Question.topic_id == topic_id)
-        return query.all()
+        return _keyset_response(rows, limit, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -858,16 +2541,14 @@ async def get_questions(
 async def get_question(
     question_id: str,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        question = (
-            db.query(models.Question)
-            .filter(
+        question = await db.scalar(
+            select(models.Question).where(
                 models.Question.id == question_id,
                 models.Question.user_id == current_user,
             )
-            .first()
         )
         if not question:
             raise HTTPException(
@@ -885,36 +2566,30 @@ async def get_question(
 
 # ---------------------- Worksheets CRUD ---------------------- #
 
+async def _require_owned_questions(
+    db: AsyncSession, question_ids: List[str], current_user: str
+) -> None:
+    """Validate all question ids with one query; 404 listing every bad id."""
+    missing = await models.find_missing_questions(db, question_ids, current_user)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "message": "Questions not found or not owned by the user",
+                "missing_question_ids": missing,
+            },
+        )
+
+
 @app.post("/api/worksheets", response_model=schemas.Worksheet)
 async def save_worksheet(
     worksheet: schemas.WorksheetCreate,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        topic = db.query(models.Topic).filter(models.Topic.id == worksheet.topic_id).first()
-        if not topic:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Topic not found"
-            )
-
-        for question_id in worksheet.question_ids:
-            question = (
-                db.query(models.Question)
-                .filter(
-                    models.Question.id == question_id,
-                    models.Question.user_id == current_user,
-                )
-                .first()
-            )
-            if not question:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=(
-                        f"Question with ID {question_id} not found "
-                        "or does not belong to the user"
-                    ),
-                )
+        await _require_topic_hierarchy(db, [worksheet.topic_id])
+        await _require_owned_questions(db, worksheet.question_ids, current_user)
 
         db_worksheet = models.Worksheet(
             id=str(uuid.uuid4()),
@@ -924,8 +2599,8 @@ async def save_worksheet(
             question_ids=worksheet.question_ids,
         )
         db.add(db_worksheet)
-        db.commit()
-        db.refresh(db_worksheet)
+        await db.commit()
+        await db.refresh(db_worksheet)
         return db_worksheet
     except HTTPException:
         raise
@@ -936,16 +2611,36 @@ async def save_worksheet(
         )
 
 
-@app.get("/api/worksheets", response_model=List[schemas.Worksheet])
+@app.get(
+    "/api/worksheets",
+    response_model=List[Union[schemas.WorksheetSummary, schemas.Worksheet]],
+)
 async def get_worksheets(
-    current_user: str = Depends(verify_token), db: Session = Depends(get_db)
+    response: Response,
+    topic_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=LIST_PAGE_MAX),
+    summary: bool = False,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
 ):
+    """Newest-first page of the user's worksheets, paginated like ``/api/questions``."""
     try:
-        return (
-            db.query(models.Worksheet)
-            .filter(models.Worksheet.user_id == current_user)
-            .all()
+        rows = await models.get_worksheets(
+            db,
+            current_user,
+            topic_id=topic_id,
+            created_from=created_from,
+            created_to=created_to,
+            after=_decode_cursor(cursor),
+            limit=limit + 1,
+            summary=summary,
         )
+        return _keyset_response(rows, limit, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -957,16 +2652,14 @@ async def get_worksheets(
 async def get_worksheet(
     worksheet_id: str,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        worksheet = (
-            db.query(models.Worksheet)
-            .filter(
+        worksheet = await db.scalar(
+            select(models.Worksheet).where(
                 models.Worksheet.id == worksheet_id,
                 models.Worksheet.user_id == current_user,
             )
-            .first()
         )
         if not worksheet:
             raise HTTPException(
@@ -982,28 +2675,85 @@ async def get_worksheet(
         )
 
 
+@app.patch("/api/worksheets/{worksheet_id}", response_model=schemas.Worksheet)
+async def update_worksheet(
+    worksheet_id: str,
+    changes: schemas.WorksheetUpdate,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        worksheet = await models.get_worksheet(db, worksheet_id, current_user)
+        if not worksheet:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Worksheet not found"
+            )
+
+        if changes.topic_id is not None:
+            await _require_topic_hierarchy(db, [changes.topic_id])
+            worksheet.topic_id = changes.topic_id
+        if changes.question_ids is not None:
+            await _require_owned_questions(db, changes.question_ids, current_user)
+            worksheet.question_ids = changes.question_ids
+            # Only worksheet_questions rows change, so onupdate won't fire
+            worksheet.updated_at = datetime.utcnow()
+        if changes.name is not None:
+            worksheet.name = changes.name
+
+        await db.commit()
+        await db.refresh(worksheet)
+        return worksheet
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating worksheet: {str(e)}",
+        )
+
+
+@app.get("/api/worksheets/{worksheet_id}/full", response_model=schemas.WorksheetFull)
+async def get_worksheet_full(
+    worksheet_id: str,
+    current_user: str = Depends(verify_token),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        worksheet = await models.get_worksheet_full(db, worksheet_id, current_user)
+        if not worksheet:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Worksheet not found"
+            )
+        return worksheet
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching worksheet: {str(e)}",
+        )
+
+
 @app.delete("/api/worksheets/{worksheet_id}")
 async def delete_worksheet(
     worksheet_id: str,
     current_user: str = Depends(verify_token),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        worksheet = (
-            db.query(models.Worksheet)
-            .filter(
+        worksheet = await db.scalar(
+            select(models.Worksheet).where(
                 models.Worksheet.id == worksheet_id,
                 models.Worksheet.user_id == current_user,
             )
-            .first()
         )
         if not worksheet:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Worksheet not found"
             )
 
-        db.delete(worksheet)
-        db.commit()
+        await db.delete(worksheet)
+        await db.commit()
         return {"message": "Worksheet deleted successfully"}
     except HTTPException:
         raise
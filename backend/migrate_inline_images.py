@@ -0,0 +1,67 @@
+"""
+Move inline base64 images out of ``questions.images`` into the blob store.
+
+Every ``data:...;base64,...`` entry is written to the content-addressed blob
+store and replaced by its ``/api/images/<sha256>`` reference. The script is
+idempotent: rows that only hold references or text are left untouched.
+
+Usage:
+    python migrate_inline_images.py [--batch-size 200] [--dry-run]
+"""
+import argparse
+
+from sqlalchemy import String, cast
+
+from blob_store import externalize_images, get_blob_store, parse_data_uri
+from database import SessionLocal, Question
+
+
+def migrate(batch_size: int = 200, dry_run: bool = False) -> dict:
+    store = get_blob_store()
+    stats = {"scanned": 0, "updated": 0, "images": 0}
+    db = SessionLocal()
+    try:
+        last_id = ""
+        while True:
+            # Keyset-paginate over candidate rows so memory stays bounded
+            rows = (
+                db.query(Question)
+                .filter(Question.id > last_id)
+                .filter(cast(Question.images, String).like("%data:%base64,%"))
+                .order_by(Question.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            for question in rows:
+                stats["scanned"] += 1
+                images = question.images or []
+                changed = sum(1 for img in images if parse_data_uri(img) is not None)
+                if changed:
+                    stats["updated"] += 1
+                    stats["images"] += changed
+                    if not dry_run:
+                        question.images = externalize_images(images, store)
+            last_id = rows[-1].id
+
+            if not dry_run:
+                db.commit()
+            print(f"Processed {stats['scanned']} questions, {stats['images']} images moved")
+    finally:
+        db.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    result = migrate(batch_size=args.batch_size, dry_run=args.dry_run)
+    print(
+        f"Done: {result['updated']} of {result['scanned']} questions updated, "
+        f"{result['images']} images {'would be ' if args.dry_run else ''}moved"
+    )
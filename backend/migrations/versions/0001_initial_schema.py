@@ -0,0 +1,143 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 04:39:24.791288
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('grades',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_grades_id'), 'grades', ['id'], unique=False)
+    op.create_index(op.f('ix_grades_name'), 'grades', ['name'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('username', sa.String(), nullable=True),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('hashed_password', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+
+    op.create_table('subjects',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('grade_id', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['grade_id'], ['grades.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_subjects_id'), 'subjects', ['id'], unique=False)
+    op.create_index(op.f('ix_subjects_name'), 'subjects', ['name'], unique=False)
+
+    op.create_table('chapters',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('subject_id', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_chapters_id'), 'chapters', ['id'], unique=False)
+    op.create_index(op.f('ix_chapters_name'), 'chapters', ['name'], unique=False)
+
+    op.create_table('topics',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('chapter_id', sa.String(), nullable=True),
+    sa.Column('subtopics', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['chapter_id'], ['chapters.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_topics_id'), 'topics', ['id'], unique=False)
+    op.create_index(op.f('ix_topics_name'), 'topics', ['name'], unique=False)
+
+    op.create_table('questions',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('text', sa.Text(), nullable=True),
+    sa.Column('options', sa.JSON(), nullable=True),
+    sa.Column('correct_answer', sa.JSON(), nullable=True),
+    sa.Column('explanation', sa.Text(), nullable=True),
+    sa.Column('images', sa.JSON(), nullable=True),
+    sa.Column('difficulty', sa.String(), nullable=True),
+    sa.Column('marks', sa.Integer(), nullable=True),
+    sa.Column('topic_id', sa.String(), nullable=True),
+    sa.Column('user_id', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_questions_difficulty'), 'questions', ['difficulty'], unique=False)
+    op.create_index(op.f('ix_questions_id'), 'questions', ['id'], unique=False)
+    op.create_index(op.f('ix_questions_type'), 'questions', ['type'], unique=False)
+
+    op.create_table('worksheets',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('topic_id', sa.String(), nullable=True),
+    sa.Column('user_id', sa.String(), nullable=True),
+    sa.Column('question_ids', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_worksheets_id'), 'worksheets', ['id'], unique=False)
+    op.create_index(op.f('ix_worksheets_name'), 'worksheets', ['name'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_worksheets_name'), table_name='worksheets')
+    op.drop_index(op.f('ix_worksheets_id'), table_name='worksheets')
+    op.drop_table('worksheets')
+
+    op.drop_index(op.f('ix_questions_type'), table_name='questions')
+    op.drop_index(op.f('ix_questions_id'), table_name='questions')
+    op.drop_index(op.f('ix_questions_difficulty'), table_name='questions')
+    op.drop_table('questions')
+
+    op.drop_index(op.f('ix_topics_name'), table_name='topics')
+    op.drop_index(op.f('ix_topics_id'), table_name='topics')
+    op.drop_table('topics')
+
+    op.drop_index(op.f('ix_chapters_name'), table_name='chapters')
+    op.drop_index(op.f('ix_chapters_id'), table_name='chapters')
+    op.drop_table('chapters')
+
+    op.drop_index(op.f('ix_subjects_name'), table_name='subjects')
+    op.drop_index(op.f('ix_subjects_id'), table_name='subjects')
+    op.drop_table('subjects')
+
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+
+    op.drop_index(op.f('ix_grades_name'), table_name='grades')
+    op.drop_index(op.f('ix_grades_id'), table_name='grades')
+    op.drop_table('grades')
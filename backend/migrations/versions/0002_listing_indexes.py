@@ -0,0 +1,40 @@
+"""listing indexes
+
+Composite indexes for the per-user listings (keyset pagination on
+created_at, id) and plain indexes on the curriculum foreign keys.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 04:39:43.917999
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_questions_user_created', 'questions', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_questions_user_topic_created', 'questions', ['user_id', 'topic_id', 'created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_questions_topic_id'), 'questions', ['topic_id'], unique=False)
+    op.create_index('ix_worksheets_user_created', 'worksheets', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index(op.f('ix_subjects_grade_id'), 'subjects', ['grade_id'], unique=False)
+    op.create_index(op.f('ix_chapters_subject_id'), 'chapters', ['subject_id'], unique=False)
+    op.create_index(op.f('ix_topics_chapter_id'), 'topics', ['chapter_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_topics_chapter_id'), table_name='topics')
+    op.drop_index(op.f('ix_chapters_subject_id'), table_name='chapters')
+    op.drop_index(op.f('ix_subjects_grade_id'), table_name='subjects')
+    op.drop_index('ix_worksheets_user_created', table_name='worksheets')
+    op.drop_index(op.f('ix_questions_topic_id'), table_name='questions')
+    op.drop_index('ix_questions_user_topic_created', table_name='questions')
+    op.drop_index('ix_questions_user_created', table_name='questions')
@@ -0,0 +1,91 @@
+"""worksheet questions
+
+Move Worksheet.question_ids (JSON array) into the ordered
+worksheet_questions association table. Ids that no longer reference an
+existing question are dropped, since the new table enforces the FK.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 05:02:11.402913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+worksheets = sa.table(
+    'worksheets',
+    sa.column('id', sa.String()),
+    sa.column('question_ids', sa.JSON()),
+)
+worksheet_questions = sa.table(
+    'worksheet_questions',
+    sa.column('worksheet_id', sa.String()),
+    sa.column('position', sa.Integer()),
+    sa.column('question_id', sa.String()),
+)
+questions = sa.table('questions', sa.column('id', sa.String()))
+
+
+def upgrade() -> None:
+    op.create_table('worksheet_questions',
+    sa.Column('worksheet_id', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['worksheet_id'], ['worksheets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('worksheet_id', 'position')
+    )
+    op.create_index(op.f('ix_worksheet_questions_question_id'), 'worksheet_questions', ['question_id'], unique=False)
+
+    conn = op.get_bind()
+    dropped = 0
+    for worksheet_id, question_ids in conn.execute(sa.select(worksheets.c.id, worksheets.c.question_ids)).all():
+        question_ids = [qid for qid in (question_ids or []) if isinstance(qid, str)]
+        if not question_ids:
+            continue
+        existing = set(conn.execute(
+            sa.select(questions.c.id).where(questions.c.id.in_(question_ids))
+        ).scalars())
+        rows = [
+            {'worksheet_id': worksheet_id, 'position': position, 'question_id': qid}
+            for position, qid in enumerate(qid for qid in question_ids if qid in existing)
+        ]
+        dropped += len(question_ids) - len(rows)
+        if rows:
+            conn.execute(worksheet_questions.insert(), rows)
+    if dropped:
+        print(f"Dropped {dropped} worksheet question id(s) that reference missing questions")
+
+    with op.batch_alter_table('worksheets', schema=None) as batch_op:
+        batch_op.drop_column('question_ids')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('worksheets', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('question_ids', sa.JSON(), nullable=True))
+
+    conn = op.get_bind()
+    grouped = {}
+    for worksheet_id, question_id in conn.execute(
+        sa.select(worksheet_questions.c.worksheet_id, worksheet_questions.c.question_id)
+        .order_by(worksheet_questions.c.worksheet_id, worksheet_questions.c.position)
+    ).all():
+        grouped.setdefault(worksheet_id, []).append(question_id)
+    for worksheet_id in conn.execute(sa.select(worksheets.c.id)).scalars().all():
+        conn.execute(
+            worksheets.update()
+            .where(worksheets.c.id == worksheet_id)
+            .values(question_ids=grouped.get(worksheet_id, []))
+        )
+
+    op.drop_index(op.f('ix_worksheet_questions_question_id'), table_name='worksheet_questions')
+    op.drop_table('worksheet_questions')
@@ -0,0 +1,35 @@
+"""question bank reuse
+
+Serve-tracking columns and the bank lookup index used by the generation
+``reuse`` option.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 05:31:47.120583
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('times_served', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('last_served_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_questions_bank', 'questions', ['user_id', 'topic_id', 'type', 'difficulty', 'last_served_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_questions_bank', table_name='questions')
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_column('last_served_at')
+        batch_op.drop_column('times_served')
@@ -0,0 +1,47 @@
+"""question minhash
+
+MinHash signature and duplicate flag on questions, plus the per-topic LSH
+band table used for near-duplicate lookups. Existing questions get their
+signatures from ``backfill_question_signatures.py``.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 06:12:40.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('minhash', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('duplicate_of', sa.String(), nullable=True))
+
+    op.create_table('question_lsh_bands',
+    sa.Column('question_id', sa.String(), nullable=False),
+    sa.Column('band', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('topic_id', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('question_id', 'band')
+    )
+    op.create_index('ix_question_lsh_bands_lookup', 'question_lsh_bands', ['user_id', 'topic_id', 'band', 'bucket'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_question_lsh_bands_lookup', table_name='question_lsh_bands')
+    op.drop_table('question_lsh_bands')
+    with op.batch_alter_table('questions', schema=None) as batch_op:
+        batch_op.drop_column('duplicate_of')
+        batch_op.drop_column('minhash')
@@ -0,0 +1,40 @@
+"""question pool
+
+Pre-generated, unassigned questions kept warm for popular
+(topic, type, difficulty) slots.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 06:58:03.274611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('question_pool',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('topic_id', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('difficulty', sa.String(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_question_pool_slot', 'question_pool', ['topic_id', 'type', 'difficulty', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_question_pool_slot', table_name='question_pool')
+    op.drop_table('question_pool')
@@ -0,0 +1,184 @@
+import random
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# Floor for the success * yield denominator, so a model that never succeeds
+# gets a large but finite cost and can still be compared
+_MIN_EFFECTIVENESS = 0.05
+
+
+class RouteStats:
+    """Rolling (EWMA) statistics for one (subject, model) pair."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.calls = 0
+        self.failures = 0
+        self.latency: Optional[float] = None
+        self.success_rate: Optional[float] = None
+        self.question_yield: Optional[float] = None
+        self.updated_at: Optional[float] = None
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + self.alpha * (sample - current)
+
+    def record(self, latency: float, ok: bool, question_yield: float) -> None:
+        self.calls += 1
+        self.failures += not ok
+        self.latency = self._ewma(self.latency, latency)
+        self.success_rate = self._ewma(self.success_rate, 1.0 if ok else 0.0)
+        self.question_yield = self._ewma(self.question_yield, question_yield)
+        self.updated_at = time.time()
+
+    def cost(self) -> Optional[float]:
+        """Expected seconds per successful, complete call (lower is better)."""
+        if self.latency is None:
+            return None
+        effectiveness = max(self.success_rate * self.question_yield, _MIN_EFFECTIVENESS)
+        return self.latency / effectiveness
+
+    def stats(self) -> dict:
+        cost = self.cost()
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+            "success_rate": round(self.success_rate, 3) if self.success_rate is not None else None,
+            "question_yield": round(self.question_yield, 3) if self.question_yield is not None else None,
+            "cost": round(cost, 3) if cost is not None else None,
+            "updated_at": self.updated_at,
+        }
+
+
+class ModelRouter:
+    """
+    Latency-aware model choice per subject.
+
+    Each subject has an ordered candidate list. A request normally goes to
+    the candidate with the lowest cost: EWMA latency divided by EWMA
+    parse-success rate times EWMA question yield (valid questions returned
+    over questions requested), among candidates with at least
+    ``min_samples`` calls. Until any candidate qualifies, the first one (the
+    configured default) is used. With probability ``explore_rate`` the least
+    sampled other candidate is tried instead, so alternatives keep fresh
+    statistics. Candidates whose upstream is unhealthy are skipped, and a
+    subject can be pinned to one model at runtime. When disabled, the first
+    candidate is always used (statistics are still recorded).
+    """
+
+    def __init__(
+        self,
+        candidates: Dict[str, List[str]],
+        is_healthy: Callable[[str], bool] = lambda model: True,
+        enabled: bool = True,
+        explore_rate: float = 0.05,
+        alpha: float = 0.2,
+        min_samples: int = 3,
+        history: int = 100,
+    ):
+        self.candidates = {subject: list(models) for subject, models in candidates.items()}
+        self.is_healthy = is_healthy
+        self.enabled = enabled
+        self.explore_rate = explore_rate
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.pinned: Dict[str, str] = {}
+        self._stats: Dict[Tuple[str, str], RouteStats] = {}
+        self._decisions: Dict[str, Dict[str, int]] = {}
+        self._recent: Deque[dict] = deque(maxlen=history)
+
+    def _route_stats(self, subject: str, model: str) -> RouteStats:
+        stats = self._stats.get((subject, model))
+        if stats is None:
+            stats = self._stats[(subject, model)] = RouteStats(self.alpha)
+        return stats
+
+    def best(self, subject: str) -> Tuple[str, str]:
+        """``(model, reason)`` the router would use without exploring."""
+        if subject in self.pinned:
+            return self.pinned[subject], "pinned"
+        models = self.candidates.get(subject) or self.candidates["default"]
+        healthy = [model for model in models if self.is_healthy(model)] or models
+        if not self.enabled:
+            return healthy[0], "default"
+        scored = []
+        for model in healthy:
+            stats = self._stats.get((subject, model))
+            if stats is not None and stats.calls >= self.min_samples:
+                scored.append((stats.cost(), model))
+        if not scored:
+            return healthy[0], "default"
+        return min(scored)[1], "lowest_cost"
+
+    def choose(self, subject: str) -> str:
+        model, reason = self.best(subject)
+        if self.enabled and reason != "pinned" and random.random() < self.explore_rate:
+            models = self.candidates.get(subject) or self.candidates["default"]
+            others = [m for m in models if m != model and self.is_healthy(m)]
+            if others:
+                model = min(others, key=lambda m: self._route_stats(subject, m).calls)
+                reason = "explore"
+
+        counts = self._decisions.setdefault(subject, {})
+        counts[reason] = counts.get(reason, 0) + 1
+        self._recent.append({"at": time.time(), "subject": subject, "model": model, "reason": reason})
+        return model
+
+    def record(
+        self, subject: str, model: str, latency: float, ok: bool, valid: int, expected: int
+    ) -> None:
+        """Record one finished call; ``valid`` of ``expected`` questions came back usable."""
+        if expected > 0:
+            question_yield = min(1.0, valid / expected)
+        else:
+            question_yield = 1.0 if ok else 0.0
+        self._route_stats(subject, model).record(latency, ok, question_yield)
+
+    # ---------------------- Admin ---------------------- #
+
+    def configure(
+        self,
+        subject: str,
+        candidates: Optional[List[str]] = None,
+        pinned: Optional[str] = None,
+        unpin: bool = False,
+        reset_stats: bool = False,
+    ) -> None:
+        if candidates is not None:
+            self.candidates[subject] = list(candidates)
+        if unpin:
+            self.pinned.pop(subject, None)
+        if pinned is not None:
+            self.pinned[subject] = pinned
+        if reset_stats:
+            for key in [key for key in self._stats if key[0] == subject]:
+                del self._stats[key]
+
+    def snapshot(self) -> dict:
+        subjects = {}
+        for subject in sorted(set(self.candidates) | {key[0] for key in self._stats}):
+            models = self.candidates.get(subject) or self.candidates["default"]
+            tracked = {key[1] for key in self._stats if key[0] == subject}
+            model, reason = self.best(subject)
+            subjects[subject] = {
+                "candidates": models,
+                "pinned": self.pinned.get(subject),
+                "current": {"model": model, "reason": reason},
+                "decisions": self._decisions.get(subject, {}),
+                "models": {
+                    m: {
+                        **(self._stats.get((subject, m)) or RouteStats(self.alpha)).stats(),
+                        "healthy": self.is_healthy(m),
+                    }
+                    for m in list(models) + sorted(tracked - set(models))
+                },
+            }
+        return {
+            "enabled": self.enabled,
+            "explore_rate": self.explore_rate,
+            "ewma_alpha": self.alpha,
+            "min_samples": self.min_samples,
+            "subjects": subjects,
+            "recent_decisions": list(self._recent),
+        }
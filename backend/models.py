@@ -1,15 +1,24 @@
-from sqlalchemy.orm import Session
-from database import Base, User, Grade, Subject, Chapter, Topic, Question, Worksheet
+import uuid
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from database import Base, User, Grade, Subject, Chapter, Topic, Question, QuestionLSHBand, PooledQuestion, Worksheet, WorksheetQuestion, GenerationJob
 import schemas
+from blob_store import externalize_images
+from curriculum_cache import curriculum_cache
+import dedup
 
 # User operations
-def get_user(db: Session, user_id: str):
-    return db.query(User).filter(User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: str):
+    return await db.scalar(select(User).where(User.id == user_id))
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
 
-def create_user(db: Session, user: schemas.UserCreate):
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
     # In production, hash the password before storing
     db_user = User(
         id=user.id,
@@ -18,39 +27,40 @@ def create_user(db: Session, user: schemas.UserCreate):
         hashed_password=user.password  # In production, use hashed password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 # Grade operations
-def get_grades(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Grade).offset(skip).limit(limit).all()
+async def get_grades(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(Grade).offset(skip).limit(limit))).all()
 
-def get_grade(db: Session, grade_id: str):
-    return db.query(Grade).filter(Grade.id == grade_id).first()
+async def get_grade(db: AsyncSession, grade_id: str):
+    return await db.scalar(select(Grade).where(Grade.id == grade_id))
 
-def create_grade(db: Session, grade_obj: schemas.GradeCreate):
+async def create_grade(db: AsyncSession, grade_obj: schemas.GradeCreate):
     db_grade = Grade(
         id=grade_obj.id,
         name=grade_obj.name,
         description=grade_obj.description
     )
     db.add(db_grade)
-    db.commit()
-    db.refresh(db_grade)
+    await db.commit()
+    await db.refresh(db_grade)
+    curriculum_cache.invalidate()
     return db_grade
 
-def get_subjects_by_grade(db: Session, grade_id: str):
-    return db.query(Subject).filter(Subject.grade_id == grade_id).all()
+async def get_subjects_by_grade(db: AsyncSession, grade_id: str):
+    return (await db.scalars(select(Subject).where(Subject.grade_id == grade_id))).all()
 
 # Subject operations
-def get_subjects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Subject).offset(skip).limit(limit).all()
+async def get_subjects(db: AsyncSession, skip: int = 0, limit: int = 100):
+    return (await db.scalars(select(Subject).offset(skip).limit(limit))).all()
 
-def get_subject(db: Session, subject_id: str):
-    return db.query(Subject).filter(Subject.id == subject_id).first()
+async def get_subject(db: AsyncSession, subject_id: str):
+    return await db.scalar(select(Subject).where(Subject.id == subject_id))
 
-def create_subject(db: Session, subject: schemas.SubjectCreate):
+async def create_subject(db: AsyncSession, subject: schemas.SubjectCreate):
     db_subject = Subject(
         id=subject.id,
         name=subject.name,
@@ -58,18 +68,19 @@ def create_subject(db: Session, subject: schemas.SubjectCreate):
         grade_id=subject.grade_id
     )
     db.add(db_subject)
-    db.commit()
-    db.refresh(db_subject)
+    await db.commit()
+    await db.refresh(db_subject)
+    curriculum_cache.invalidate()
     return db_subject
 
 # Chapter operations
-def get_chapters_by_subject(db: Session, subject_id: str):
-    return db.query(Chapter).filter(Chapter.subject_id == subject_id).all()
+async def get_chapters_by_subject(db: AsyncSession, subject_id: str):
+    return (await db.scalars(select(Chapter).where(Chapter.subject_id == subject_id))).all()
 
-def get_chapter(db: Session, chapter_id: str):
-    return db.query(Chapter).filter(Chapter.id == chapter_id).first()
+async def get_chapter(db: AsyncSession, chapter_id: str):
+    return await db.scalar(select(Chapter).where(Chapter.id == chapter_id))
 
-def create_chapter(db: Session, chapter: schemas.ChapterCreate):
+async def create_chapter(db: AsyncSession, chapter: schemas.ChapterCreate):
     db_chapter = Chapter(
         id=chapter.id,
         name=chapter.name,
@@ -77,18 +88,19 @@ def create_chapter(db: Session, chapter: schemas.ChapterCreate):
         subject_id=chapter.subject_id
     )
     db.add(db_chapter)
-    db.commit()
-    db.refresh(db_chapter)
+    await db.commit()
+    await db.refresh(db_chapter)
+    curriculum_cache.invalidate()
     return db_chapter
 
 # Topic operations
-def get_topics_by_chapter(db: Session, chapter_id: str):
-    return db.query(Topic).filter(Topic.chapter_id == chapter_id).all()
+async def get_topics_by_chapter(db: AsyncSession, chapter_id: str):
+    return (await db.scalars(select(Topic).where(Topic.chapter_id == chapter_id))).all()
 
-def get_topic(db: Session, topic_id: str):
-    return db.query(Topic).filter(Topic.id == topic_id).first()
+async def get_topic(db: AsyncSession, topic_id: str):
+    return await db.scalar(select(Topic).where(Topic.id == topic_id))
 
-def create_topic(db: Session, topic: schemas.TopicCreate):
+async def create_topic(db: AsyncSession, topic: schemas.TopicCreate):
     db_topic = Topic(
         id=topic.id,
         name=topic.name,
@@ -97,21 +109,185 @@ def create_topic(db: Session, topic: schemas.TopicCreate):
         subtopics=topic.subtopics
     )
     db.add(db_topic)
-    db.commit()
-    db.refresh(db_topic)
+    await db.commit()
+    await db.refresh(db_topic)
+    curriculum_cache.invalidate()
     return db_topic
 
+class TopicHierarchy(NamedTuple):
+    topic: Topic
+    chapter: Chapter
+    subject: Subject
+    grade: Optional[Grade]
+
+async def resolve_topic_hierarchy(
+    db: AsyncSession, topic_ids: List[str]
+) -> Tuple[Dict[str, TopicHierarchy], List[str]]:
+    """
+    Load topics with their chapter, subject and grade in one joined query.
+
+    Returns the resolved hierarchies keyed by topic id, plus a description of
+    every missing link (unknown topic, orphaned chapter or subject) so callers
+    can report all of them at once. A missing grade is not an error.
+    """
+    unique_ids = list(dict.fromkeys(topic_ids))
+    if not unique_ids:
+        return {}, []
+
+    query = (
+        select(Topic, Chapter, Subject, Grade)
+        .outerjoin(Chapter, Chapter.id == Topic.chapter_id)
+        .outerjoin(Subject, Subject.id == Chapter.subject_id)
+        .outerjoin(Grade, Grade.id == Subject.grade_id)
+        .where(Topic.id.in_(unique_ids))
+    )
+    rows = {row.Topic.id: row for row in (await db.execute(query)).all()}
+
+    resolved: Dict[str, TopicHierarchy] = {}
+    missing: List[str] = []
+    for topic_id in unique_ids:
+        row = rows.get(topic_id)
+        if row is None:
+            missing.append(f"Topic {topic_id}")
+        elif row.Chapter is None:
+            missing.append(f"Chapter {row.Topic.chapter_id} (topic {topic_id})")
+        elif row.Subject is None:
+            missing.append(f"Subject {row.Chapter.subject_id} (topic {topic_id})")
+        else:
+            resolved[topic_id] = TopicHierarchy(row.Topic, row.Chapter, row.Subject, row.Grade)
+    return resolved, missing
+
 # Question operations
-def get_questions(db: Session, user_id: str, topic_id: str = None, skip: int = 0, limit: int = 100):
-    query = db.query(Question).filter(Question.user_id == user_id)
+# Columns returned by summary listings; images, explanation, options and
+# answers are never read from the database for these.
+QUESTION_SUMMARY_COLUMNS = (
+    Question.id, Question.type, Question.text, Question.difficulty,
+    Question.marks, Question.topic_id, Question.user_id, Question.created_at,
+)
+WORKSHEET_SUMMARY_COLUMNS = (
+    Worksheet.id, Worksheet.name, Worksheet.topic_id, Worksheet.user_id,
+    Worksheet.created_at, Worksheet.updated_at,
+)
+
+def _keyset_page(query, model, after: Optional[Tuple[datetime, str]], limit: int):
+    """Newest-first page of ``query`` starting strictly after the ``(created_at, id)`` cursor."""
+    if after is not None:
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(*after))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit)
+
+async def get_questions(
+    db: AsyncSession,
+    user_id: str,
+    topic_id: str = None,
+    type: str = None,
+    difficulty: str = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    after: Optional[Tuple[datetime, str]] = None,
+    limit: int = 100,
+    summary: bool = False,
+):
+    query = select(*QUESTION_SUMMARY_COLUMNS) if summary else select(Question)
+    query = query.where(Question.user_id == user_id)
     if topic_id:
-        query = query.filter(Question.topic_id == topic_id)
-    return query.offset(skip).limit(limit).all()
+        query = query.where(Question.topic_id == topic_id)
+    if type:
+        query = query.where(Question.type == type)
+    if difficulty:
+        query = query.where(Question.difficulty == difficulty)
+    if created_from:
+        query = query.where(Question.created_at >= created_from)
+    if created_to:
+        query = query.where(Question.created_at < created_to)
+    query = _keyset_page(query, Question, after, limit)
+    if summary:
+        return (await db.execute(query)).all()
+    return (await db.scalars(query)).all()
+
+async def get_question(db: AsyncSession, question_id: str):
+    return await db.scalar(select(Question).where(Question.id == question_id))
+
+async def find_missing_questions(db: AsyncSession, question_ids: List[str], user_id: str) -> List[str]:
+    """Return the ids (in request order) that don't exist or belong to another user."""
+    unique_ids = list(dict.fromkeys(question_ids))
+    if not unique_ids:
+        return []
+    owned = set((await db.scalars(
+        select(Question.id).where(Question.id.in_(unique_ids), Question.user_id == user_id)
+    )).all())
+    return [question_id for question_id in unique_ids if question_id not in owned]
+
+async def draw_bank_questions(
+    db: AsyncSession,
+    user_id: str,
+    topic_ids: List[str],
+    type: str,
+    difficulty: str,
+    limit: int,
+):
+    """Existing questions matching a generation slot, least recently served first."""
+    query = (
+        select(Question)
+        .where(
+            Question.user_id == user_id,
+            Question.topic_id.in_(topic_ids),
+            Question.type == type,
+            Question.difficulty == difficulty,
+        )
+        .order_by(
+            Question.last_served_at.asc().nulls_first(),
+            Question.times_served,
+            Question.created_at.desc(),
+        )
+        .limit(limit)
+    )
+    return (await db.scalars(query)).all()
+
+async def find_lsh_candidates(
+    db: AsyncSession, user_id: str, topic_ids: List[str], band_keys: List[Tuple[int, int]]
+):
+    """
+    Bank questions sharing at least one LSH ``(band, bucket)`` with the probes.
+
+    Returns ``(id, topic_id, minhash)`` rows; callers confirm real similarity
+    against the full signatures.
+    """
+    if not topic_ids or not band_keys:
+        return []
+    matching = (
+        select(QuestionLSHBand.question_id)
+        .where(
+            QuestionLSHBand.user_id == user_id,
+            QuestionLSHBand.topic_id.in_(topic_ids),
+            tuple_(QuestionLSHBand.band, QuestionLSHBand.bucket).in_(band_keys),
+        )
+        .distinct()
+    )
+    query = select(Question.id, Question.topic_id, Question.minhash).where(
+        Question.id.in_(matching), Question.minhash.is_not(None)
+    )
+    return (await db.execute(query)).all()
+
+async def get_questions_by_ids(db: AsyncSession, question_ids: List[str]):
+    """Questions for the given ids, in the given order (unknown ids are skipped)."""
+    if not question_ids:
+        return []
+    found = {
+        q.id: q for q in (await db.scalars(select(Question).where(Question.id.in_(question_ids)))).all()
+    }
+    return [found[question_id] for question_id in question_ids if question_id in found]
 
-def get_question(db: Session, question_id: str):
-    return db.query(Question).filter(Question.id == question_id).first()
+async def mark_questions_served(db: AsyncSession, question_ids: List[str]):
+    if not question_ids:
+        return
+    await db.execute(
+        update(Question)
+        .where(Question.id.in_(question_ids))
+        .values(times_served=Question.times_served + 1, last_served_at=datetime.utcnow())
+    )
+    await db.commit()
 
-def create_question(db: Session, question: schemas.QuestionCreate, user_id: str):
+async def create_question(db: AsyncSession, question: schemas.QuestionCreate, user_id: str):
     db_question = Question(
         id=question.id,
         type=question.type,
@@ -119,54 +295,205 @@ def create_question(db: Session, question: schemas.QuestionCreate, user_id: str)
         options=question.options,
         correct_answer=question.correct_answer,
         explanation=question.explanation,
-        images=question.images,
+        images=externalize_images(question.images),
         difficulty=question.difficulty,
         marks=question.marks,
         topic_id=question.topic_id,
         user_id=user_id
     )
     db.add(db_question)
-    db.commit()
-    db.refresh(db_question)
+    await db.commit()
+    await db.refresh(db_question)
     return db_question
 
-def create_bulk_questions(db: Session, questions: list, user_id: str):
-    db_questions = []
-    for question_data in questions:
-        db_question = Question(
-            id=question_data.id,
-            type=question_data.type,
-            text=question_data.text,
-            options=question_data.options,
-            correct_answer=question_data.correct_answer,
-            explanation=question_data.explanation,
-            images=question_data.images,
-            difficulty=question_data.difficulty,
-            marks=question_data.marks,
-            topic_id=question_data.topic_id,
-            user_id=user_id
+def _attach_signatures(rows: List[dict]) -> None:
+    """Fill in ``minhash`` for rows that don't carry one yet, in one vectorized pass."""
+    missing = [row for row in rows if row.get("minhash") is None]
+    if not missing:
+        return
+    signatures = dedup.minhash_signatures([row.get("text") or "" for row in missing])
+    for row, signature in zip(missing, signatures):
+        row["minhash"] = dedup.signature_to_bytes(signature)
+
+def _lsh_band_rows(questions) -> List[dict]:
+    rows = []
+    for question in questions:
+        if question.minhash is None or question.topic_id is None:
+            continue
+        buckets = dedup.lsh_buckets(dedup.signature_from_bytes(question.minhash))
+        rows.extend(
+            {
+                "question_id": question.id,
+                "band": band,
+                "bucket": bucket,
+                "user_id": question.user_id,
+                "topic_id": question.topic_id,
+            }
+            for band, bucket in enumerate(buckets)
         )
-        db.add(db_question)
-        db_questions.append(db_question)
-    
-    db.commit()
-    # Refresh all questions
-    for question in db_questions:
-        db.refresh(question)
-    
-    return db_questions
+    return rows
+
+async def _insert_question_batch(db: AsyncSession, stmt, rows: List[dict]) -> list:
+    async with db.begin_nested():
+        saved = list((await db.scalars(stmt, rows)).all())
+        band_rows = _lsh_band_rows(saved)
+        if band_rows:
+            await db.execute(insert(QuestionLSHBand), band_rows)
+    return saved
+
+async def insert_questions(db: AsyncSession, rows: List[dict]):
+    """
+    Insert question rows in a single transaction and return them hydrated.
+
+    The whole batch goes out as one multi-row INSERT ... RETURNING inside a
+    savepoint, together with the LSH band rows of each question's MinHash
+    signature. If that fails, each row is retried in its own savepoint so a
+    single bad question doesn't discard the rest of the batch.
+    """
+    if not rows:
+        return []
+
+    _attach_signatures(rows)
+    stmt = insert(Question).returning(Question, sort_by_parameter_order=True)
+    try:
+        saved = await _insert_question_batch(db, stmt, rows)
+    except Exception as e:
+        print(f"DEBUG: Bulk insert of {len(rows)} questions failed, retrying row by row: {e}")
+        saved = []
+        for row in rows:
+            try:
+                saved.extend(await _insert_question_batch(db, stmt, [row]))
+            except Exception as row_error:
+                print(f"DEBUG: Skipping question {row.get('id')}: {row_error}")
+
+    await db.commit()
+    return saved
+
+async def create_bulk_questions(db: AsyncSession, questions: list, user_id: str):
+    rows = [
+        {
+            "id": question_data.id,
+            "type": question_data.type,
+            "text": question_data.text,
+            "options": question_data.options,
+            "correct_answer": question_data.correct_answer,
+            "explanation": question_data.explanation,
+            "images": externalize_images(question_data.images),
+            "difficulty": question_data.difficulty,
+            "marks": question_data.marks,
+            "topic_id": question_data.topic_id,
+            "user_id": user_id,
+        }
+        for question_data in questions
+    ]
+    return await insert_questions(db, rows)
+
+# Warm pool operations
+async def claim_pooled_questions(
+    db: AsyncSession, topic_ids: List[str], type: str, difficulty: str, limit: int
+) -> List[Tuple[str, dict]]:
+    """
+    Atomically remove up to ``limit`` pooled questions for a slot, oldest first.
+
+    Returns ``(topic_id, payload)`` pairs. On PostgreSQL concurrent claimers
+    skip each other's locked rows instead of waiting or double-claiming.
+    """
+    if limit <= 0 or not topic_ids:
+        return []
+    oldest = (
+        select(PooledQuestion.id)
+        .where(
+            PooledQuestion.topic_id.in_(topic_ids),
+            PooledQuestion.type == type,
+            PooledQuestion.difficulty == difficulty,
+        )
+        .order_by(PooledQuestion.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = (await db.execute(
+        delete(PooledQuestion)
+        .where(PooledQuestion.id.in_(oldest))
+        .returning(PooledQuestion.topic_id, PooledQuestion.payload)
+    )).all()
+    await db.commit()
+    return [(topic_id, payload) for topic_id, payload in claimed]
+
+async def count_pooled_questions(db: AsyncSession, topic_ids: List[str]) -> Dict[Tuple[str, str, str], int]:
+    """Pool size per ``(topic_id, type, difficulty)`` for the given topics."""
+    if not topic_ids:
+        return {}
+    rows = (await db.execute(
+        select(PooledQuestion.topic_id, PooledQuestion.type, PooledQuestion.difficulty, func.count())
+        .where(PooledQuestion.topic_id.in_(topic_ids))
+        .group_by(PooledQuestion.topic_id, PooledQuestion.type, PooledQuestion.difficulty)
+    )).all()
+    return {(topic_id, type, difficulty): count for topic_id, type, difficulty, count in rows}
+
+async def add_pooled_questions(
+    db: AsyncSession, topic_id: str, type: str, difficulty: str, payloads: List[dict]
+):
+    if not payloads:
+        return
+    await db.execute(
+        insert(PooledQuestion),
+        [
+            {
+                "id": str(uuid.uuid4()),
+                "topic_id": topic_id,
+                "type": type,
+                "difficulty": difficulty,
+                "payload": payload,
+                "created_at": datetime.utcnow(),
+            }
+            for payload in payloads
+        ],
+    )
+    await db.commit()
 
 # Worksheet operations
-def get_worksheets(db: Session, user_id: str, skip: int = 0, limit: int = 100):
-    return db.query(Worksheet).filter(Worksheet.user_id == user_id).offset(skip).limit(limit).all()
+async def get_worksheets(
+    db: AsyncSession,
+    user_id: str,
+    topic_id: str = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    after: Optional[Tuple[datetime, str]] = None,
+    limit: int = 100,
+    summary: bool = False,
+):
+    query = select(*WORKSHEET_SUMMARY_COLUMNS) if summary else select(Worksheet)
+    query = query.where(Worksheet.user_id == user_id)
+    if topic_id:
+        query = query.where(Worksheet.topic_id == topic_id)
+    if created_from:
+        query = query.where(Worksheet.created_at >= created_from)
+    if created_to:
+        query = query.where(Worksheet.created_at < created_to)
+    query = _keyset_page(query, Worksheet, after, limit)
+    if summary:
+        return (await db.execute(query)).all()
+    return (await db.scalars(query)).all()
 
-def get_worksheet(db: Session, worksheet_id: str, user_id: str):
-    return db.query(Worksheet).filter(
+async def get_worksheet(db: AsyncSession, worksheet_id: str, user_id: str):
+    return await db.scalar(select(Worksheet).where(
         Worksheet.id == worksheet_id,
         Worksheet.user_id == user_id
-    ).first()
+    ))
+
+async def get_worksheet_full(db: AsyncSession, worksheet_id: str, user_id: str):
+    """Load a worksheet with its questions in position order in a single query."""
+    query = (
+        select(Worksheet)
+        .outerjoin(Worksheet.question_links)
+        .outerjoin(WorksheetQuestion.question)
+        .options(contains_eager(Worksheet.question_links).contains_eager(WorksheetQuestion.question))
+        .where(Worksheet.id == worksheet_id, Worksheet.user_id == user_id)
+        .order_by(WorksheetQuestion.position)
+    )
+    return (await db.scalars(query)).unique().first()
 
-def create_worksheet(db: Session, worksheet: schemas.WorksheetCreate, user_id: str):
+async def create_worksheet(db: AsyncSession, worksheet: schemas.WorksheetCreate, user_id: str):
     db_worksheet = Worksheet(
         id=worksheet.id,
         name=worksheet.name,
@@ -175,18 +502,50 @@ def create_worksheet(db: Session, worksheet: schemas.WorksheetCreate, user_id: s
         question_ids=worksheet.question_ids
     )
     db.add(db_worksheet)
-    db.commit()
-    db.refresh(db_worksheet)
+    await db.commit()
+    await db.refresh(db_worksheet)
     return db_worksheet
 
-def delete_worksheet(db: Session, worksheet_id: str, user_id: str):
-    worksheet = db.query(Worksheet).filter(
+async def delete_worksheet(db: AsyncSession, worksheet_id: str, user_id: str):
+    worksheet = await db.scalar(select(Worksheet).where(
         Worksheet.id == worksheet_id,
         Worksheet.user_id == user_id
-    ).first()
-    
+    ))
+
     if worksheet:
-        db.delete(worksheet)
-        db.commit()
-    
-    return worksheet
\ No newline at end of file
+        await db.delete(worksheet)
+        await db.commit()
+
+    return worksheet
+
+# Generation job operations
+async def get_job(db: AsyncSession, job_id: str, user_id: str):
+    return await db.scalar(select(GenerationJob).where(
+        GenerationJob.id == job_id,
+        GenerationJob.user_id == user_id
+    ))
+
+async def get_jobs(db: AsyncSession, user_id: str, skip: int = 0, limit: int = 100):
+    query = (
+        select(GenerationJob)
+        .where(GenerationJob.user_id == user_id)
+        .order_by(GenerationJob.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return (await db.scalars(query)).all()
+
+async def create_job(db: AsyncSession, job_id: str, kind: str, request: dict, topic_ids: list, user_id: str):
+    db_job = GenerationJob(
+        id=job_id,
+        kind=kind,
+        status="queued",
+        request=request,
+        topic_ids=topic_ids,
+        question_ids=[],
+        user_id=user_id
+    )
+    db.add(db_job)
+    await db.commit()
+    await db.refresh(db_job)
+    return db_job
@@ -0,0 +1,330 @@
+import math
+import operator
+import re
+import string
+import textwrap
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional
+
+# ---------------------------------------------------------------------------
+# Token estimation
+# ---------------------------------------------------------------------------
+
+# Letter runs, digit runs, single symbols and whitespace runs, roughly how BPE
+# tokenizers split LaTeX-heavy English
+_TOKEN_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|\s+|[^\sA-Za-z\d]")
+
+# Chat formatting overhead per message (role markers and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Estimates of compiled static texts, so they are only counted once
+_known_estimates: Dict[str, int] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local, tokenizer-free estimate of the input tokens for ``text``.
+
+    Words count one token per five letters (at least one), numbers one per
+    three digits, every other symbol one. A space before a word is free;
+    other whitespace runs count one. A heuristic: ``PromptStats`` reports
+    the ratio of provider-reported to estimated tokens to check it against.
+    """
+    if not text:
+        return 0
+    known = _known_estimates.get(text)
+    if known is not None:
+        return known
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            tokens += max(1, math.ceil(len(piece) / 5))
+        elif first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isspace():
+            tokens += piece != " "
+        else:
+            tokens += 1
+    return tokens
+
+
+def estimate_message_tokens(messages: List[dict]) -> int:
+    """Estimated prompt tokens for a chat ``messages`` list (text content only)."""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        total += MESSAGE_OVERHEAD_TOKENS
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Templates
+# ---------------------------------------------------------------------------
+
+class PromptTemplate:
+    """
+    A ``str.format``-style template compiled once into a %-format string.
+
+    ``render`` is then one ``itemgetter`` call and one ``%``; a missing value
+    raises ``KeyError``.
+    """
+
+    def __init__(self, source: str):
+        self.source = textwrap.dedent(source).strip()
+        compiled = []
+        self.fields: List[str] = []
+        for literal, field, _, _ in string.Formatter().parse(self.source):
+            compiled.append(literal.replace("%", "%%"))
+            if field is not None:
+                compiled.append("%s")
+                self.fields.append(field)
+        self._compiled = "".join(compiled)
+        getter = operator.itemgetter(*self.fields) if self.fields else (lambda values: ())
+        # itemgetter returns a bare value, not a 1-tuple, for a single field
+        self._values = getter if len(self.fields) != 1 else (lambda values: (getter(values),))
+
+    def render(self, **values) -> str:
+        return self._compiled % self._values(values)
+
+
+def _static(text: str) -> str:
+    """Dedent a static text and remember its token estimate."""
+    text = textwrap.dedent(text).strip()
+    _known_estimates[text] = estimate_tokens(text)
+    return text
+
+
+_ROLE = (
+    "You are an expert educational content creator specializing in generating "
+    "rigorous, expression-based questions with detailed mathematical, chemical, "
+    "or physical formulations."
+)
+
+_SUBJECT_RULES = {
+    "Biology": (
+        "You specialize in biology questions with biological processes, molecular "
+        "structures, quantitative relationships and detailed diagrams. Each question "
+        "includes at least one biological formula or structure and one quantitative "
+        "relationship."
+    ),
+    "Mathematics": (
+        "You specialize in mathematics questions with complex expressions, multi-step "
+        "equations, calculus operations and rigorous problem-solving. Each question is "
+        "a multi-step problem with at least two distinct expressions."
+    ),
+    "Chemistry": (
+        "You specialize in chemistry questions with chemical equations, reaction "
+        "mechanisms, stoichiometric calculations and thermodynamic analysis. Each "
+        "question includes at least one balanced chemical equation and one "
+        "quantitative formula."
+    ),
+    "Physics": (
+        "You specialize in physics questions with physical formulas, vector equations, "
+        "multi-step problem-solving and real-world applications. Each question includes "
+        "at least one governing law or vector equation plus quantitative formulas."
+    ),
+    "default": "",
+}
+
+_RULES = """
+    Rules:
+    - Use LaTeX for all mathematical, chemical and scientific notation: '$' for inline and '$$' for display equations.
+    - Inside JSON strings, escape every LaTeX backslash as a double backslash (write \\\\frac, \\\\text).
+    - Every question MUST include actual mathematical expressions, chemical equations, physical formulas or biological processes with quantitative relationships, and MUST require analytical thinking. NEVER write word-only questions.
+"""
+
+_FIELDS = """
+    Each question is a JSON object with these fields:
+    {"type": "mcq" | "short" | "long" | "image", "topic": "name of the covered topic it belongs to", "text": "question text with LaTeX expressions", "options": ["4 options for mcq, else empty"], "correct_answer": "final answer with LaTeX and complete derivation", "explanation": "step-by-step derivation or explanation", "images": ["image description, for image questions"], "difficulty": "easy" | "medium" | "hard", "marks": 1}
+"""
+
+_MATH_EXAMPLE = r"""
+    {"type": "mcq", "topic": "Differentiation", "text": "Find the derivative of $f(x) = 3x^2\\sin(2x) + e^{4x}$ using the product rule and chain rule.", "options": ["$f'(x) = 6x\\sin(2x) + 6x^2\\cos(2x) + 4e^{4x}$", "$f'(x) = 6x\\sin(2x) + 3x^2\\cos(2x) + e^{4x}$", "$f'(x) = 3x^2\\sin(2x) + 2\\cos(2x) + 4e^{4x}$", "$f'(x) = 6x\\sin(2x) - 6x^2\\cos(2x) + 4e^{4x}$"], "correct_answer": 0, "explanation": "Step 1: Apply the product rule to $3x^2\\sin(2x)$: $\\frac{d}{dx}[uv] = u'v + uv'$ with $u = 3x^2$ and $v = \\sin(2x)$...", "difficulty": "medium", "marks": 2}
+"""
+
+_CHEMISTRY_EXAMPLE = r"""
+    {"type": "short", "topic": "Chemical Equilibrium", "text": "Calculate the equilibrium constant $K_c$ for $N_2(g) + 3H_2(g) \\rightleftharpoons 2NH_3(g)$ if at equilibrium $[N_2] = 0.2M$, $[H_2] = 0.5M$ and $[NH_3] = 0.8M$.", "options": [], "correct_answer": "$K_c = 25.6$", "explanation": "Step 1: Write the equilibrium expression: $K_c = \\frac{[NH_3]^2}{[N_2][H_2]^3}$...", "difficulty": "medium", "marks": 3}
+"""
+
+# Only the example closest to the subject is sent; both for the rest
+_SUBJECT_EXAMPLES = {
+    "Mathematics": (_MATH_EXAMPLE,),
+    "Physics": (_MATH_EXAMPLE,),
+    "Chemistry": (_CHEMISTRY_EXAMPLE,),
+}
+
+_FORMAT = """
+    Respond with ONLY valid JSON: a single array of question objects, starting with '[' and ending with ']' (or the {"questions": [...]} object when a response schema asks for it). No markdown fences, prose or other text before or after it.
+"""
+
+QUESTIONS_USER_TEMPLATE = PromptTemplate(
+    """
+    Subject: {subject}
+    Topics Covered: {topics}
+    Detailed Concepts: {subtopics}
+    Generate {mcq} multiple choice (mcq), {short} short answer (short) and {long} long answer (long) questions.
+    Difficulty level: {difficulty}
+    {images}
+    """
+)
+
+_IMAGES_ON = (
+    'Include images: true. Also generate image-based questions with type "image" and '
+    'a detailed text description of each image in the "images" field.'
+)
+_IMAGES_OFF = "Include images: false. Only generate mcq, short and long questions."
+
+IMAGE_USER_TEMPLATE = PromptTemplate(
+    "Generate a clear, educational image or diagram for {subject} "
+    "based on this description for a quiz question: {description}"
+)
+
+
+@lru_cache(maxsize=None)
+def questions_system_prompt(subject_key: str) -> str:
+    """
+    The static system message for question generation, built once per subject.
+
+    Holds everything that does not change between requests: role, subject
+    rules, LaTeX rules, the question fields, a worked example and the reply
+    format. Keeping it identical across requests also lets providers reuse
+    their prompt cache for it.
+    """
+    subject_rules = _SUBJECT_RULES.get(subject_key, "")
+    examples = _SUBJECT_EXAMPLES.get(subject_key, (_MATH_EXAMPLE, _CHEMISTRY_EXAMPLE))
+    parts = [
+        f"{_ROLE} {subject_rules}".strip(),
+        textwrap.dedent(_RULES).strip(),
+        textwrap.dedent(_FIELDS).strip(),
+        "Example:\n" + "\n".join(textwrap.dedent(example).strip() for example in examples),
+        textwrap.dedent(_FORMAT).strip(),
+    ]
+    return _static("\n\n".join(parts))
+
+
+def questions_user_prompt(
+    subject_name: str, topics_data: List[dict], counts: dict, difficulty: str, include_images: bool
+) -> str:
+    """The per-request part of a question prompt: subject, topics, counts and difficulty."""
+    return QUESTIONS_USER_TEMPLATE.render(
+        subject=subject_name,
+        topics=", ".join(d["name"] for d in topics_data),
+        subtopics="; ".join(f"{d['name']} details: {d['subtopics']}" for d in topics_data),
+        mcq=counts["mcq"],
+        short=counts["short"],
+        long=counts["long"],
+        difficulty=difficulty,
+        images=_IMAGES_ON if include_images else _IMAGES_OFF,
+    )
+
+
+def image_user_prompt(subject_name: str, description: str) -> str:
+    return IMAGE_USER_TEMPLATE.render(subject=subject_name, description=description)
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+class PromptStats:
+    """
+    Prompt and completion sizes per request kind ("questions", "image").
+
+    Every upstream call records its estimated prompt tokens and, when the
+    response reports ``usage``, the actual prompt/completion tokens, so the
+    estimate can be checked against the provider's count.
+    """
+
+    def __init__(self, history: int = 50):
+        self._kinds: Dict[str, Dict[str, float]] = {}
+        self._recent: Deque[dict] = deque(maxlen=history)
+
+    def _counters(self, kind: str) -> Dict[str, float]:
+        counters = self._kinds.get(kind)
+        if counters is None:
+            counters = self._kinds[kind] = {
+                "builds": 0,
+                "build_seconds": 0.0,
+                "requests": 0,
+                "prompt_chars": 0,
+                "estimated_prompt_tokens": 0,
+                "completion_chars": 0,
+                "reported_requests": 0,
+                "reported_prompt_tokens": 0,
+                "reported_completion_tokens": 0,
+                "estimated_prompt_tokens_reported": 0,
+            }
+        return counters
+
+    def record_build(self, kind: str, started_at: float) -> None:
+        """Count one prompt build that began at ``time.perf_counter()`` value ``started_at``."""
+        counters = self._counters(kind)
+        counters["builds"] += 1
+        counters["build_seconds"] += time.perf_counter() - started_at
+
+    def record(
+        self,
+        kind: str,
+        model: str,
+        messages: List[dict],
+        completion: str = "",
+        usage: Optional[dict] = None,
+    ) -> dict:
+        """Record one finished upstream call and return its size entry."""
+        prompt_chars = sum(len(m["content"]) for m in messages if isinstance(m.get("content"), str))
+        estimated = estimate_message_tokens(messages)
+        entry = {
+            "at": time.time(),
+            "kind": kind,
+            "model": model,
+            "prompt_chars": prompt_chars,
+            "estimated_prompt_tokens": estimated,
+            "completion_chars": len(completion),
+            "prompt_tokens": None,
+            "completion_tokens": None,
+        }
+        counters = self._counters(kind)
+        counters["requests"] += 1
+        counters["prompt_chars"] += prompt_chars
+        counters["estimated_prompt_tokens"] += estimated
+        counters["completion_chars"] += len(completion)
+        if usage and usage.get("prompt_tokens") is not None:
+            entry["prompt_tokens"] = usage.get("prompt_tokens")
+            entry["completion_tokens"] = usage.get("completion_tokens")
+            counters["reported_requests"] += 1
+            counters["reported_prompt_tokens"] += usage.get("prompt_tokens") or 0
+            counters["reported_completion_tokens"] += usage.get("completion_tokens") or 0
+            counters["estimated_prompt_tokens_reported"] += estimated
+        self._recent.append(entry)
+        return entry
+
+    def stats(self) -> dict:
+        kinds = {}
+        for kind, c in self._kinds.items():
+            requests, reported = c["requests"], c["reported_requests"]
+            kinds[kind] = {
+                "builds": c["builds"],
+                "avg_build_ms": round(c["build_seconds"] / c["builds"] * 1000, 3) if c["builds"] else None,
+                "requests": requests,
+                "avg_prompt_chars": round(c["prompt_chars"] / requests) if requests else None,
+                "avg_estimated_prompt_tokens": (
+                    round(c["estimated_prompt_tokens"] / requests) if requests else None
+                ),
+                "avg_completion_chars": round(c["completion_chars"] / requests) if requests else None,
+                "reported_requests": reported,
+                "avg_prompt_tokens": round(c["reported_prompt_tokens"] / reported) if reported else None,
+                "avg_completion_tokens": (
+                    round(c["reported_completion_tokens"] / reported) if reported else None
+                ),
+                # Actual / estimated prompt tokens, over calls that reported usage
+                "estimate_ratio": (
+                    round(c["reported_prompt_tokens"] / c["estimated_prompt_tokens_reported"], 3)
+                    if c["estimated_prompt_tokens_reported"] else None
+                ),
+            }
+        return {"kinds": kinds, "recent": list(self._recent)}
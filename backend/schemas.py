@@ -89,6 +89,16 @@ class Topic(TopicBase):
     class Config:
         from_attributes = True
 
+# Curriculum tree (GET /api/curriculum/tree)
+class ChapterTree(Chapter):
+    topics: List[Topic] = []
+
+class SubjectTree(Subject):
+    chapters: List[ChapterTree] = []
+
+class GradeTree(Grade):
+    subjects: List[SubjectTree] = []
+
 # Question schemas
 class QuestionBase(BaseModel):
     type: str  # mcq, short, long, image
@@ -110,10 +120,25 @@ class Question(QuestionBase):
     topic_id: str
     user_id: str
     created_at: datetime
+    duplicate_of: Optional[str] = None  # bank question this near-duplicates
     
     class Config:
         from_attributes = True
 
+class QuestionSummary(BaseModel):
+    """Listing projection without images, explanation, options or answer."""
+    id: str
+    type: str
+    text: str
+    difficulty: str
+    marks: int = 1
+    topic_id: str
+    user_id: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
 # Worksheet schemas
 class WorksheetBase(BaseModel):
     name: str
@@ -123,6 +148,12 @@ class WorksheetBase(BaseModel):
 class WorksheetCreate(WorksheetBase):
     id: str
 
+class WorksheetUpdate(BaseModel):
+    """Partial update; omitted fields are left unchanged."""
+    name: Optional[str] = None
+    topic_id: Optional[str] = None
+    question_ids: Optional[List[str]] = None
+
 class Worksheet(WorksheetBase):
     id: str
     user_id: str
@@ -132,6 +163,22 @@ class Worksheet(WorksheetBase):
     class Config:
         from_attributes = True
 
+class WorksheetFull(Worksheet):
+    """Worksheet with its questions expanded in position order."""
+    questions: List[Question] = []
+
+class WorksheetSummary(BaseModel):
+    """Listing projection without the question id list."""
+    id: str
+    name: str
+    topic_id: str
+    user_id: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
 # --- Assessment Generation Request Models (NEW/MODIFIED) ---
 
 class BaseGenerationRequest(BaseModel):
@@ -143,6 +190,8 @@ class BaseGenerationRequest(BaseModel):
     subject_name: Optional[str] = ""
     include_images: bool = False
     generate_real_images: bool = False
+    bypass_cache: bool = False  # Skip the LLM completion cache and fetch fresh questions
+    reuse: bool = False  # Fill slots from the user's existing questions before calling the LLM
     
 
 # 1. Worksheet Request (Standard practice tool, single topic)
@@ -166,4 +215,33 @@ class ExamRequest(BaseGenerationRequest):
     short_answer_count: int = 5
     long_answer_count: int = 3
     difficulty: str = "hard" # Higher default difficulty
-    name: str = "Generated Exam"
\ No newline at end of file
+    name: str = "Generated Exam"
+    # Split generation into concurrent sub-requests: none | topic | type | topic_type
+    fan_out: str = "none"
+
+# --- Background generation jobs ---
+
+class Job(BaseModel):
+    id: str
+    kind: str  # worksheet, quiz, exam
+    status: str  # queued, running, succeeded, failed, cancelled
+    topic_ids: List[str] = []
+    question_ids: List[str] = []
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class JobDetail(Job):
+    # Populated once the job has succeeded
+    questions: List[Question] = []
+
+# --- Admin ---
+
+class RoutingUpdate(BaseModel):
+    candidates: Optional[List[str]] = None  # replaces the subject's candidate list
+    pinned: Optional[str] = None  # model to always use; send null to unpin
+    reset_stats: bool = False
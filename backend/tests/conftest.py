@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Point everything at throwaway locations before any backend module reads its settings
+_TMP = tempfile.mkdtemp(prefix="worksheet-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP, 'app.db')}"
+os.environ["LLM_CACHE_PATH"] = os.path.join(_TMP, "llm_cache.sqlite3")
+os.environ["BLOB_STORE_PATH"] = os.path.join(_TMP, "blobs")
+os.environ.setdefault("OPENROUTER_API_KEY", "test-key")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """The app module, imported once against the throwaway database."""
+    import main
+
+    return main
+
+
+@pytest.fixture(scope="session")
+def curriculum(main_module):
+    """One subject -> chapter -> two topics, as the seed data lays them out."""
+    from database import Chapter, Grade, SessionLocal, Subject, Topic
+
+    db = SessionLocal()
+    try:
+        if db.get(Grade, "grade-1") is None:
+            db.add(Grade(id="grade-1", name="Grade 1"))
+        db.add(Subject(id="subj-math", name="Mathematics", grade_id="grade-1"))
+        db.add(Chapter(id="chap-calc", name="Calculus", subject_id="subj-math"))
+        db.add(Topic(id="topic-deriv", name="Derivatives", chapter_id="chap-calc", subtopics=["chain rule"]))
+        db.add(Topic(id="topic-integ", name="Integrals", chapter_id="chap-calc", subtopics=["by parts"]))
+        db.commit()
+    finally:
+        db.close()
+    return {"subject": "Mathematics", "topic_ids": ["topic-deriv", "topic-integ"]}
+
+
+@pytest.fixture
+def user_client(main_module):
+    """Client authenticated as a fresh user, so each test only sees its own rows."""
+    user_id = f"user-{uuid.uuid4()}"
+    main_module.app.dependency_overrides[main_module.verify_token] = lambda: user_id
+    try:
+        yield user_id, TestClient(main_module.app)
+    finally:
+        main_module.app.dependency_overrides.pop(main_module.verify_token, None)
+
+
+class FakeOpenRouter:
+    """
+    Stand-in for the OpenRouter chat-completions endpoint.
+
+    ``answers[model]`` is ``(delay_seconds, status_code, content)``; every
+    request is appended to ``calls``.
+    """
+
+    def __init__(self):
+        self.answers = {}
+        self.calls = []
+
+    async def handler(self, request):
+        import httpx
+
+        body = json.loads(request.content)
+        self.calls.append(body)
+        delay, status_code, content = self.answers[body["model"]]
+        await asyncio.sleep(delay)
+        if status_code != 200:
+            return httpx.Response(status_code, json={"error": {"message": "unavailable"}})
+        return httpx.Response(200, json={"model": body["model"], "choices": [{"message": {"content": content}}]})
+
+
+@pytest.fixture
+def openrouter(main_module, monkeypatch):
+    """Fake upstream plus fresh resilience, hedging and routing state for one test."""
+    import httpx
+    from llm_resilience import HedgeBudget, UpstreamHealth
+    from model_router import ModelRouter
+
+    fake = FakeOpenRouter()
+    service = main_module.LLMService
+    monkeypatch.setattr(service, "_client", httpx.AsyncClient(transport=httpx.MockTransport(fake.handler)))
+    monkeypatch.setattr(main_module, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    health = UpstreamHealth()
+    monkeypatch.setattr(main_module, "upstream_health", health)
+    monkeypatch.setattr(main_module, "hedge_budget", HedgeBudget(1.0))
+    monkeypatch.setattr(
+        main_module,
+        "model_router",
+        ModelRouter(main_module._router_candidates(), is_healthy=health.is_healthy, explore_rate=0.0),
+    )
+    monkeypatch.setattr(service, "_hedge_stats", {"backup_wins": 0, "primary_wins": 0, "both_failed": 0})
+    return fake
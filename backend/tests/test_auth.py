@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+import jwt
+import pytest
+from dotenv import dotenv_values
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def test_bundled_env_enables_dev_bypass():
+    # The frontend sends no bearer token, so the dev .env must let it through
+    values = dotenv_values(os.path.join(BACKEND_DIR, ".env"))
+    assert values.get("AUTH_DEV_BYPASS", "").lower() == "true"
+
+
+def test_missing_token_rejected_without_bypass(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "AUTH_DEV_BYPASS", False)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main_module.verify_token(None))
+    assert exc.value.status_code == 401
+
+
+def test_missing_token_is_dev_user_with_bypass(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "AUTH_DEV_BYPASS", True)
+    assert asyncio.run(main_module.verify_token(None)) == main_module.DEV_USER_ID
+
+
+def test_valid_and_invalid_tokens(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "AUTH_DEV_BYPASS", True)
+    asyncio.run(main_module._dev_user_id())  # creates the "dev" user row
+    token = jwt.encode({"sub": "dev"}, main_module.SECRET_KEY, algorithm=main_module.ALGORITHM)
+    assert asyncio.run(main_module.verify_token(_bearer(token))) == main_module.DEV_USER_ID
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(main_module.verify_token(_bearer(token + "x")))
+    assert exc.value.status_code == 401
+
+
+def test_llm_stats_admin_only(main_module, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(main_module, "AUTH_DEV_BYPASS", True)
+    client = TestClient(main_module.app)
+
+    monkeypatch.setattr(main_module, "ADMIN_USERNAMES", set())
+    assert client.get("/api/llm/stats").status_code == 403
+
+    monkeypatch.setattr(main_module, "ADMIN_USERNAMES", {"dev"})
+    response = client.get("/api/llm/stats")
+    assert response.status_code == 200
+    assert "cache" in response.json()
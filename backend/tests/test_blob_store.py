@@ -0,0 +1,25 @@
+import hashlib
+
+import pytest
+
+from blob_store import BlobStore, LocalBlobStore
+
+
+def test_incomplete_backend_fails_at_construction():
+    class PutOnly(BlobStore):
+        def put(self, data, content_type):
+            return hashlib.sha256(data).hexdigest()
+
+    with pytest.raises(TypeError):
+        PutOnly()
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    digest = store.put(b"png bytes", "image/png")
+    assert digest == hashlib.sha256(b"png bytes").hexdigest()
+    assert store.put(b"png bytes", "image/png") == digest
+    assert store.get(digest) == b"png bytes"
+    assert store.content_type(digest) == "image/png"
+    assert store.exists(digest)
+    assert not store.exists("0" * 64)
@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+import pytest
+
+QUESTIONS = json.dumps([{"type": "mcq", "text": "$x^2$", "options": ["a", "b"], "correct_answer": 0}])
+
+
+@pytest.fixture
+def hedged(main_module, openrouter, monkeypatch):
+    monkeypatch.setattr(main_module.LLMService, "_hedge_delay", classmethod(lambda cls, model: 0.05))
+    service = main_module.LLMService
+    return service.SUBJECT_LLM_MODELS["Mathematics"], service.DEFAULT_MODEL
+
+
+def _hedge(main, model):
+    _, payload = main.LLMService.build_question_payload("prompt", "Mathematics")
+    payload = main.LLMService._payload_for_model(payload, model)
+    return asyncio.run(main.LLMService._hedged_questions(model, payload))
+
+
+def test_backup_win_records_latency_for_backup_only(main_module, openrouter, hedged):
+    primary, backup = hedged
+    openrouter.answers = {primary: (1.0, 200, QUESTIONS), backup: (0, 200, QUESTIONS)}
+
+    questions, answered = _hedge(main_module, primary)
+
+    assert len(questions) == 1 and answered == backup
+    assert main_module.LLMService._hedge_stats["backup_wins"] == 1
+    assert main_module.upstream_health.get(primary).latency.samples == 0
+    assert main_module.upstream_health.get(backup).latency.samples == 1
+
+
+def test_empty_answer_does_not_win(main_module, openrouter, hedged):
+    primary, backup = hedged
+    openrouter.answers = {primary: (0.2, 200, QUESTIONS), backup: (0, 200, "[]")}
+
+    questions, answered = _hedge(main_module, primary)
+
+    assert len(questions) == 1 and answered == primary
+    assert main_module.LLMService._hedge_stats["primary_wins"] == 1
+
+
+def test_both_empty_returns_empty(main_module, openrouter, hedged):
+    primary, backup = hedged
+    openrouter.answers = {primary: (0.2, 200, "[]"), backup: (0, 200, "[]")}
+
+    questions, _ = _hedge(main_module, primary)
+
+    assert questions == []
+    assert main_module.LLMService._hedge_stats["both_failed"] == 1
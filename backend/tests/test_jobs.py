@@ -0,0 +1,203 @@
+import asyncio
+import uuid
+
+import pytest
+
+from database import AsyncSessionLocal, GenerationJob
+from jobs import (
+    JOB_CANCELLED,
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    InProcessJobRunner,
+)
+
+
+@pytest.fixture(autouse=True)
+def _schema(main_module):
+    """Importing main migrates the throwaway database."""
+
+
+async def _new_job() -> str:
+    async with AsyncSessionLocal() as db:
+        job = GenerationJob(id=str(uuid.uuid4()), kind="worksheet", status=JOB_QUEUED, request={})
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+async def _job(job_id: str) -> GenerationJob:
+    async with AsyncSessionLocal() as db:
+        return await db.get(GenerationJob, job_id)
+
+
+async def _wait_for(job_id: str, states, timeout: float = 5.0) -> GenerationJob:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await _job(job_id)
+        if job.status in states:
+            return job
+        assert asyncio.get_running_loop().time() < deadline, f"job stuck in {job.status}"
+        await asyncio.sleep(0.01)
+
+
+def test_job_succeeds_with_question_ids():
+    async def execute(db, job):
+        return ["q1", "q2"]
+
+    async def run():
+        runner = InProcessJobRunner(execute, workers=1)
+        await runner.start()
+        job_id = await _new_job()
+        runner.submit(job_id)
+        job = await _wait_for(job_id, (JOB_SUCCEEDED,))
+        await runner.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.question_ids == ["q1", "q2"]
+    assert job.started_at is not None and job.finished_at is not None
+
+
+def test_failing_job_records_error():
+    async def execute(db, job):
+        raise ValueError("model said no")
+
+    async def run():
+        runner = InProcessJobRunner(execute, workers=1)
+        await runner.start()
+        job_id = await _new_job()
+        runner.submit(job_id)
+        job = await _wait_for(job_id, (JOB_FAILED,))
+        await runner.stop()
+        return job
+
+    assert asyncio.run(run()).error == "model said no"
+
+
+def test_cancel_queued_job_never_runs():
+    executed = []
+
+    async def execute(db, job):
+        executed.append(job.id)
+        return []
+
+    async def run():
+        runner = InProcessJobRunner(execute, workers=1)
+        await runner.start()
+        job_id = await _new_job()
+        assert await runner.cancel(job_id)
+        runner.submit(job_id)  # the worker skips it once it sees the status
+        await asyncio.sleep(0.05)
+        job = await _job(job_id)
+        await runner.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == JOB_CANCELLED
+    assert job.finished_at is not None
+    assert executed == []
+
+
+def test_cancel_running_job():
+    async def run():
+        running = asyncio.Event()
+
+        async def execute(db, job):
+            running.set()
+            await asyncio.sleep(60)
+            return []
+
+        runner = InProcessJobRunner(execute, workers=1)
+        await runner.start()
+        job_id = await _new_job()
+        runner.submit(job_id)
+        await asyncio.wait_for(running.wait(), 5)
+        assert (await _job(job_id)).status == JOB_RUNNING
+        assert await runner.cancel(job_id)
+        job = await _wait_for(job_id, (JOB_CANCELLED,))
+        again = await runner.cancel(job_id)
+        await runner.stop()
+        return job, again
+
+    job, again = asyncio.run(run())
+    assert job.error == "Cancelled by user"
+    assert again is False  # finished jobs cannot be cancelled
+
+
+def test_shutdown_leaves_running_job_for_restart():
+    async def run():
+        running = asyncio.Event()
+        calls = []
+
+        async def execute(db, job):
+            calls.append(job.id)
+            if len(calls) == 1:
+                running.set()
+                await asyncio.sleep(60)
+            return ["q1"]
+
+        runner = InProcessJobRunner(execute, workers=1)
+        await runner.start()
+        job_id = await _new_job()
+        runner.submit(job_id)
+        await asyncio.wait_for(running.wait(), 5)
+        await runner.stop()
+        assert (await _job(job_id)).status == JOB_RUNNING
+
+        await runner.start()  # re-enqueues the interrupted job
+        job = await _wait_for(job_id, (JOB_SUCCEEDED,))
+        await runner.stop()
+        return job, calls
+
+    job, calls = asyncio.run(run())
+    assert calls == [job.id, job.id]
+
+
+def test_cancel_between_claim_and_start(monkeypatch):
+    import jobs
+
+    executed = []
+    real_session = jobs.AsyncSessionLocal
+
+    async def run():
+        claimed, resume = asyncio.Event(), asyncio.Event()
+
+        def gated_session():
+            # Pause the worker right after it has committed 'running' but
+            # before it has registered the execution task
+            session = real_session()
+            real_get = session.get
+
+            async def get(*args, **kwargs):
+                row = await real_get(*args, **kwargs)
+                if row is not None and row.status == JOB_RUNNING and not claimed.is_set():
+                    claimed.set()
+                    await resume.wait()
+                return row
+
+            session.get = get
+            return session
+
+        monkeypatch.setattr(jobs, "AsyncSessionLocal", gated_session)
+
+        async def execute(db, job):
+            executed.append(job.id)
+            return ["q1"]
+
+        runner = InProcessJobRunner(execute, workers=1)
+        await runner.start()
+        job_id = await _new_job()
+        runner.submit(job_id)
+        await asyncio.wait_for(claimed.wait(), 5)
+        assert await runner.cancel(job_id)
+        resume.set()
+        job = await _wait_for(job_id, (JOB_CANCELLED, JOB_SUCCEEDED))
+        await runner.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == JOB_CANCELLED
+    assert job.error == "Cancelled by user"
+    assert executed == []
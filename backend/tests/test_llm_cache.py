@@ -0,0 +1,87 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from llm_cache import LLMCache, make_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_entries=3)
+    yield cache
+    cache.close()
+
+
+def _hits_on_disk(cache, key):
+    with sqlite3.connect(cache.path) as conn:
+        return conn.execute("SELECT hits FROM llm_cache WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_miss_then_hit(cache):
+    key = make_cache_key("m", [{"role": "user", "content": "prompt"}])
+    assert cache.get(key) is None
+    cache.set(key, "m", [{"text": "q"}])
+    assert cache.get(key) == [{"text": "q"}]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"], stats["entries"]) == (1, 1, 1, 1)
+
+
+def test_hit_returns_a_fresh_copy(cache):
+    cache.set("k", "m", [{"text": "q"}])
+    cache.get("k")[0]["text"] = "changed"
+    assert cache.get("k") == [{"text": "q"}]
+
+
+def test_cache_key_ignores_whitespace_but_not_model():
+    messages = [{"role": "user", "content": "a  b\nc"}]
+    assert make_cache_key("m", messages) == make_cache_key("m", [{"role": "user", "content": "a b c"}])
+    assert make_cache_key("m", messages) != make_cache_key("other", messages)
+
+
+def test_expired_entry_is_a_miss(cache, monkeypatch):
+    cache.set("k", "m", [1])
+    later = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert cache.get("k") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_hits_are_batched_until_flush(cache):
+    cache.set("k", "m", [1])
+    for _ in range(3):
+        cache.get("k")
+    assert _hits_on_disk(cache, "k") == 0
+    cache.flush()
+    assert _hits_on_disk(cache, "k") == 3
+
+
+def test_hits_flush_after_flush_every_keys(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), flush_every=2)
+    cache.set("a", "m", [1])
+    cache.set("b", "m", [2])
+    cache.get("a")
+    assert _hits_on_disk(cache, "a") == 0
+    cache.get("b")
+    assert (_hits_on_disk(cache, "a"), _hits_on_disk(cache, "b")) == (1, 1)
+    cache.close()
+
+
+def test_lru_eviction_sees_batched_hits(cache):
+    for key in ("a", "b", "c"):
+        cache.set(key, "m", [key])
+        time.sleep(0.01)
+    cache.get("a")  # "a" is now the most recently used, only in memory
+    cache.set("d", "m", ["d"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["a"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_used_from_event_loop(main_module, cache):
+    async def run():
+        await main_module._run_blocking(cache.set, "k", "m", [1])
+        return await main_module._run_blocking(cache.get, "k")
+
+    assert asyncio.run(run()) == [1]
@@ -0,0 +1,68 @@
+from alembic import command
+from sqlalchemy import create_engine, inspect, text
+
+import db_migrate
+from database import Base
+
+# The tables Base.metadata.create_all made before migrations existed
+BASELINE_TABLES = {"users", "grades", "subjects", "chapters", "topics", "questions", "worksheets"}
+
+
+def _engine(tmp_path, name="app.db"):
+    return create_engine(f"sqlite:///{tmp_path / name}")
+
+
+def _version(engine) -> str:
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar_one()
+
+
+def _head() -> str:
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(db_migrate._alembic_config()).get_current_head()
+
+
+def test_initial_revision_matches_baseline_schema(tmp_path):
+    engine = _engine(tmp_path)
+    with engine.begin() as connection:
+        command.upgrade(db_migrate._alembic_config(connection), db_migrate.BASELINE_REVISION)
+    assert set(inspect(engine).get_table_names()) - {"alembic_version"} == BASELINE_TABLES
+
+
+def test_fresh_database_gets_every_table(tmp_path):
+    engine = _engine(tmp_path)
+    db_migrate.upgrade_database(bind=engine)
+    assert set(Base.metadata.tables) <= set(inspect(engine).get_table_names())
+    assert _version(engine) == _head()
+
+
+def test_pre_migration_database_is_stamped_and_upgraded(tmp_path):
+    engine = _engine(tmp_path)
+    # A database from before migrations: baseline tables, no alembic_version
+    with engine.begin() as connection:
+        command.upgrade(db_migrate._alembic_config(connection), db_migrate.BASELINE_REVISION)
+        connection.execute(text("DROP TABLE alembic_version"))
+
+    db_migrate.upgrade_database(bind=engine)
+
+    tables = set(inspect(engine).get_table_names())
+    assert "generation_jobs" in tables
+    assert set(Base.metadata.tables) <= tables
+    assert _version(engine) == _head()
+
+
+def test_existing_generation_jobs_table_is_kept(tmp_path):
+    engine = _engine(tmp_path)
+    # Created by create_all after background jobs were added, before migrations
+    with engine.begin() as connection:
+        command.upgrade(db_migrate._alembic_config(connection), db_migrate.BASELINE_REVISION)
+        Base.metadata.tables["generation_jobs"].create(connection)
+        connection.execute(text("INSERT INTO generation_jobs (id, status) VALUES ('j1', 'queued')"))
+        connection.execute(text("DROP TABLE alembic_version"))
+
+    db_migrate.upgrade_database(bind=engine)
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT id FROM generation_jobs")).scalars().all() == ["j1"]
+    assert _version(engine) == _head()
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+QUESTIONS = json.dumps([{"type": "mcq", "text": "$x^2$", "options": ["a", "b"], "correct_answer": 0}])
+
+
+def _fetch(main, model, subject="Mathematics", expected=1):
+    _, payload = main.LLMService.build_question_payload("prompt", subject)
+    payload = main.LLMService._payload_for_model(payload, model)
+    return asyncio.run(main.LLMService._fetch_questions(model, payload, "key", subject, expected))
+
+
+def test_failover_is_recorded_against_the_answering_model(main_module, openrouter):
+    service = main_module.LLMService
+    subject_model = service.SUBJECT_LLM_MODELS["Mathematics"]
+    openrouter.answers = {subject_model: (0, 503, ""), service.DEFAULT_MODEL: (0, 200, QUESTIONS)}
+
+    questions = _fetch(main_module, subject_model)
+
+    assert len(questions) == 1
+    assert [call["model"] for call in openrouter.calls] == [subject_model, service.DEFAULT_MODEL]
+    stats = main_module.model_router.snapshot()["subjects"]["Mathematics"]["models"]
+    assert stats[subject_model]["calls"] == 1
+    assert stats[subject_model]["failures"] == 1
+    assert stats[service.DEFAULT_MODEL]["calls"] == 1
+    assert stats[service.DEFAULT_MODEL]["failures"] == 0
+    assert stats[service.DEFAULT_MODEL]["question_yield"] == 1.0
+
+
+def test_router_prefers_model_that_answers(main_module, openrouter, monkeypatch):
+    service = main_module.LLMService
+    subject_model = service.SUBJECT_LLM_MODELS["Mathematics"]
+    openrouter.answers = {subject_model: (0, 503, ""), service.DEFAULT_MODEL: (0, 200, QUESTIONS)}
+    monkeypatch.setattr(main_module.model_router, "min_samples", 1)
+
+    _fetch(main_module, subject_model)
+
+    assert main_module.model_router.best("Mathematics") == (service.DEFAULT_MODEL, "lowest_cost")
+
+
+def test_failover_answer_is_not_cached_for_the_subject_model(main_module, openrouter):
+    service = main_module.LLMService
+    subject_model = service.SUBJECT_LLM_MODELS["Mathematics"]
+    openrouter.answers = {subject_model: (0, 503, ""), service.DEFAULT_MODEL: (0, 200, QUESTIONS)}
+    _, payload = service.build_question_payload("failover prompt", "Mathematics")
+    key = main_module.make_cache_key(subject_model, payload["messages"])
+
+    asyncio.run(service._fetch_questions(subject_model, payload, key, "Mathematics", 1))
+    assert main_module.llm_cache.get(key) is None
+
+    openrouter.answers[subject_model] = (0, 200, QUESTIONS)
+    asyncio.run(service._fetch_questions(subject_model, payload, key, "Mathematics", 1))
+    assert main_module.llm_cache.get(key) is not None
@@ -0,0 +1,88 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from database import AsyncSessionLocal, Question
+
+
+def _seed_questions(user_id: str, created: list) -> None:
+    async def seed():
+        async with AsyncSessionLocal() as db:
+            for i, created_at in enumerate(created):
+                db.add(Question(
+                    id=f"q-{i:02d}-{uuid.uuid4().hex[:6]}", type="short", text=f"Q{i}",
+                    difficulty="easy", marks=1, topic_id="topic-deriv",
+                    user_id=user_id, created_at=created_at,
+                ))
+            await db.commit()
+
+    asyncio.run(seed())
+
+
+def _all_pages(client, limit: int, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        query = dict(params, limit=limit)
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/api/questions", params=query)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+def test_cursor_round_trip(main_module):
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = main_module._encode_cursor(created_at, "q-1")
+    assert main_module._decode_cursor(cursor) == (created_at, "q-1")
+    assert main_module._decode_cursor(None) is None
+
+
+def test_invalid_cursor_rejected(main_module, user_client):
+    with pytest.raises(HTTPException) as exc:
+        main_module._decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+    _, client = user_client
+    assert client.get("/api/questions", params={"cursor": "!!"}).status_code == 400
+
+
+def test_pages_cover_every_row_once_newest_first(user_client):
+    user_id, client = user_client
+    base = datetime(2024, 1, 1)
+    # Several rows share a timestamp so the id tie-breaker is exercised
+    created = [base + timedelta(minutes=i // 3) for i in range(11)]
+    _seed_questions(user_id, created)
+
+    pages = _all_pages(client, limit=4, summary="true")
+    assert [len(page) for page in pages] == [4, 4, 3]
+
+    rows = [row for page in pages for row in page]
+    ids = [row["id"] for row in rows]
+    assert len(set(ids)) == 11
+    keys = [(row["created_at"], row["id"]) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_exact_page_multiple_has_no_trailing_cursor(user_client):
+    user_id, client = user_client
+    _seed_questions(user_id, [datetime(2024, 2, 1) + timedelta(seconds=i) for i in range(4)])
+
+    pages = _all_pages(client, limit=2)
+    assert [len(page) for page in pages] == [2, 2]
+
+
+def test_filters_apply_across_pages(user_client):
+    user_id, client = user_client
+    base = datetime(2024, 3, 1)
+    _seed_questions(user_id, [base + timedelta(days=i) for i in range(6)])
+
+    pages = _all_pages(client, limit=2, created_from=(base + timedelta(days=2)).isoformat())
+    rows = [row for page in pages for row in page]
+    assert len(rows) == 4
+    assert all(row["created_at"] >= (base + timedelta(days=2)).isoformat() for row in rows)
@@ -0,0 +1,49 @@
+import asyncio
+
+import schemas
+from database import AsyncSessionLocal
+
+
+def _frontend_request(**overrides) -> schemas.WorksheetRequest:
+    """The body frontend/src/lib/api.ts posts to /api/generate/worksheet."""
+    body = {
+        "topic_id": "topic-deriv",
+        "mcq_count": 5,
+        "short_answer_count": 3,
+        "long_answer_count": 2,
+        "difficulty": "medium",
+        "include_images": False,
+        "subject_name": "Mathematics",
+    }
+    body.update(overrides)
+    return schemas.WorksheetRequest(**body)
+
+
+def _eligible(main, request, topic_ids) -> bool:
+    async def run():
+        async with AsyncSessionLocal() as db:
+            topics_data, _ = await main._resolve_topics(db, request, topic_ids)
+        return main._pool_eligible(request, topics_data)
+
+    return asyncio.run(run())
+
+
+def test_frontend_request_uses_pool(main_module, curriculum):
+    assert _eligible(main_module, _frontend_request(), ["topic-deriv"])
+
+
+def test_subject_name_compared_case_insensitively(main_module, curriculum):
+    assert _eligible(main_module, _frontend_request(subject_name=" mathematics "), ["topic-deriv"])
+
+
+def test_missing_subject_name_uses_pool(main_module, curriculum):
+    assert _eligible(main_module, _frontend_request(subject_name=None), curriculum["topic_ids"])
+
+
+def test_subject_override_skips_pool(main_module, curriculum):
+    assert not _eligible(main_module, _frontend_request(subject_name="Physics"), ["topic-deriv"])
+
+
+def test_images_or_cache_bypass_skip_pool(main_module, curriculum):
+    assert not _eligible(main_module, _frontend_request(include_images=True), ["topic-deriv"])
+    assert not _eligible(main_module, _frontend_request(bypass_cache=True), ["topic-deriv"])
@@ -0,0 +1,40 @@
+import asyncio
+import time
+import uuid
+
+from database import AsyncSessionLocal, Question
+
+
+def _seed_questions(user_id: str, count: int) -> list:
+    ids = [f"q-{uuid.uuid4().hex[:8]}" for _ in range(count)]
+
+    async def seed():
+        async with AsyncSessionLocal() as db:
+            for question_id in ids:
+                db.add(Question(
+                    id=question_id, type="short", text="Q", difficulty="easy",
+                    marks=1, topic_id="topic-deriv", user_id=user_id,
+                ))
+            await db.commit()
+
+    asyncio.run(seed())
+    return ids
+
+
+def test_reordering_questions_bumps_updated_at(curriculum, user_client):
+    user_id, client = user_client
+    question_ids = _seed_questions(user_id, 3)
+    created = client.post("/api/worksheets", json={
+        "id": f"ws-{uuid.uuid4()}", "name": "Quiz", "topic_id": "topic-deriv",
+        "question_ids": question_ids,
+    })
+    assert created.status_code == 200, created.text
+
+    time.sleep(0.01)
+    reordered = client.patch(
+        f"/api/worksheets/{created.json()['id']}",
+        json={"question_ids": question_ids[::-1]},
+    )
+    assert reordered.status_code == 200, reordered.text
+    assert reordered.json()["question_ids"] == question_ids[::-1]
+    assert reordered.json()["updated_at"] > created.json()["updated_at"]
@@ -0,0 +1,235 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+import models
+
+# A pool slot: (topic_id, question type, difficulty)
+PoolKey = Tuple[str, str, str]
+
+# Coroutine that generates up to ``count`` fresh questions for a slot
+PoolRefill = Callable[[AsyncSession, PoolKey, int], Awaitable[List[dict]]]
+
+
+class WarmPool:
+    """
+    Bounded pool of pre-generated, unassigned questions for popular slots.
+
+    Demand per slot is tracked in-process as an exponentially decaying
+    count of requested questions. A background task keeps the hottest slots
+    topped up to ``size`` (refilling once they drop below ``low_watermark``),
+    with at most ``concurrency`` LLM calls at a time and at most
+    ``llm_calls_per_hour`` calls overall. Pooled rows live in the
+    ``question_pool`` table, so they survive restarts and are shared between
+    worker processes.
+    """
+
+    def __init__(
+        self,
+        refill: PoolRefill,
+        enabled: bool = True,
+        size: int = 20,
+        low_watermark: int = 10,
+        batch_size: int = 10,
+        concurrency: int = 2,
+        max_keys: int = 50,
+        min_demand: float = 5.0,
+        half_life_seconds: float = 3600.0,
+        llm_calls_per_hour: int = 60,
+        interval_seconds: float = 30.0,
+    ):
+        self._refill = refill
+        self.enabled = enabled
+        self.size = size
+        self.low_watermark = min(low_watermark, size)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_keys = max_keys
+        self.min_demand = min_demand
+        self.half_life_seconds = half_life_seconds
+        self.llm_calls_per_hour = llm_calls_per_hour
+        self.interval_seconds = interval_seconds
+
+        self._demand: Dict[PoolKey, Tuple[float, float]] = {}
+        # Slots that fell below the low watermark and are being topped up to ``size``
+        self._filling: Set[PoolKey] = set()
+        self._llm_calls: Deque[float] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._counters = {
+            "claimed": 0,
+            "refills": 0,
+            "generated": 0,
+            "refill_failures": 0,
+            "budget_skips": 0,
+        }
+
+    # ---------------------- Demand ---------------------- #
+
+    def _decayed(self, key: PoolKey, now: float) -> float:
+        score, updated_at = self._demand.get(key, (0.0, now))
+        return score * 0.5 ** ((now - updated_at) / self.half_life_seconds)
+
+    def record_demand(self, topic_ids: List[str], difficulty: str, counts: dict) -> None:
+        """Count requested questions per slot, split evenly across the topics."""
+        now = time.monotonic()
+        for q_type, wanted in counts.items():
+            if wanted <= 0:
+                continue
+            share = wanted / len(topic_ids)
+            for topic_id in topic_ids:
+                key = (topic_id, q_type, difficulty)
+                self._demand[key] = (self._decayed(key, now) + share, now)
+
+    def hot_keys(self) -> List[PoolKey]:
+        """Slots whose decayed demand reaches ``min_demand``, hottest first."""
+        now = time.monotonic()
+        scores = {key: self._decayed(key, now) for key in self._demand}
+        # Forget slots whose demand has decayed to nothing
+        for key, score in scores.items():
+            if score < self.min_demand / 100:
+                del self._demand[key]
+        hot = sorted(
+            (key for key, score in scores.items() if score >= self.min_demand),
+            key=lambda key: scores[key],
+            reverse=True,
+        )
+        return hot[:self.max_keys]
+
+    # ---------------------- Claiming ---------------------- #
+
+    async def claim(
+        self, db: AsyncSession, topic_ids: List[str], difficulty: str, counts: dict
+    ) -> Tuple[List[dict], dict]:
+        """
+        Take pooled questions for as many of ``counts`` as possible.
+
+        Records the demand, wakes the refill task, and returns the claimed
+        question dicts (tagged with their topic id) plus the remaining counts.
+        """
+        if not self.enabled or not topic_ids:
+            return [], counts
+
+        self.record_demand(topic_ids, difficulty, counts)
+        claimed: List[dict] = []
+        remaining = dict(counts)
+        for q_type, wanted in counts.items():
+            if wanted <= 0:
+                continue
+            rows = await models.claim_pooled_questions(db, topic_ids, q_type, difficulty, wanted)
+            for topic_id, payload in rows:
+                claimed.append({**payload, "topic_id": topic_id})
+            remaining[q_type] = wanted - len(rows)
+
+        self._counters["claimed"] += len(claimed)
+        self.wake()
+        return claimed, remaining
+
+    # ---------------------- Refill ---------------------- #
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def _take_budget(self) -> bool:
+        """Reserve one LLM call from the hourly budget (sliding window)."""
+        now = time.monotonic()
+        while self._llm_calls and now - self._llm_calls[0] >= 3600:
+            self._llm_calls.popleft()
+        if len(self._llm_calls) >= self.llm_calls_per_hour:
+            return False
+        self._llm_calls.append(now)
+        return True
+
+    async def _refill_key(self, semaphore: asyncio.Semaphore, key: PoolKey, count: int) -> int:
+        async with semaphore:
+            if not self._take_budget():
+                self._counters["budget_skips"] += 1
+                return 0
+            topic_id, q_type, difficulty = key
+            try:
+                async with AsyncSessionLocal() as db:
+                    payloads = (await self._refill(db, key, count))[:count]
+                    await models.add_pooled_questions(db, topic_id, q_type, difficulty, payloads)
+            except Exception as e:
+                self._counters["refill_failures"] += 1
+                print(f"ERROR: Warm pool refill for {key} failed: {getattr(e, 'detail', None) or e}")
+                return 0
+            self._counters["refills"] += 1
+            self._counters["generated"] += len(payloads)
+            print(f"DEBUG: Warm pool added {len(payloads)} question(s) for {key}")
+            return len(payloads)
+
+    async def refill_once(self) -> int:
+        """Top up hot slots that dropped below the low watermark; returns questions added."""
+        hot = self.hot_keys()
+        if not hot:
+            return 0
+        async with AsyncSessionLocal() as db:
+            levels = await models.count_pooled_questions(db, sorted({key[0] for key in hot}))
+
+        for key in hot:
+            level = levels.get(key, 0)
+            if level < self.low_watermark:
+                self._filling.add(key)
+            elif level >= self.size:
+                self._filling.discard(key)
+        self._filling.intersection_update(hot)
+
+        short = [
+            (key, min(self.size - levels.get(key, 0), self.batch_size))
+            for key in hot
+            if key in self._filling
+        ]
+        if not short:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        added = await asyncio.gather(*(self._refill_key(semaphore, key, count) for key, count in short))
+        return sum(added)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if await self.refill_once():
+                    # Slots may still be short of ``size``; go again right away
+                    self._wake.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ERROR: Warm pool refill pass failed: {e}")
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        print(f"DEBUG: Warm pool started (size {self.size}, {self.llm_calls_per_hour} LLM calls/hour)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._wake = None
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self._counters,
+            "enabled": self.enabled,
+            "size": self.size,
+            "tracked_slots": len(self._demand),
+            "hot_slots": len(self.hot_keys()),
+            "llm_calls_last_hour": sum(1 for t in self._llm_calls if now - t < 3600),
+            "llm_calls_per_hour": self.llm_calls_per_hour,
+        }
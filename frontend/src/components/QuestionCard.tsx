@@ -288,14 +288,14 @@ export function QuestionCard({
                     }}
                   />
 
-                  {/* Image (Base64) */}
+                  {/* Image (blob reference or Base64) */}
                   {question.images && question.images.length > 0 && (
                     <div
                       className="relative w-40 h-24 rounded-lg overflow-hidden border border-border cursor-pointer hover:ring-2 hover:ring-primary transition-all"
                       onClick={() => setImageOpen(true)}
                     >
                       <img
-                        src={question.images[0]}
+                        src={api.resolveImageUrl(question.images[0])}
                         alt="Question diagram"
                         className="w-full h-full object-cover"
                       />
@@ -389,7 +389,7 @@ export function QuestionCard({
           </DialogHeader>
           {question.images && (
             <img
-              src={question.images[0]}
+              src={api.resolveImageUrl(question.images[0])}
               alt="Question diagram full size"
               className="w-full rounded-lg"
             />
@@ -68,6 +68,14 @@ export interface Token {
   token_type: string;
 }
 
+// Image references returned by the backend ("/api/images/<sha256>") are
+// relative to the API server, not the frontend origin.
+const API_ORIGIN = API_BASE_URL.replace(/\/api$/, '');
+
+export function resolveImageUrl(src: string): string {
+  return src.startsWith('/api/') ? `${API_ORIGIN}${src}` : src;
+}
+
 // Auth APIs
 export async function register(username: string, email: string, password: string): Promise<Token> {
   const response = await fetch(`${API_BASE_URL}/auth/register`, {
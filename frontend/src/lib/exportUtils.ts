@@ -37,11 +37,11 @@ export function generateWorksheetHTML(
 
         // --- NEW LOGIC: RENDER EMBEDDED BASE64 IMAGE FOR EXPORT ---
         if (q.images && q.images.length > 0) {
-            // The image is a Base64 Data URI, which is embedded directly.
-            // This is crucial for offline rendering and PDF export (html2pdf.js).
+            // The image is a Base64 Data URI or a blob-store reference served by
+            // the API (/api/images/<sha256>), which html2pdf.js loads like any URL.
             questionHTML += `
                 <div class="question-image" style="margin-bottom: 15px; text-align: center; page-break-inside: avoid;">
-                    <img src="${q.images[0]}" alt="Question Diagram" style="max-width: 100%; height: auto; border: 1px solid #ddd; padding: 5px;"/>
+                    <img src="${api.resolveImageUrl(q.images[0])}" alt="Question Diagram" style="max-width: 100%; height: auto; border: 1px solid #ddd; padding: 5px;"/>
                 </div>
             `;
         }